@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Measures how fast pyrk.realtime can release frames, to check that a solver
+keeps up with the wall clock at a given output cadence.
+
+By default it runs the PB-FHR multi-point model at 100 frames per simulated
+second, without pacing, with a reactivity insertion and a coolant flow
+change sent as commands part way through::
+
+    python benchmarks/bench_realtime.py --tf 20 --dt 0.01
+
+A solver sustains the cadence if the slowest frames, not only the average
+one, take less than dt.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(here)
+
+from bench_solvers import load_model  # noqa: E402
+from pyrk import driver  # noqa: E402
+from pyrk.db import database  # noqa: E402
+from pyrk.realtime import RealTime  # noqa: E402
+
+
+def run(infile, solver):
+    """Streams the model in infile unpaced and returns the wall time each
+    frame took to solve
+
+    :param solver: the solver name
+    :type solver: str
+    :rtype: np.ndarray
+    """
+    infile.solver = solver
+    si = driver.sim_info_from_infile(infile, database.NullDatabase())
+    rt = RealTime(si, infile, speed=None)
+    n_frames = si.timer.timesteps()
+    cool = [comp for comp in si.components if comp.adv][0]
+    m_flow = cool.adv[cool.name]['m_flow']
+    times = []
+    last = time.perf_counter()
+    for state in rt.stream():
+        now = time.perf_counter()
+        times.append(now - last)
+        last = now
+        if len(times) == n_frames // 3:
+            rt.put('rho_ext', 0.0005)
+        elif len(times) == 2 * n_frames // 3:
+            rt.put(cool.name + '.adv.' + cool.name + '.m_flow',
+                   0.9 * m_flow)
+    return np.array(times[1:])
+
+
+def main():
+    ap = argparse.ArgumentParser(description='PyRK real-time benchmark')
+    ap.add_argument('--infile',
+                    default=os.path.join(here, '..', 'examples', 'pbfhr',
+                                         'multi_pt', 'prt_2ref', 'input.py'))
+    ap.add_argument('--tf', type=float, default=20.0,
+                    help='the final time [s]')
+    ap.add_argument('--dt', type=float, default=0.01,
+                    help='the output cadence [s]')
+    ap.add_argument('--solvers', nargs='+',
+                    default=['exponential', 'split', 'bdf', 'multirate'])
+    args = ap.parse_args()
+    print('%-12s %10s %10s %10s %10s %8s' % ('solver', 'frames/s',
+                                             'mean [ms]', 'p99 [ms]',
+                                             'max [ms]', 'over dt'))
+    for solver in args.solvers:
+        infile = load_model(args.infile, tf=args.tf,
+                            t_feedback=args.tf / 2, dt=args.dt)
+        times = run(infile, solver)
+        print('%-12s %10.0f %10.3f %10.3f %10.3f %8d' % (
+            solver, 1.0 / times.mean(), 1e3 * times.mean(),
+            1e3 * np.percentile(times, 99), 1e3 * times.max(),
+            np.sum(times > args.dt)))
+
+
+if __name__ == "__main__":
+    main()
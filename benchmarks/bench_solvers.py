@@ -0,0 +1,145 @@
+#! /usr/bin/env python
+
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Compares the wall time and the number of right-hand-side evaluations of the
+split dopri5 scheme against the coupled implicit solvers in driver.solve.
+
+By default it runs the PB-FHR two-point model. The full transient takes hours
+with the split scheme, so --tf and --t_feedback shorten it::
+
+    python benchmarks/bench_solvers.py --tf 20 --t_feedback 10
+
+A coupled solver may name the Jacobian it uses after a colon, e.g.
+``bdf:dense`` or ``radau:sparsity``. The default is the analytic Jacobian.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+# input files import reactivity_insertion as a top level module
+sys.path.append(os.path.join(here, '..', 'pyrk'))
+
+from pyrk import driver  # noqa: E402
+from pyrk.db import database  # noqa: E402
+from pyrk.inp import sim_info  # noqa: E402
+
+
+def load_model(infile_path, tf=None, t_feedback=None, dt=None):
+    """Executes a fresh copy of the input file, optionally overriding the
+    final time, the time at which feedback starts and the timestep.
+
+    :param infile_path: path to the input file
+    :type infile_path: str
+    :param tf: final time, in seconds, or None to keep the input's value
+    :type tf: float
+    :param t_feedback: feedback start, in seconds, or None to keep it
+    :type t_feedback: float
+    :param dt: timestep, in seconds, or None to keep it
+    :type dt: float
+    :return: the executed input module
+    """
+    with open(infile_path, 'r') as f:
+        src = f.read()
+    for name, val in [('tf', tf), ('t_feedback', t_feedback), ('dt', dt)]:
+        if val is not None:
+            src = re.sub(r'^%s = .*$' % name,
+                         '%s = %r * units.seconds' % (name, val),
+                         src, flags=re.M)
+    infile = types.ModuleType('input')
+    exec(compile(src, infile_path, 'exec'), infile.__dict__)
+    return infile
+
+
+def counted(name, counts, func):
+    """Wraps func so that each call increments counts[name]"""
+    def wrapper(*args):
+        counts[name] += 1
+        return func(*args)
+    return wrapper
+
+
+def run(infile, label, outdir):
+    """Solves the model in infile with one solver
+
+    :param label: the solver name, optionally followed by ':' and the
+      Jacobian option
+    :type label: str
+    :return: the solution, the wall time and the rhs evaluation counts
+    """
+    solver, _, jac = label.partition(':')
+    db = database.Database(filepath=os.path.join(outdir,
+                                                 label.replace(':', '_') +
+                                                 '.h5'))
+    n_ref = getattr(infile, 'n_ref', 0)
+    si = sim_info.SimInfo(timer=infile.ti,
+                          components=infile.components,
+                          iso=infile.fission_iso,
+                          e=infile.spectrum,
+                          n_precursors=infile.n_pg,
+                          n_decay=infile.n_dg,
+                          n_fic=n_ref,
+                          kappa=infile.kappa,
+                          feedback=infile.feedback,
+                          rho_ext=infile.rho_ext,
+                          solver=solver,
+                          jacobian=jac if jac else 'analytic',
+                          db=db)
+    counts = {'f_n': 0, 'f_th': 0, 'f_coupled': 0}
+    originals = {}
+    for name in counts:
+        originals[name] = getattr(driver, name)
+        setattr(driver, name, counted(name, counts, originals[name]))
+    try:
+        start = time.time()
+        sol = driver.solve(si=si, y=si.y, infile=infile)
+        wall = time.time() - start
+    finally:
+        for name, func in originals.items():
+            setattr(driver, name, func)
+        db.close_db()
+    return sol.copy(), wall, counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description='PyRK solver benchmark')
+    ap.add_argument('--infile',
+                    default=os.path.join(here, '..', 'examples', 'pbfhr',
+                                         'multi_pt', 'prt_2ref', 'input.py'))
+    ap.add_argument('--tf', type=float, default=None,
+                    help='override the final time [s]')
+    ap.add_argument('--t_feedback', type=float, default=None,
+                    help='override the time feedback starts [s]')
+    ap.add_argument('--solvers', nargs='+',
+                    default=['split', 'bdf:dense', 'bdf', 'radau:dense',
+                             'radau', 'lsoda', 'multirate',
+                             'exponential'])
+    args = ap.parse_args()
+    outdir = tempfile.mkdtemp()
+    results = {}
+    for solver in args.solvers:
+        infile = load_model(args.infile, args.tf, args.t_feedback)
+        results[solver] = run(infile, solver, outdir)
+    ref = results[args.solvers[0]][0]
+    print('%-13s %10s %10s %10s %10s %12s' % ('solver', 'wall [s]', 'f_n',
+                                              'f_th', 'f_coupled',
+                                              'max |dP|'))
+    for solver in args.solvers:
+        sol, wall, counts = results[solver]
+        dp = np.max(np.abs(sol[:, 0] - ref[:, 0]))
+        print('%-13s %10.2f %10d %10d %10d %12.4e' % (solver, wall,
+                                                      counts['f_n'],
+                                                      counts['f_th'],
+                                                      counts['f_coupled'],
+                                                      dp))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Measures the cost of the Timer lookups that the solvers make on every
+right hand side evaluation and every timestep, with the times held as pint
+Quantities, as the solvers used to, and as plain floats::
+
+    python benchmarks/bench_timer.py --n 100000
+
+Each row gives the time per call, and the last column how many times faster
+the float lookup is. The array row gives the time per element of one call
+on an array of n times, with Quantity arrays and with plain floats.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from pyrk.inp import validation
+from pyrk.timer import Timer
+from pyrk.utilities.ur import units
+
+
+def per_call(f, n):
+    """Returns the wall time of one call of f, averaged over n calls
+
+    :param f: the function to time, called with the index of the call
+    :type f: function
+    :param n: the number of calls
+    :type n: int
+    :rtype: float
+    """
+    start = time.perf_counter()
+    for i in range(n):
+        f(i)
+    return (time.perf_counter() - start) / n
+
+
+def advance(ti, step):
+    """Returns the wall time of one timestep of ti, advanced with step
+    through the whole simulation
+
+    :rtype: float
+    """
+    ti.ts = 0
+    n = ti.timesteps() - 1
+    start = time.perf_counter()
+    for _ in range(n):
+        step()
+    return (time.perf_counter() - start) / n
+
+
+def quantity_advance(ti):
+    """Advances ti one timestep as advance_time used to, checking the new
+    time against tf as Quantities"""
+    t_next = ti.t(ti.ts + 1)
+    ti.ts = ti.idx_from_t(t_next, ti.t0, ti.dt)
+    validation.validate_le("current time", t_next, ti.tf)
+
+
+def quantity_indices(ti, times):
+    """Returns the index of each of an array of times, with the arithmetic
+    on Quantity arrays
+
+    :param times: the times
+    :type times: Quantity array, units of seconds
+    :rtype: np.ndarray of int
+    """
+    return np.rint(((times - ti.t0) / ti.dt).to('').magnitude).astype(int)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='PyRK timer benchmark')
+    ap.add_argument('--n', type=int, default=100000,
+                    help='the number of lookups')
+    ap.add_argument('--repeat', type=int, default=100,
+                    help='the number of array lookups, each of n times')
+    ap.add_argument('--tf', type=float, default=100.0,
+                    help='the final time [s]')
+    ap.add_argument('--dt', type=float, default=0.01,
+                    help='the timestep [s]')
+    args = ap.parse_args()
+    ti = Timer(t0=0.0 * units.seconds, tf=args.tf * units.seconds,
+               dt=args.dt * units.seconds)
+    rng = np.random.default_rng(0)
+    times = rng.uniform(0.0, args.tf, args.n)
+    rows = [
+        ('t_idx', per_call(
+            lambda i: ti.idx_from_t(times[i] * units.seconds, ti.t0, ti.dt),
+            args.n),
+         per_call(lambda i: ti.idx(times[i]), args.n)),
+        ('array t_idx', per_call(
+            lambda i: quantity_indices(ti, times * units.seconds),
+            args.repeat) / args.n,
+         per_call(lambda i: ti.indices(times), args.repeat) / args.n),
+        ('t', per_call(lambda i: ti.t(i % ti.timesteps()).magnitude, args.n),
+         per_call(lambda i: ti.seconds(i % ti.timesteps()), args.n)),
+        ('timesteps', per_call(
+            lambda i: ti.idx_from_t(ti.tf, ti.t0, ti.dt) + 1, args.n),
+         per_call(lambda i: ti.timesteps(), args.n)),
+        ('advance', advance(ti, lambda: quantity_advance(ti)),
+         advance(ti, ti.advance_one_timestep)),
+    ]
+    print('%-12s %14s %14s %8s' % ('lookup', 'Quantity [us]', 'float [us]',
+                                   'speedup'))
+    for name, old, new in rows:
+        print('%-12s %14.3f %14.3f %8.0f' % (name, 1e6 * old, 1e6 * new,
+                                             old / new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Branches of one simulation from a snapshot of its state.
+
+The input file is run once up to the branch time, where a checkpoint of the
+whole simulation is saved as a snapshot. Every branch then starts from the
+snapshot in a worker process, with its own parameter values, for example a
+different reactivity insertion or coolant inlet temperature::
+
+    Branches('input', 100 * units.seconds,
+             [{'rho_ext.rho_final': 0.001, 'rho_ext.t_step': 100.0},
+              {'cool.adv.cool.t_in': 700.0}])
+
+Parameters are named as in pyrk.sweep. The history before the branch is
+solved only once. The parent run records it in the output database as usual,
+and the branches add their solutions from the branch time onwards to the
+/branches group of the same database, next to one copy of the history.
+"""
+import argparse
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import tables as tb
+
+from pyrk import driver
+from pyrk import sweep
+from pyrk.checkpoint import Checkpoint
+from pyrk.db import database
+from pyrk.events import Event
+from pyrk.utilities.ur import units
+
+
+def snapshot_path(filepath):
+    """Returns the location of the snapshot of a branched run
+
+    :param filepath: the location of the output database
+    :type filepath: str
+    """
+    return os.path.splitext(filepath)[0] + '_snapshot.h5'
+
+
+def run_parent(infile_path, t_branch, filepath):
+    """Runs the input file up to the branch time, recording it in the output
+    database, and saves the snapshot there.
+
+    :param infile_path: path to the infile
+    :type infile_path: string
+    :param t_branch: the branch time
+    :type t_branch: Quantity, units of seconds
+    :param filepath: the location of the output database
+    :type filepath: str
+    :return: the simulation info object of the parent run
+    :rtype: SimInfo
+    """
+    infile = sweep.load_fresh(infile_path)
+    db = database.Database(filepath=filepath)
+    si = driver.sim_info_from_infile(infile, db, infile_path=infile_path)
+    t_idx = si.timer.t_idx(t_branch)
+    si.events.append(Event('branch', 'time', t_branch))
+    si.checkpoint = Checkpoint(snapshot_path(filepath), every=t_idx)
+    driver.solve(si=si, y=si.y, infile=infile)
+    db.close_db()
+    if si.checkpoint.t_idx != t_idx:
+        msg = 'The parent run ended at timestep '
+        msg += str(si.timer.current_timestep())
+        msg += ' before the branch timestep ' + str(t_idx)
+        raise RuntimeError(msg)
+    return si
+
+
+def solve_branch(infile_path, snapshot, sample):
+    """Runs one branch from the snapshot and returns its solution from the
+    branch timestep on. The external reactivity after the branch is the
+    branch's own. Nothing is recorded, since the solution is returned and
+    Branches.write records it.
+
+    :param infile_path: path to the infile
+    :type infile_path: string
+    :param snapshot: the location of the snapshot
+    :type snapshot: str
+    :param sample: the parameter values of the branch, keyed by path
+    :type sample: dict
+    :rtype: np.ndarray
+    """
+    infile = sweep.load_fresh(infile_path)
+    for path, value in sample.items():
+        sweep.set_param(infile, path, value)
+    si = driver.sim_info_from_infile(infile, database.NullDatabase(),
+                                     infile_path=infile_path)
+    si.checkpoint = None
+    rho_ext = si.ne._rho_ext_vals.copy()
+    resume = Checkpoint(snapshot).load(si, replay=False)
+    t_idx = si.timer.current_timestep()
+    si.ne._rho_ext_vals[t_idx + 1:] = rho_ext[t_idx + 1:]
+    # the equations change at the branch, as after a scram
+    resume.pop('integrator', None)
+    sol = driver.solve(si=si, y=si.y, infile=infile, resume=resume)
+    return sol[t_idx:]
+
+
+def run_branch(infile_path, snapshot, sample, shm_name, shape, idx,
+               flags_name=None):
+    """Runs one branch in a worker and writes its solution into row idx of
+    the shared result array. Before the run, entry idx of the shared flags is
+    set, to tell that the branch started.
+
+    :param infile_path: path to the infile
+    :type infile_path: string
+    :param snapshot: the location of the snapshot
+    :type snapshot: str
+    :param sample: the parameter values of the branch, keyed by path
+    :type sample: dict
+    :param shm_name: the name of the shared memory block of the results
+    :type shm_name: str
+    :param shape: the shape of the result array
+    :type shape: tuple
+    :param idx: the branch id
+    :type idx: int
+    :param flags_name: the name of the shared memory block of the flags of
+      the branches that started, or None
+    :type flags_name: str
+    :return: the number of timesteps solved, from the branch timestep on
+    :rtype: int
+    """
+    sweep.mark_started(flags_name, idx)
+    sol = solve_branch(infile_path, snapshot, sample)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        y = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        y[idx, :len(sol)] = sol
+    finally:
+        shm.close()
+    return len(sol)
+
+
+class Branches(sweep.Sweep):
+    """This class runs an input file up to a branch time and then each of a
+    list of branches from there, in parallel.
+    """
+
+    def __init__(self, infile_path, t_branch, samples, filepath='pyrk.h5',
+                 max_workers=None, retries=1):
+        """Prepares the branches of an input file
+
+        :param infile_path: path to the infile
+        :type infile_path: string
+        :param t_branch: the branch time, on the timer's grid
+        :type t_branch: Quantity, units of seconds
+        :param samples: the parameter values of each branch, keyed by path
+        :type samples: list of dicts
+        :param filepath: the location of the output database
+        :type filepath: str
+        :param max_workers: the number of worker processes, or None for the
+          number of processors
+        :type max_workers: int
+        :param retries: how many times a failed branch is run again
+        :type retries: int
+        """
+        sweep.Sweep.__init__(self, infile_path, samples,
+                             max_workers=max_workers, retries=retries)
+        timer = sweep.load_fresh(infile_path).ti
+        self.t_branch = t_branch
+        self.t_idx = timer.t_idx(t_branch)
+        """t_idx (int): the branch timestep"""
+        if not 0 < self.t_idx < timer.timesteps() - 1:
+            msg = 'The branch time ' + str(t_branch)
+            msg += ' must be after t0 and before tf.'
+            raise ValueError(msg)
+        self.shape = (self.shape[0], self.shape[1] - self.t_idx,
+                      self.shape[2])
+        self.filepath = filepath
+        self.snapshot = snapshot_path(filepath)
+        """snapshot (str): the location of the snapshot"""
+        self.sim_id = None
+        """sim_id (str): the id of the parent run in the database"""
+
+    def run(self):
+        """Runs the parent up to the branch time and then every branch.
+
+        :return: the solutions from the branch timestep on, indexed by
+          branch, timestep and entry
+        :rtype: np.ndarray
+        """
+        self.sim_id = run_parent(self.infile_path, self.t_branch,
+                                 self.filepath).sim_id
+        return sweep.Sweep.run(self)
+
+    def submit(self, executor, idx, shm_name, flags):
+        """Submits one branch to the process pool, and clears its flag
+
+        :param executor: the process pool
+        :type executor: ProcessPoolExecutor
+        :param idx: the branch id
+        :type idx: int
+        :param shm_name: the name of the shared memory block of the results
+        :type shm_name: str
+        :param flags: the shared memory block of the flags of the branches
+          that started
+        :type flags: SharedMemory
+        :return: the future of the number of timesteps solved
+        :rtype: Future
+        """
+        flags.buf[idx] = 0
+        return executor.submit(run_branch, self.infile_path, self.snapshot,
+                               self.samples[idx], shm_name, self.shape, idx,
+                               flags.name)
+
+    def solution(self, idx):
+        """Returns the whole solution of a branch, history included
+
+        :param idx: the branch id
+        :type idx: int
+        :rtype: np.ndarray
+        """
+        return np.concatenate([self.history(), self.y[idx, 1:]])
+
+    def history(self):
+        """Returns the solution of the parent run up to the branch timestep
+        """
+        with tb.open_file(self.snapshot, mode='r') as h5file:
+            return h5file.root.y.read(stop=self.t_idx + 1)
+
+    def write(self, filepath=None):
+        """Writes the branches to the /branches group of the parent's
+        database, like Sweep.write, together with the parent's solution
+        history up to the branch timestep. The group's attributes hold the
+        branch timestep and the id of the parent run.
+
+        :param filepath: the location of the h5 file, by default the
+          parent's database
+        :type filepath: str
+        """
+        filepath = self.filepath if filepath is None else filepath
+        history = self.history()
+        sweep.Sweep.write(self, filepath, groupname='branches', mode='a')
+        with tb.open_file(filepath, mode='a') as h5file:
+            group = h5file.root.branches
+            h5file.create_array(group, 'history', history,
+                                'Parent Solution up to the Branch')
+            group._v_attrs.t_idx = self.t_idx
+            group._v_attrs.parent = self.sim_id
+
+
+def add_arguments(ap):
+    """Adds the command line options of branched runs to a parser
+
+    :param ap: the parser
+    :type ap: argparse.ArgumentParser
+    """
+    sweep.add_arguments(ap)
+    ap.set_defaults(outfile='pyrk.h5')
+    ap.add_argument('--t-branch', type=float, required=True,
+                    help='the branch time in seconds')
+    return ap
+
+
+def main(args):
+    branches = Branches(args.infile, args.t_branch * units.seconds,
+                        sweep.samples_from_args(args),
+                        filepath=args.outfile, max_workers=args.workers,
+                        retries=args.retries)
+    branches.run()
+    branches.write()
+    for idx, msg in sorted(branches.errors.items()):
+        print('branch ' + str(idx) + ' failed: ' + msg)
+    return branches
+
+
+"""Run it as a script"""
+if __name__ == "__main__":
+    ap = add_arguments(argparse.ArgumentParser(description='PyRK branches'))
+    main(ap.parse_args())
@@ -0,0 +1,185 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+A local cache of finished simulations, keyed by a hash of the model.
+
+The key is the SHA-256 hash of a normalized description of everything the
+solution depends on: the timer, the components and their materials,
+conduction, convection and advection, the neutronics data, the external
+reactivity values, the events and the solver settings, along with the PyRK
+version. Two runs of the same input file have the same key, wherever the
+file is and whatever the run is called. An input file may ask for the
+cache::
+
+    cache = Cache('~/.cache/pyrk', max_bytes=2**30)
+
+or the driver may be run with ``--cache``. Before solving, the driver looks
+up the key. On a hit, the simulation is restored from the stored result, as
+from a checkpoint, and the solvers do not run. On a miss, the result is
+stored once the simulation is solved. The least recently used results are
+removed when the cache grows past max_bytes. The key is recorded in the
+metadata/sim_info table.
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+import pyrk
+from pyrk.checkpoint import Checkpoint
+from pyrk.inp import validation
+from pyrk.utilities.ur import units
+
+
+run_state = ['_T', 'prev_t_idx', 'timer', 't', 't_idx']
+"""run_state (list): attributes that change as a simulation runs, which are
+left out of the key. The timer is described once, and the temperatures of a
+component by their initial value."""
+
+
+def normalize(obj):
+    """Returns a description of an object made of python builtins, which
+    repr writes the same way in every process
+
+    :param obj: a part of the model
+    :type obj: object
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, units.Quantity):
+        return ('Quantity', normalize(obj.magnitude), str(obj.units))
+    if isinstance(obj, np.ndarray):
+        data = np.ascontiguousarray(obj).tobytes()
+        return ('ndarray', str(obj.dtype), obj.shape,
+                hashlib.sha256(data).hexdigest())
+    if isinstance(obj, dict):
+        return ('dict', sorted((str(key), normalize(val))
+                               for key, val in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return ('list', [normalize(val) for val in obj])
+    if callable(obj):
+        return ('callable', getattr(obj, '__qualname__',
+                                    type(obj).__qualname__))
+    cls = type(obj).__module__ + '.' + type(obj).__qualname__
+    return (cls, normalize(dict((key, val) for key, val in vars(obj).items()
+                                if key not in run_state)))
+
+
+def model(si, infile=None):
+    """Returns the normalized description of a simulation, before it is
+    solved
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param infile: the imported infile module, for its solver settings
+    :type infile: imported module
+    """
+    timer = si.timer
+    return [('version', pyrk.__version__),
+            ('timer', [normalize(q) for q in [timer.t0, timer.tf, timer.dt,
+                                              timer.t_feedback,
+                                              timer.series]]),
+            ('components', [(normalize(comp), normalize(comp.T[0]))
+                            for comp in si.components]),
+            ('neutronics', [si.iso, si.e, si.n_pg, si.n_dg, si.kappa,
+                            si.feedback, normalize(si.ne._pd),
+                            normalize(si.ne._dd)]),
+            ('rho_ext', normalize(si.ne._rho_ext_vals)),
+            ('events', normalize(si.events)),
+            ('solver', [si.solver, si.rtol, si.atol, si.jacobian,
+                        si.prompt_jump, si.steady_state,
+                        getattr(infile, 'nsteps', None)])]
+
+
+class Cache(object):
+    """This class stores finished simulations in a directory, one HDF5 file
+    per key, and removes the least recently used ones.
+    """
+
+    def __init__(self, directory='~/.cache/pyrk', max_bytes=2**30):
+        """Describes a result cache
+
+        :param directory: the directory of the stored results
+        :type directory: str
+        :param max_bytes: the largest total size of the stored results
+        :type max_bytes: int
+        """
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = int(validation.validate_ge("max_bytes", max_bytes,
+                                                    0))
+
+    def key(self, si, infile=None):
+        """Returns the key of a simulation, before it is solved
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        :param infile: the imported infile module, for its solver settings
+        :type infile: imported module
+        :rtype: str
+        """
+        return hashlib.sha256(repr(model(si, infile)).encode()).hexdigest()
+
+    def path(self, key):
+        """Returns the location of the result of a key
+
+        :param key: the key
+        :type key: str
+        """
+        return os.path.join(self.directory, key + '.h5')
+
+    def load(self, si, key):
+        """Restores the simulation from the result of its key, recording it
+        in the database, and returns True, or returns False on a miss.
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        :param key: the key of the simulation
+        :type key: str
+        :rtype: bool
+        """
+        path = self.path(key)
+        if not os.path.exists(path):
+            return False
+        Checkpoint(path).load(si)
+        # the modification time orders the results by their last use
+        os.utime(path)
+        return True
+
+    def store(self, si, key):
+        """Stores the result of a solved simulation under its key and
+        removes the least recently used results past max_bytes
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        :param key: the key of the simulation
+        :type key: str
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        os.close(fd)
+        try:
+            Checkpoint(tmp).save(si, {})
+            # concurrent runs of the same model replace the file whole
+            os.replace(tmp, self.path(key))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used results until the rest fit in
+        max_bytes
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.h5'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
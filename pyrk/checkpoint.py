@@ -0,0 +1,214 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Checkpoints save a running simulation to HDF5 so that it can be resumed.
+
+An input file may ask for a checkpoint every so many timesteps::
+
+    checkpoint = Checkpoint('pyrk_checkpoint.h5', every=1000)
+
+or the driver may be run with ``--checkpoint-every``. A checkpoint holds the
+solution, the component temperatures and the reactivity up to the current
+timestep, the external reactivity, the events that fired, and the state of
+the solver. The history is appended to the file as the simulation goes, so a
+checkpoint writes only the timesteps since the last one.
+
+``--restart`` loads the last checkpoint and continues from it. The BDF and
+Radau solvers pickle their integrator, and the split, exponential and
+multirate solvers their own state, so these continue bit-for-bit. LSODA
+keeps its state in Fortran and is restarted at the checkpoint instead. The
+output database is rewritten from the restored history, as the interrupted
+run recorded it.
+"""
+import os
+import pickle
+
+import numpy as np
+import tables as tb
+from scipy.integrate import DenseOutput
+
+from pyrk.inp import validation
+
+
+unpicklable = ['LU', 'LU_real', 'LU_complex']
+"""unpicklable (list): integrator attributes holding factorizations, which
+the integrators recompute identically from the Jacobian and step size"""
+
+
+def integrator_state(integrator):
+    """Returns the attributes of a scipy integrator that can be pickled, or
+    None for an integrator whose state is not held in python
+
+    :param integrator: the integrator
+    :type integrator: scipy.integrate.OdeSolver
+    :rtype: dict
+    """
+    if integrator is None or hasattr(integrator, '_lsoda_solver'):
+        return None
+    state = {}
+    for key, val in vars(integrator).items():
+        if key in unpicklable:
+            state[key] = None
+        elif not callable(val) or isinstance(val, DenseOutput):
+            state[key] = val
+    return state
+
+
+def restore_integrator(integrator, state):
+    """Overwrites the state of a new scipy integrator with a saved one
+
+    :param integrator: the integrator, built with the same functions
+    :type integrator: scipy.integrate.OdeSolver
+    :param state: the state from integrator_state
+    :type state: dict
+    """
+    vars(integrator).update(state)
+    return integrator
+
+
+class Checkpoint(object):
+    """This class saves the state of a simulation to an HDF5 file and
+    restores it.
+    """
+
+    def __init__(self, filepath='pyrk_checkpoint.h5', every=0):
+        """Describes the checkpoints of a simulation
+
+        :param filepath: the location of the checkpoint file
+        :type filepath: str
+        :param every: the number of timesteps between checkpoints, or 0 to
+          only restore from the file
+        :type every: int
+        """
+        self.filepath = filepath
+        self.every = int(validation.validate_ge("every", every, 0))
+        self.t_idx = None
+        """t_idx (int): the timestep of the last checkpoint, or None"""
+
+    def due(self, si):
+        """Returns True if a checkpoint should be saved at the current
+        timestep
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        """
+        if self.every == 0:
+            return False
+        last = self.t_idx if self.t_idx is not None else 0
+        return si.timer.current_timestep() >= last + self.every
+
+    def save(self, si, state):
+        """Appends the history since the last checkpoint to the file and
+        replaces the rest of the saved state
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        :param state: the state of the solver, which must pickle
+        :type state: dict
+        """
+        t_idx = si.timer.current_timestep()
+        mode = 'w' if self.t_idx is None else 'a'
+        with tb.open_file(self.filepath, mode=mode) as h5file:
+            root = h5file.root
+            if mode == 'w':
+                h5file.create_earray('/', 'y', tb.Float64Atom(),
+                                     (0, si.n_entries()), 'Solution')
+                h5file.create_earray('/', 'temps', tb.Float64Atom(),
+                                     (0, len(si.components)),
+                                     'Component Temperatures')
+                h5file.create_earray('/', 'rho', tb.Float64Atom(), (0,),
+                                     'Reactivity')
+            start = 0 if self.t_idx is None else self.t_idx + 1
+            temps = np.array([comp.T.magnitude[start:t_idx + 1]
+                              for comp in si.components]).T
+            for name in ['y', 'temps', 'rho']:
+                # past the checkpoint a restart was loaded from
+                getattr(root, name).truncate(start)
+            root.y.append(si.y[start:t_idx + 1])
+            root.temps.append(temps.reshape(-1, len(si.components)))
+            root.rho.append(si.ne._rho[start:t_idx + 1])
+            for name in ['rho_ext', 'events', 'solver']:
+                if name in root:
+                    h5file.remove_node('/', name)
+            h5file.create_array('/', 'rho_ext', si.ne._rho_ext_vals,
+                                'External Reactivity')
+            fired = [(event.t, event.t_idx) if event.fired else (np.nan, -1)
+                     for event in si.events]
+            h5file.create_array('/', 'events',
+                                np.array(fired, dtype=float).reshape(-1, 2),
+                                'Event Times and Timesteps')
+            h5file.create_array('/', 'solver',
+                                np.frombuffer(pickle.dumps(state),
+                                              dtype=np.uint8),
+                                'Pickled Solver State')
+            # written last, so that a checkpoint cut short is not restored
+            root._v_attrs.t_idx = t_idx
+            root._v_attrs.stride = si.db.stride
+            root._v_attrs.solver = si.solver
+        self.t_idx = t_idx
+
+    def load(self, si, replay=True):
+        """Restores the simulation to the last checkpoint, rewrites its
+        history into the database and returns the state of the solver. Later
+        checkpoints are appended to the same file.
+
+        :param si: the simulation info object, as created for the
+          interrupted run
+        :type si: SimInfo
+        :param replay: if False, the history is not recorded in the database
+        :type replay: bool
+        :rtype: dict
+        """
+        if not os.path.exists(self.filepath):
+            raise IOError('No checkpoint at ' + self.filepath)
+        with tb.open_file(self.filepath, mode='r') as h5file:
+            root = h5file.root
+            attrs = root._v_attrs
+            if attrs.solver != si.solver:
+                msg = 'The checkpoint was written by the ' + attrs.solver
+                msg += ' solver, not ' + si.solver
+                raise ValueError(msg)
+            t_idx = int(attrs.t_idx)
+            si.y[:t_idx + 1] = root.y.read(stop=t_idx + 1)
+            temps = root.temps.read(stop=t_idx + 1)
+            si.ne._rho[:t_idx + 1] = root.rho.read(stop=t_idx + 1)
+            si.ne._rho_ext_vals[:] = root.rho_ext.read()
+            fired = root.events.read()
+            state = pickle.loads(root.solver.read().tobytes())
+            stride = int(attrs.stride)
+        for idx, comp in enumerate(si.components):
+            comp.T.magnitude[:t_idx + 1] = temps[:, idx]
+        for event, (t, event_idx) in zip(si.events, fired):
+            if event_idx >= 0:
+                event.t = t
+                event.t_idx = int(event_idx)
+        if replay:
+            self.replay(si, t_idx)
+        si.db.stride = stride
+        si.timer.ts = t_idx
+        for comp in si.components:
+            comp.prev_t_idx = t_idx
+        self.t_idx = t_idx
+        return state
+
+    def replay(self, si, t_idx):
+        """Records the restored timesteps in the database in the order the
+        solvers record them, firing the logged events on the way.
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        :param t_idx: the last restored timestep
+        :type t_idx: int
+        """
+        fired = sorted([event for event in si.events if event.fired],
+                       key=lambda event: event.t)
+        for idx in range(1, t_idx + 1):
+            si.timer.ts = idx
+            for comp in si.components:
+                comp.prev_t_idx = idx - 1
+            si.db.record_all(idx - 1)
+            for event in fired:
+                if event.t_idx == idx:
+                    if event.action == 'decimate':
+                        si.db.stride = event.stride
+                    si.db.add_row(si.db.get_table('metadata', 'events'),
+                                  event.record())
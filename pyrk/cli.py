@@ -0,0 +1,48 @@
+#! /usr/bin/env python
+
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+The pyrk command. 'pyrk run' runs one simulation, like driver.py,
+'pyrk sweep' runs a parameter sweep of an input file, see pyrk.sweep,
+'pyrk uq' keeps only the statistics of sampled runs, see pyrk.uq, and
+'pyrk branch' runs branches of one simulation from a snapshot, see
+pyrk.branch.
+"""
+import argparse
+import os
+
+from pyrk import branch
+from pyrk import driver
+from pyrk import sweep
+from pyrk import uq
+
+
+def parser():
+    """Returns the parser of the pyrk command line"""
+    ap = argparse.ArgumentParser(prog='pyrk', description='PyRK')
+    sub = ap.add_subparsers(dest='command')
+    sub.required = True
+    driver.add_arguments(sub.add_parser('run', help='run a simulation'))
+    sweep.add_arguments(sub.add_parser('sweep',
+                                       help='run a parameter sweep'))
+    uq.add_arguments(sub.add_parser('uq', help='run a Monte Carlo '
+                                    'uncertainty study'))
+    branch.add_arguments(sub.add_parser('branch', help='run branches of a '
+                                        'simulation from a snapshot'))
+    return ap
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if args.command == 'run':
+        return driver.main(args, os.path.dirname(driver.__file__))
+    elif args.command == 'sweep':
+        return sweep.main(args)
+    elif args.command == 'branch':
+        return branch.main(args)
+    return uq.main(args)
+
+
+"""Run it as a script"""
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import numpy as np
+import pytest
+
+from pyrk import th_component as th
+from pyrk.convective_model import ConvectiveModel
+from pyrk.density_model import DensityModel
+from pyrk.materials.liquid_material import LiquidMaterial
+from pyrk.materials.material import Material
+from pyrk.reactivity_insertion import StepReactivityInsertion
+from pyrk.timer import Timer
+from pyrk.utilities.ur import units
+
+
+infile_src = '''
+from pyrk.density_model import DensityModel
+from pyrk.materials.material import Material
+from pyrk.reactivity_insertion import StepReactivityInsertion
+from pyrk.th_component import THComponent
+from pyrk.timer import Timer
+from pyrk.utilities.ur import units
+
+ti = Timer(t0=0.0 * units.seconds, tf=1.0 * units.seconds,
+           dt=0.1 * units.seconds, t_feedback=0.2 * units.seconds)
+mat = Material(k=10 * units.watt / units.meter / units.kelvin,
+               cp=1000 * units.joule / units.kg / units.kelvin,
+               dm=DensityModel(a=2000 * units.kg / units.meter**3,
+                               model='constant'))
+fuel = THComponent(name='fuel', mat=mat, vol=1 * units.meter**3,
+                   T0=900 * units.kelvin,
+                   alpha_temp=-1 * units.pcm / units.kelvin,
+                   timer=ti, heatgen=True, power_tot=1e6 * units.watt)
+mod = THComponent(name='mod', mat=mat, vol=1 * units.meter**3,
+                  T0=850 * units.kelvin,
+                  alpha_temp=-0.5 * units.pcm / units.kelvin, timer=ti)
+fuel.add_conduction('mod', area=1 * units.meter**2, L=0.1 * units.meter)
+mod.add_conduction('fuel', area=1 * units.meter**2, L=0.1 * units.meter)
+mod.add_advection('mod', 10 * units.kg / units.seconds,
+                  800 * units.kelvin, cp=mod.cp)
+components = [fuel, mod]
+rho_ext = StepReactivityInsertion(timer=ti, t_step=0.5 * units.seconds,
+                                  rho_final=100 * units.pcm)
+fission_iso = 'u235'
+spectrum = 'thermal'
+n_pg = 6
+n_dg = 0
+kappa = 0.0
+feedback = True
+solver = 'bdf'
+nsteps = 1000
+'''
+
+
+@pytest.fixture
+def infile(tmp_path):
+    path = tmp_path / 'sweep_input.py'
+    path.write_text(infile_src)
+    return str(path)
+
+
+def fuel_and_moderator(ti=None, dt=0.1, t_feedback=0.2, grid=None,
+                       alpha_fuel=-1.0, power_tot=1e6, k=10.0, cp=1000.0,
+                       m_flow=None, t_step=0.5, rho_final=100.0):
+    """Returns the timer, the components and the external reactivity of a
+    fuel and moderator pair driven by a step insertion, as keyword arguments
+    of SimInfo. It is the model of infile_src, with its parameters in plain
+    numbers.
+
+    :param ti: the timer, or None for one from 0 to 1 s
+    :type ti: Timer or None
+    :param dt: the timestep [s] of a new timer
+    :type dt: float
+    :param t_feedback: the time [s] feedback starts at in a new timer
+    :type t_feedback: float
+    :param grid: the output times of a new timer, or None
+    :type grid: Quantity array or None
+    :param alpha_fuel: the temperature coefficient [pcm/K] of the fuel
+    :type alpha_fuel: float
+    :param power_tot: the power [W] of the fuel
+    :type power_tot: float
+    :param k: the thermal conductivity [W/m/K] of both components
+    :type k: float
+    :param cp: the specific heat capacity [J/kg/K] of both components
+    :type cp: float
+    :param m_flow: the coolant flow [kg/s] through the moderator, or None
+      for no cooling
+    :type m_flow: float or None
+    :param t_step: the time [s] of the step insertion
+    :type t_step: float
+    :param rho_final: the reactivity [pcm] after the step
+    :type rho_final: float
+    :rtype: dict
+    """
+    if ti is None:
+        ti = Timer(t0=0.0 * units.seconds, tf=1.0 * units.seconds,
+                   dt=dt * units.seconds,
+                   t_feedback=t_feedback * units.seconds, grid=grid)
+    mat = Material(k=k * units.watt / units.meter / units.kelvin,
+                   cp=cp * units.joule / units.kg / units.kelvin,
+                   dm=DensityModel(a=2000 * units.kg / units.meter**3,
+                                   model='constant'))
+    fuel = th.THComponent(name='fuel', mat=mat, vol=1 * units.meter**3,
+                          T0=900 * units.kelvin,
+                          alpha_temp=alpha_fuel * units.pcm / units.kelvin,
+                          timer=ti, heatgen=True,
+                          power_tot=power_tot * units.watt)
+    mod = th.THComponent(name='mod', mat=mat, vol=1 * units.meter**3,
+                         T0=850 * units.kelvin,
+                         alpha_temp=-0.5 * units.pcm / units.kelvin,
+                         timer=ti)
+    fuel.add_conduction('mod', area=1 * units.meter**2, L=0.1 * units.meter)
+    mod.add_conduction('fuel', area=1 * units.meter**2, L=0.1 * units.meter)
+    if m_flow is not None:
+        mod.add_advection('mod', m_flow * units.kg / units.seconds,
+                          800 * units.kelvin, cp=mod.cp)
+    rho_ext = StepReactivityInsertion(timer=ti,
+                                      t_step=t_step * units.seconds,
+                                      rho_final=rho_final * units.pcm)
+    return dict(timer=ti, components=[fuel, mod], rho_ext=rho_ext)
+
+
+@pytest.fixture
+def fuel_mod():
+    """The factory of the fuel and moderator model of the simulation tests
+    """
+    return fuel_and_moderator
+
+
+def pebble(dr=0.003, reflector=False):
+    """Returns the timer and the components of a meshed pebble in a coolant
+    channel, like the PB-FHR examples, as keyword arguments of SimInfo
+
+    :param dr: the thickness [m] of the shells of the pebble mesh
+    :type dr: float
+    :param reflector: if True, a slab reflector exchanges heat with the
+      coolant
+    :type reflector: bool
+    :rtype: dict
+    """
+    ti = Timer(t0=0.0 * units.seconds, tf=1.0 * units.seconds,
+               dt=0.1 * units.seconds, t_feedback=0.0 * units.seconds)
+    graphite = Material('graphite', 17 * units.watt / units.meter /
+                        units.kelvin,
+                        1650.0 * units.joule / units.kg / units.kelvin,
+                        DensityModel(a=1740. * units.kg / units.meter**3,
+                                     model="constant"))
+    flibe = LiquidMaterial('cool', 1 * units.watt / units.meter /
+                           units.kelvin,
+                           2415.78 * units.joule / units.kg / units.kelvin,
+                           DensityModel(a=2415.6 * units.kg / units.meter**3,
+                                        b=0.49072 * units.kg /
+                                        units.meter**3 / units.kelvin,
+                                        model="linear"),
+                           0 * units.pascal * units.second)
+    h_cool = ConvectiveModel(h0=4700.0 * units.watt / units.kelvin /
+                             units.meter**2, mat=flibe, model='constant')
+    fuel = th.THComponent(name="fuel", mat=graphite,
+                          vol=4.0 / 3.0 * np.pi * (0.015 * units.meter)**3,
+                          T0=1000 * units.kelvin,
+                          alpha_temp=-3 * units.pcm / units.kelvin,
+                          timer=ti, heatgen=True, power_tot=500 * units.watt,
+                          sph=True, ri=0.0 * units.meter,
+                          ro=0.015 * units.meter)
+    mesh = fuel.mesh(dr * units.meter)
+    shell = th.THSuperComponent('pebble', 950 * units.kelvin, mesh,
+                                timer=ti)
+    shell.add_conv_bc('cool', h=h_cool)
+    cool = th.THComponent(name="cool", mat=flibe, vol=1e-5 * units.meter**3,
+                          T0=900 * units.kelvin,
+                          alpha_temp=0.2 * units.pcm / units.kelvin,
+                          timer=ti)
+    cool.add_convection('pebble', h=h_cool,
+                        area=4 * np.pi * (0.015 * units.meter)**2)
+    components = mesh + [shell, cool]
+    if reflector:
+        refl = th.THComponent(name="refl", mat=graphite,
+                              vol=1e-5 * units.meter**3,
+                              T0=850 * units.kelvin, timer=ti)
+        cool.add_convection('refl', h=h_cool, area=1e-3 * units.meter**2)
+        refl.add_convection('cool', h=h_cool, area=1e-3 * units.meter**2)
+        refl.add_conduction('cool', area=1e-3 * units.meter**2,
+                            L=0.01 * units.meter)
+        components.append(refl)
+    cool.add_advection('cool', 0.002 * units.kg / units.seconds,
+                       units.Quantity(600.0, units.degC), cp=cool.cp)
+    return dict(timer=ti, components=components)
+
+
+@pytest.fixture
+def pebble_model():
+    """The factory of the pebble model of the Jacobian and network tests"""
+    return pebble
@@ -1,4 +1,5 @@
 # Licensed under a 3-clause BSD style license - see LICENSE
+import numpy as np
 import tables as tb
 from pyrk.db import descriptions as desc
 
@@ -36,7 +37,10 @@ class Database(object):
 
     def __init__(self, filepath='pyrk.h5',
                  mode='w',
-                 title='PyRKDatabase'
+                 title='PyRKDatabase',
+                 stride=1,
+                 tolerance=None,
+                 envelope=False
                 ):
         """Creates an hdf5 database for simulation information
 
@@ -46,9 +50,47 @@ class Database(object):
         :type mode: str (a, w, and r are supported)
         :param title: The title of the database
         :type title: str
+        :param stride: only every stride-th timestep is recorded
+        :type stride: int
+        :param tolerance: if given, a timestep is only recorded when the
+          power, key 'power', or the temperature [K] of a component, key
+          'temp', has moved by more than its tolerance since the last
+          timestep recorded
+        :type tolerance: dict or None
+        :param envelope: if True, the smallest and largest power and
+          temperatures since the last timestep recorded are written to the
+          metadata/envelope table with each timestep recorded
+        :type envelope: bool
         """
         self.recorders = []
         self.tablehandles = {}
+        self.stride = int(stride)
+        """stride (int): only every stride-th timestep is recorded"""
+        self.tolerance = tolerance if tolerance is not None else {}
+        """tolerance (dict): the changes of 'power' and 'temp' that make a
+        timestep worth recording"""
+        self.envelope = envelope
+        """envelope (bool): whether the extremes between the timesteps
+        recorded are recorded too"""
+        self.monitor = None
+        """monitor (function): returns the power and the temperatures at a
+        timestep"""
+        self.monitored = []
+        """monitored (list): the names of the values the monitor returns"""
+        self._last = None
+        """_last (ndarray): the monitored values last recorded"""
+        self._lo = None
+        """_lo (ndarray): the smallest monitored values since the last
+        timestep recorded"""
+        self._hi = None
+        """_hi (ndarray): the largest monitored values since the last
+        timestep recorded"""
+        self._first = None
+        """_first (int): the first timestep since the last one recorded"""
+        self._seen = None
+        """_seen (int): the last timestep passed to keep"""
+        self._recorded = None
+        """_recorded (int): the last timestep recorded"""
         self.mode = mode
         self.title = title
         self.filepath = filepath
@@ -98,6 +140,36 @@ class Database(object):
                                                         tabletitle)
         return self.tablehandles[p]
 
+    def add_array(self, groupname, arrayname, arr, arraytitle):
+        """Creates a new array, replacing any array of the same name.
+        All groupnames must be directly under root
+
+        :param groupname: name of the group holding the array
+        :type groupname: str
+        :param arrayname: name of the array to add
+        :type arrayname: str
+        :param arr: the values of the array
+        :type arr: np.ndarray
+        :param arraytitle: metadata to store in plain english, a title
+        :type arraytitle: str
+        """
+        self.open_db()
+        if self.group_exists('/' + groupname, arrayname) is not False:
+            self.h5file.remove_node('/' + groupname, arrayname)
+        return self.h5file.create_array('/' + groupname, arrayname, arr,
+                                        arraytitle)
+
+    def get_array(self, groupname, arrayname):
+        """Returns the array handle for an array within a group
+
+        :param groupname: name of the group
+        :type groupname: str
+        :param arrayname: name of the array in the group
+        :type arrayname: str
+        """
+        self.open_db()
+        return self.h5file.get_node('/' + groupname, arrayname)
+
     def add_row(self, table, row_dict):
         """Adds a row to the table and flushes the table
 
@@ -145,14 +217,110 @@ class Database(object):
         with nostderr():
             tb.file._open_files.close_all()
 
-    def record_all(self):
+    def record_all(self, t_idx=None):
         """For each row sent by current recorders, add the row.
+
+        :param t_idx: the timestep being recorded. If given, it is skipped
+          unless it is a multiple of the stride and, with a tolerance, its
+          monitored values have changed enough.
+        :type t_idx: int
         """
+        if t_idx is not None and not self.keep(t_idx):
+            return
         for i in self.recorders:
             t = i[0]
             r = i[1]
             self.add_row(t, r())
 
+    def flush(self, t_idx=None):
+        """Records what keep held back when a run ends: the last timestep
+        passed to it, if it was skipped, and the envelope since the last
+        timestep recorded, up to and including the final timestep
+
+        :param t_idx: the final timestep of the run, which the driver does
+          not record, or None
+        :type t_idx: int
+        """
+        if self.envelope and self.monitor is not None and t_idx is not None:
+            self.extend(t_idx, np.array(self.monitor(t_idx), dtype=float))
+        if self._seen is not None and self._seen != self._recorded:
+            for tab, recorder in self.recorders:
+                self.add_row(tab, recorder())
+            self._recorded = self._seen
+        if self._lo is not None:
+            self.write_envelope(self._seen if t_idx is None else t_idx)
+
+    def register_monitor(self, names, monitor):
+        """Registers the function that returns the values watched by the
+        tolerance and the envelope
+
+        :param names: the name of each value, 'power' or a component name
+        :type names: list of str
+        :param monitor: returns the values at a timestep
+        :type monitor: function
+        """
+        self.monitored = list(names)
+        self.monitor = monitor
+
+    def keep(self, t_idx):
+        """Returns whether a timestep is recorded, updating the envelope
+
+        :param t_idx: the timestep
+        :type t_idx: int
+        """
+        self._seen = t_idx
+        values = None
+        if self.monitor is not None and (self.tolerance or self.envelope):
+            values = np.array(self.monitor(t_idx), dtype=float)
+        if self.envelope and values is not None:
+            self.extend(t_idx, values)
+        if t_idx % self.stride != 0:
+            return False
+        if self.tolerance and values is not None and \
+                self._last is not None:
+            tol = np.array([self.tolerance.get('power' if name == 'power'
+                                               else 'temp', np.inf)
+                            for name in self.monitored])
+            if not np.any(np.abs(values - self._last) > tol):
+                return False
+        if values is not None:
+            self._last = values
+        if self.envelope and values is not None:
+            self.write_envelope(t_idx)
+        self._recorded = t_idx
+        return True
+
+    def extend(self, t_idx, values):
+        """Widens the envelope since the last timestep recorded to hold the
+        monitored values of a timestep
+
+        :param t_idx: the timestep
+        :type t_idx: int
+        :param values: the monitored values at the timestep
+        :type values: np.ndarray
+        """
+        if self._lo is None:
+            self._lo = values.copy()
+            self._hi = values.copy()
+            self._first = t_idx
+        else:
+            np.minimum(self._lo, values, out=self._lo)
+            np.maximum(self._hi, values, out=self._hi)
+
+    def write_envelope(self, t_idx):
+        """Writes the envelope since the last timestep recorded to the
+        metadata/envelope table, and starts a new one
+
+        :param t_idx: the timestep recorded
+        :type t_idx: int
+        """
+        tab = self.get_table('metadata', 'envelope')
+        for name, lo, hi in zip(self.monitored, self._lo, self._hi):
+            self.add_row(tab, {'t_idx': t_idx, 't_first': self._first,
+                               'quantity': name, 'min': lo, 'max': hi})
+        self._lo = None
+        self._hi = None
+
     def delete_db(self):
         """If the database exists, delete it"""
         import os.path
@@ -208,6 +376,14 @@ class Database(object):
                        'tablename': 'sim_timeseries',
                        'description': desc.SimTimeseriesRow,
                        'tabletitle': 'Simulation Power Data'})
+        tables.append({'groupname': 'metadata',
+                       'tablename': 'events',
+                       'description': desc.EventRow,
+                       'tabletitle': 'Event Log'})
+        tables.append({'groupname': 'metadata',
+                       'tablename': 'envelope',
+                       'description': desc.EnvelopeRow,
+                       'tabletitle': 'Extremes Between Recorded Timesteps'})
         tables.append({'groupname': 'th',
                        'tablename': 'th_params',
                        'description': desc.ThMetadataRow,
@@ -283,3 +459,42 @@ class Database(object):
         except KeyError:
             msg = "table path " + p + " not found among table handles."
             raise KeyError(msg)
+
+
+class NullDatabase(object):
+    """A stand-in for the Database that records nothing, for simulations
+    whose results are only wanted in memory. No file is created, and the
+    recorder functions, including the metadata, are never called.
+    """
+
+    def __init__(self):
+        """Creates a database that records nothing"""
+        self.recorders = []
+        self.stride = 1
+        """stride (int): kept so that decimation events still apply"""
+        self.filepath = None
+
+    def register_recorder(self, groupname, tablename, recorder,
+                          timeseries=False):
+        """Ignores an entity that wants to represent itself in the Database
+        """
+
+    def register_monitor(self, names, monitor):
+        """Ignores the values to watch"""
+
+    def get_table(self, groupname, tablename):
+        """There are no tables, so this returns None"""
+        return None
+
+    def add_row(self, table, row_dict):
+        """Drops the row"""
+
+    def record_all(self, t_idx=None):
+        """Records nothing"""
+
+    def flush(self, t_idx=None):
+        """Records nothing"""
+
+    def close_db(self):
+        """There is nothing to close. Unlike Database.close_db, the files
+        other objects opened are left open."""
@@ -49,6 +49,28 @@ class ThTimeseriesRow(tb.IsDescription):
     power_tot = tb.Float64Col()
 
 
+class EventRow(tb.IsDescription):
+    """A row descriptor for an event that fired during the simulation
+    """
+    t_idx = tb.Int32Col()
+    time = tb.Float64Col()
+    name = tb.StringCol(16)
+    quantity = tb.StringCol(16)
+    threshold = tb.Float64Col()
+    action = tb.StringCol(16)
+
+
+class EnvelopeRow(tb.IsDescription):
+    """A row descriptor for the smallest and largest values of a quantity
+    over the timesteps t_first to t_idx, of which only t_idx was recorded
+    """
+    t_idx = tb.Int64Col()
+    t_first = tb.Int64Col()
+    quantity = tb.StringCol(16)
+    min = tb.Float64Col()
+    max = tb.Float64Col()
+
+
 class ThMetadataRow(tb.IsDescription):
     """A row descriptor to describe thermal metadata
     """
@@ -83,7 +105,9 @@ class SimInfoRow(tb.IsDescription):
     n_pg = tb.Int32Col()
     n_dg = tb.Int32Col()
     kappa = tb.Float64Col()
+    solver = tb.StringCol(16)
     plotdir = tb.StringCol(16)
+    cachekey = tb.StringCol(64)
 
 
 class SimTimeseriesRow(tb.IsDescription):
@@ -91,4 +115,5 @@ class SimTimeseriesRow(tb.IsDescription):
     Power Info
     """
     t_idx = tb.Int64Col()
+    time = tb.Float64Col()
     power = tb.Float64Col()
@@ -1,5 +1,8 @@
+from pyrk import driver
 from pyrk.db import database as d
+from pyrk.inp.sim_info import SimInfo
 
+import numpy as np
 import pytest
 
 def dictfunc():
@@ -98,6 +101,7 @@ class TestDatabase:
             assert t['tablename'] in ['th_params', 'th_timeseries',
                                       'sim_info',
                                       'sim_timeseries',
+                                      'events', 'envelope',
                                       'neutronics_timeseries',
                                       'neutronics_params',
                                       'zetas',
@@ -109,3 +113,87 @@ class TestDatabase:
             assert g['groupname'] in ['th',
                                       'metadata',
                                       'neutronics']
+
+    def test_record_all_skips_timesteps_off_the_stride(self):
+        tab = self.a.get_table('metadata', 'sim_timeseries')
+        rows = iter(range(10))
+        self.a.register_recorder('metadata', 'sim_timeseries',
+                                 lambda: {'t_idx': next(rows), 'power': 1.0},
+                                 timeseries=True)
+        self.a.stride = 3
+        for t_idx in range(7):
+            self.a.record_all(t_idx)
+        assert list(tab.col('t_idx')) == [0, 1, 2]
+        self.a.record_all()
+        assert tab.nrows == 4
+
+    def test_record_all_skips_timesteps_that_hardly_change(self):
+        tab = self.a.get_table('metadata', 'sim_timeseries')
+        power = [1.0, 1.001, 1.002, 1.05, 1.051, 1.2, 1.2]
+        temps = [900.0, 900.0, 900.0, 900.0, 901.0, 901.0, 901.0]
+        self.a.register_monitor(['power', 'fuel'],
+                                lambda t_idx: [power[t_idx], temps[t_idx]])
+        self.a.register_recorder('metadata', 'sim_timeseries',
+                                 lambda: {'t_idx': t, 'power': 1.0},
+                                 timeseries=True)
+        self.a.tolerance = {'power': 0.01, 'temp': 0.5}
+        for t in range(7):
+            self.a.record_all(t)
+        assert list(tab.col('t_idx')) == [0, 3, 4, 5]
+
+    def test_envelope_between_recorded_timesteps(self):
+        power = [1.0, 3.0, 2.0, 0.5, 1.5, 1.0, 4.0]
+        self.a.register_monitor(['power'], lambda t_idx: [power[t_idx]])
+        self.a.stride = 3
+        self.a.envelope = True
+        for t_idx in range(7):
+            self.a.record_all(t_idx)
+        rows = self.a.get_table('metadata', 'envelope').read()
+        assert list(rows['t_idx']) == [0, 3, 6]
+        assert list(rows['t_first']) == [0, 1, 4]
+        assert list(rows['min']) == [1.0, 0.5, 1.0]
+        assert list(rows['max']) == [1.0, 3.0, 4.0]
+        assert rows['quantity'][0] == b'power'
+
+    def test_flush_records_what_the_run_held_back(self):
+        self.a.register_monitor(['power'], lambda t_idx: [float(t_idx)])
+        self.a.register_recorder('metadata', 'sim_timeseries',
+                                 lambda: {'t_idx': t, 'power': 1.0},
+                                 timeseries=True)
+        self.a.stride = 3
+        self.a.envelope = True
+        for t in range(5):
+            self.a.record_all(t)
+        self.a.flush(5)
+        tab = self.a.get_table('metadata', 'sim_timeseries')
+        assert list(tab.col('t_idx')) == [0, 3, 4]
+        rows = self.a.get_table('metadata', 'envelope').read()
+        assert list(rows['t_idx']) == [0, 3, 5]
+        assert list(rows['t_first']) == [0, 1, 4]
+        assert list(rows['max']) == [0.0, 3.0, 5.0]
+        # nothing is left to flush
+        self.a.flush()
+        assert tab.nrows == 3
+
+
+def test_recording_rate_is_independent_of_the_timestep(fuel_mod):
+    db = d.Database(mode='w', stride=10, envelope=True)
+    si = SimInfo(n_decay=0, feedback=True, solver='bdf', db=db,
+                 **fuel_mod(dt=0.01))
+    sol = driver.solve(si, si.y, None)
+    timeseries = db.get_table('metadata', 'sim_timeseries').read()
+    envelope = db.get_table('metadata', 'envelope').read()
+    db.close_db()
+    db.delete_db()
+    # the last timestep recorded, 99, is recorded when the run ends
+    assert list(timeseries['t_idx']) == list(range(0, 100, 10)) + [99]
+    power = envelope[envelope['quantity'] == b'power']
+    fuel = envelope[envelope['quantity'] == b'fuel']
+    for row in power:
+        window = sol[row['t_first']:row['t_idx'] + 1, 0]
+        assert row['min'] == window.min()
+        assert row['max'] == window.max()
+    # the envelope reaches the end of the run
+    assert power['t_idx'][-1] == 100
+    assert fuel['max'][-1] == sol[91:, -2].max()
+    assert np.all(np.diff(power['t_idx']) > 0)
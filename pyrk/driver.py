@@ -9,14 +9,19 @@ scripts.
 
 import numpy as np
 from scipy.integrate import ode
+from scipy.integrate import BDF, LSODA, Radau, OdeSolution
 import importlib
 import argparse
+from pyrk import cache
+from pyrk import checkpoint
+from pyrk import events
+from pyrk import jacobian
+from pyrk import multirate
 from pyrk.db import database
 from pyrk.utilities import logger
 from pyrk.utilities import plotter
 from pyrk.utilities.logger import pyrklog
 from pyrk.inp import sim_info
-from pyrk.utilities.ur import units
 import os
 
 
@@ -28,9 +33,11 @@ def update_n(t, y_n, si):
     :param y_n: The array that solves the neutronics block at time t
     :type y_n: np.ndarray.
     """
-    t_idx = si.timer.t_idx(t * units.seconds)
+    t_idx = si.timer.idx(t)
     n_n = len(y_n)
-    si.y[t_idx][:n_n] = y_n
+    si.y[t_idx, :n_n] = y_n
+    if si.ne.prompt_jump:
+        si.y[t_idx, 0] = si.ne.power(y_n, si.ne._rho[t_idx])
 
 
 def update_th(t, y_n, y_th, si):
@@ -42,41 +49,32 @@ def update_th(t, y_n, y_th, si):
     :param y_th: The array that solves thermal hydraulics block at time t
     :type y_th: np.ndarray.
     """
-    t_idx = si.timer.t_idx(t * units.seconds)
+    t_idx = si.timer.idx(t)
     for idx, comp in enumerate(si.components):
-        comp.update_temp(t_idx, y_th[idx] * units.kelvin)
+        comp.update_temp(t_idx, y_th[idx])
     n_n = len(y_n)
-    si.y[t_idx][n_n:] = y_th
+    si.y[t_idx, n_n:] = y_th
 
 
-def f_n(t, y, si):
+def f_n(t, y, si, out=None):
     """Returns the neutronics block solution at time t
 
     :param t: the time [s] at which the update is occuring.
     :type t: float.
     :param y: solution vector
     :type y: np.ndarray
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param out: preallocated array for the result, or None
+    :type out: np.ndarray
     """
     n_n = 1 + si.n_pg + si.n_dg
     if len(y) < n_n:
         msg = 'equation numbers %d ' % len(y)
         msg += 'should be at least the number of neutronics equations %d' % n_n
         raise ValueError(msg)
-    end_pg = 1 + si.n_pg
-    f = np.zeros(shape=(n_n,), dtype=float)
-    i = 0
-    f[i] = si.ne.dpdt(si.timer.ts,
-                      si.components,
-                      y[0],
-                      y[1:end_pg])
-    for j in range(0, si.n_pg):
-        i += 1
-        f[i] = si.ne.dzetadt(t, y[0], y[i], j)
-    assert i == end_pg - 1
-    for k in range(0, si.n_dg):
-        i += 1
-        f[i] = si.ne.dwdt(y[0], y[i], k)
-    return f
+    rho = si.ne.reactivity(si.timer.ts, si.components)
+    return si.ne.dydt(y[:n_n], rho, out=out)
 
 
 def f_th(t, y_th, si):
@@ -89,27 +87,72 @@ def f_th(t, y_th, si):
     :param si: the simulation info object
     :type si: SimInfo
     """
-    t_idx = si.timer.t_idx(t * units.seconds)
-    f = units.Quantity(np.zeros(shape=(si.n_components(),), dtype=float),
-                       'kelvin / second')
+    t_idx = si.timer.idx(t)
     power = si.y[t_idx][0]
     o_i = 1 + si.n_pg
     o_f = 1 + si.n_pg + si.n_dg
     omegas = si.y[t_idx][o_i:o_f]
-    for idx, comp in enumerate(si.components):
-        f[idx] = si.th.dtempdt(component=comp,
-                               power=power,
-                               omegas=omegas,
-                               t_idx=t_idx)
+    temps = np.array([comp.T.magnitude[t_idx] for comp in si.components])
+    return si.th.get_network().dtempdt(temps, power, omegas)
+
+
+def f_coupled(t, y, si, feedback):
+    """Returns the derivative of the full coupled state vector at time t.
+    Unlike f_n and f_th, every term is evaluated from the state y itself, so
+    that implicit integrators see the whole neutronics/thermal-hydraulics
+    system at once.
+
+    :param t: the time [s] at which the update is occuring.
+    :type t: float.
+    :param y: the full solution vector, neutronics block first
+    :type y: np.ndarray
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param feedback: whether temperature feedback is active in this segment
+    :type feedback: bool
+    """
+    end_pg = 1 + si.n_pg
+    n_n = 1 + si.n_pg + si.n_dg
+    y_th = y[n_n:]
+    rho = si.ne.reactivity_at(t, si.components, y_th, feedback)
+    f = np.zeros(shape=(si.n_entries(),), dtype=float)
+    si.ne.dydt(y[:n_n], rho, out=f[:n_n])
+    si.th.get_network().dtempdt(y_th, si.ne.power(y, rho), y[end_pg:n_n],
+                                out=f[n_n:])
     return f
 
 
+def update_coupled(t, y, si, feedback):
+    """This function updates both blocks from the full coupled solution.
+
+    :param t: the time [s] at which the update is occuring.
+    :type t: float.
+    :param y: the full solution vector at time t
+    :type y: np.ndarray
+    :param feedback: whether temperature feedback is active in this segment
+    :type feedback: bool
+    """
+    t_idx = si.timer.idx(t)
+    n_n = 1 + si.n_pg + si.n_dg
+    y_th = y[n_n:]
+    for idx, comp in enumerate(si.components):
+        comp.update_temp(t_idx, y_th[idx])
+    si.ne._rho[t_idx] = si.ne.reactivity_from_temps(t_idx, si.components,
+                                                    y_th, feedback)
+    si.y[t_idx] = y
+    si.y[t_idx, 0] = si.ne.power(y, si.ne._rho[t_idx])
+
+
 def y0(si):
     """The initial conditions for y
 
     :param si: the simulation info object
     :type si: SimInfo
     """
+    if si.steady_state:
+        f = steady_state(si)
+        si.y[0] = f
+        return f
     i = 0
     end_pg = 1 + si.n_pg
     end_dg = 1 + si.n_pg + si.n_dg
@@ -131,6 +174,24 @@ def y0(si):
     return f
 
 
+def steady_state(si):
+    """Returns the steady state of the reactor at unit power, with
+    saturated precursor and decay heat groups, and the temperatures at which
+    every dT/dt vanishes. The temperatures are also written into the first
+    timestep of each component, so the transient starts from them.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    """
+    y_n = si.ne.equilibrium(power=1.0)
+    temps0 = np.array([comp.T0.magnitude for comp in si.components])
+    temps = si.th.get_network().steady_state(y_n[0], y_n[1 + si.n_pg:],
+                                             temps0)
+    for idx, comp in enumerate(si.components):
+        comp.update_temp(0, temps[idx])
+    return np.concatenate([y_n, temps])
+
+
 def y0_n(si):
     """Initial conditions for y_n, the neutronics sub-block of y
 
@@ -153,8 +214,11 @@ def y0_th(si):
     return y
 
 
-def solve(si, y, infile):
-    """Conducts the solution step, based on the dopri5 integrator in scipy
+def solve(si, y, infile, resume=None):
+    """Conducts the solution step with the solver chosen in si.solver. If a
+    terminal event fires, the solution ends at the timestep in which it
+    fired. With a cache, a simulation solved before is restored from it
+    instead, and a new one is stored in it.
 
     :param si: the simulation info object
     :type si: SimInfo
@@ -162,31 +226,390 @@ def solve(si, y, infile):
     :type y: np.ndarray
     :param infile: the imported infile module
     :type infile: imported module
+    :param resume: the solver state returned by Checkpoint.load, to continue
+      from the restored timestep, or None to start from t0
+    :type resume: dict
+    :return: the solution up to the last timestep solved, or only the last
+      timestep if si keeps no history
+    :rtype: np.ndarray
     """
+    for t_idx in steps(si, y, infile, resume):
+        pass
+    t_idx = si.timer.current_timestep()
+    if not si.history:
+        return si.y[t_idx][np.newaxis].copy()
+    return si.y[:t_idx + 1]
+
+
+def steps(si, y, infile, resume=None):
+    """Solves the simulation like solve, one timestep at a time. Yields the
+    index of the initial timestep, and then of each timestep once it is
+    solved, recorded and checked for events. A simulation that is not run
+    to its end is not stored in the cache. Sending True instead of calling
+    next tells the solver that the equations changed since the yield, as in
+    pyrk.realtime, so that it restarts its integrator.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param y: the solution vector
+    :type y: np.ndarray
+    :param infile: the imported infile module
+    :type infile: imported module
+    :param resume: the solver state returned by Checkpoint.load, to continue
+      from the restored timestep, or None to start from t0
+    :type resume: dict
+    """
+    key = None
+    if si.cache is not None and resume is None:
+        key = si.cache.key(si, infile)
+        si.record_cache_key(key)
+        if si.cache.load(si, key):
+            for t_idx in range(si.timer.current_timestep() + 1):
+                yield t_idx
+            return
+    si.th.compile()
+    if si.solver == 'split':
+        solver = solve_split
+    elif si.solver == 'multirate':
+        solver = solve_multirate
+    elif si.solver == 'exponential':
+        solver = solve_exponential
+    else:
+        solver = solve_coupled
+    yield from solver(si, y, infile, resume)
+    si.db.flush(si.timer.current_timestep())
+    if key is not None:
+        si.cache.store(si, key)
+
+
+def stream(si, infile, resume=None):
+    """Solves the simulation like solve, yielding the state of the initial
+    timestep and then of each timestep as soon as it is solved. The
+    consumer may stop early. With si.history False, only the last few
+    timesteps and the feedback reference are kept, so memory does not grow
+    with the number of timesteps.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param infile: the imported infile module
+    :type infile: imported module
+    :param resume: the solver state returned by Checkpoint.load, or None
+    :type resume: dict
+    :return: the time [s], the normalized power, the precursor
+      concentrations, the decay heats, the component temperatures [K] and
+      the reactivity [dk] of each timestep
+    :rtype: generator of (float, float, np.ndarray, np.ndarray, np.ndarray,
+      float) tuples
+    """
+    end_pg = 1 + si.n_pg
+    n_n = 1 + si.n_pg + si.n_dg
+    for t_idx in steps(si, si.y, infile, resume):
+        row = si.y[t_idx]
+        yield (si.timer.seconds(t_idx), row[0], row[1:end_pg].copy(),
+               row[end_pg:n_n].copy(), row[n_n:].copy(),
+               si.ne._rho[t_idx])
+
+
+def save_checkpoint(si, **state):
+    """Saves a checkpoint of the simulation and the solver state, if one is
+    due
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param state: the state of the solver. Integrators are saved with
+      checkpoint.integrator_state.
+    :type state: dict
+    """
+    if si.checkpoint is None or not si.checkpoint.due(si):
+        return
+    if 'integrator' in state:
+        state['integrator'] = checkpoint.integrator_state(state['integrator'])
+    si.checkpoint.save(si, state)
+
+
+def solve_split(si, y, infile, resume=None):
+    """Conducts the solution step, based on the dopri5 integrator in scipy.
+    The neutronics and thermal hydraulics blocks take turns each timestep.
+    Yields the index of the initial timestep and of each timestep solved.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param y: the solution vector
+    :type y: np.ndarray
+    :param infile: the imported infile module
+    :type infile: imported module
+    :param resume: the solver state from a checkpoint, or None
+    :type resume: dict
+    """
+    t_cur = si.timer.seconds(si.timer.ts)
+    if resume is None:
+        # one call, as the steady state is solved for both blocks at once
+        y_0 = y0(si)
+        n_n = 1 + si.n_pg + si.n_dg
+        resume = {'y_n': y_0[:n_n], 'y_th': y_0[n_n:]}
     n = ode(f_n).set_integrator('dopri5')
-    n.set_initial_value(y0_n(si), si.timer.
-                        t0.magnitude)
-    n.set_f_params(si)
+    n.set_initial_value(resume['y_n'], t_cur)
+    # dopri5 copies the derivative out of the buffer on each call
+    n.set_f_params(si, np.zeros(1 + si.n_pg + si.n_dg))
     th = ode(f_th).set_integrator('dopri5', nsteps=infile.nsteps)
-    th.set_initial_value(y0_th(si), si.timer.t0.magnitude)
+    th.set_initial_value(resume['y_th'], t_cur)
     th.set_f_params(si)
+    yield si.timer.current_timestep()
     while (n.successful() and
            n.t < si.timer.tf.magnitude and
            th.t < si.timer.tf.magnitude):
         si.timer.advance_one_timestep()
-        si.db.record_all()
-        n.integrate(si.timer.current_time().magnitude)
+        si.db.record_all(si.timer.current_timestep() - 1)
+        n.integrate(si.timer.seconds(si.timer.ts))
         update_n(n.t, n.y, si)
-        th.integrate(si.timer.current_time().magnitude)
+        th.integrate(si.timer.seconds(si.timer.ts))
         update_th(th.t, n.y, th.y, si)
-    return si.y
+        fired = events.detect(si)
+        save_checkpoint(si, y_n=n.y, y_th=th.y)
+        yield si.timer.current_timestep()
+        if events.terminal(fired):
+            break
+
+
+def solve_exponential(si, y, infile, resume=None):
+    """Conducts the solution step like solve_split, but advances the
+    neutronics block exactly over each timestep with the matrix exponential
+    of the point kinetics system. The reactivity is held constant over the
+    step, as in f_n, so the neutronics are stable at any timestep size.
+    Yields the index of the initial timestep and of each timestep solved.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param y: the solution vector
+    :type y: np.ndarray
+    :param infile: the imported infile module
+    :type infile: imported module
+    :param resume: the solver state from a checkpoint, or None
+    :type resume: dict
+    """
+    if resume is None:
+        # one call, as the steady state is solved for both blocks at once
+        y_0 = y0(si)
+        n_n = 1 + si.n_pg + si.n_dg
+        resume = {'y_n': y_0[:n_n], 'y_th': y_0[n_n:]}
+    y_n = resume['y_n']
+    th = ode(f_th).set_integrator('dopri5', nsteps=infile.nsteps)
+    th.set_initial_value(resume['y_th'], si.timer.seconds(si.timer.ts))
+    th.set_f_params(si)
+    yield si.timer.current_timestep()
+    while th.successful() and th.t < si.timer.tf.magnitude:
+        si.timer.advance_one_timestep()
+        si.db.record_all(si.timer.current_timestep() - 1)
+        t = si.timer.seconds(si.timer.ts)
+        rho = si.ne.reactivity(si.timer.ts, si.components)
+        dt = si.timer.step_size(si.timer.ts)
+        y_n = si.ne.propagator(rho, dt).dot(y_n)
+        update_n(t, y_n, si)
+        th.integrate(t)
+        update_th(th.t, y_n, th.y, si)
+        fired = events.detect(si)
+        save_checkpoint(si, y_n=y_n, y_th=th.y)
+        yield si.timer.current_timestep()
+        if events.terminal(fired):
+            break
+
+
+coupled_integrators = {'bdf': BDF, 'radau': Radau, 'lsoda': LSODA}
+"""coupled_integrators (dict): the scipy integrators behind each coupled
+solver name"""
+
+
+def jac_options(si, jac, feedback):
+    """Returns the Jacobian keyword arguments for the coupled integrator.
+    LSODA only accepts dense Jacobians and cannot use a sparsity structure.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param jac: the assembled Jacobian of the simulation
+    :type jac: jacobian.Jacobian
+    :param feedback: whether temperature feedback is active in this segment
+    :type feedback: bool
+    """
+    if si.jacobian == 'analytic':
+        if si.solver == 'lsoda':
+            return {'jac': lambda t, y_t: jac(t, y_t, feedback).toarray()}
+        return {'jac': lambda t, y_t: jac(t, y_t, feedback)}
+    elif si.jacobian == 'sparsity' and si.solver != 'lsoda':
+        return {'jac_sparsity': jac.sparsity()}
+    return {}
+
+
+def feedback_segments(si):
+    """Returns the end time [s] and the feedback setting of each segment of
+    the simulation. Temperature feedback switches on at the feedback
+    timestep, so the solution is split there.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :rtype: list of (float, bool) tuples
+    """
+    timer = si.timer
+    tf = timer.tf.magnitude
+    t_fb = timer.seconds(timer.t_idx_feedback)
+    if not si.feedback or t_fb >= tf:
+        # no timestep is after the feedback one
+        return [(tf, False)]
+    if t_fb > timer.t0.magnitude:
+        return [(t_fb, False), (tf, True)]
+    return [(tf, True)]
+
+
+def solve_coupled(si, y, infile, resume=None):
+    """Conducts the solution step by integrating the full coupled state vector
+    with one implicit integrator (BDF, Radau or LSODA). The integrator runs
+    continuously and its dense output is sampled on the timer's grid. It is
+    restarted only where temperature feedback turns on and after events that
+    change the equations. Yields the index of the initial timestep and of
+    each timestep solved.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param y: the solution vector
+    :type y: np.ndarray
+    :param infile: the imported infile module
+    :type infile: imported module
+    :param resume: the solver state from a checkpoint, or None
+    :type resume: dict
+    """
+    method = coupled_integrators[si.solver]
+    timer = si.timer
+    t_cur = timer.seconds(timer.ts)
+    if resume is None:
+        resume = {}
+        y_cur = y0(si)
+    else:
+        y_cur = si.y[timer.current_timestep()]
+    yield timer.current_timestep()
+    jac = jacobian.Jacobian(si)
+    for t_bound, feedback in feedback_segments(si):
+        integrator = None
+        idx_bound = timer.idx(t_bound)
+        while timer.current_timestep() < idx_bound:
+            if integrator is None:
+                integrator = method(
+                    lambda t, y_t: f_coupled(t, y_t, si, feedback), t_cur,
+                    y_cur, t_bound, rtol=si.rtol, atol=si.atol,
+                    **jac_options(si, jac, feedback))
+                if resume.get('t_bound') == t_bound and \
+                        resume.get('integrator') is not None:
+                    checkpoint.restore_integrator(integrator,
+                                                  resume.pop('integrator'))
+            timer.advance_one_timestep()
+            si.db.record_all(timer.current_timestep() - 1)
+            t_next = timer.seconds(timer.ts)
+            # the steps covering this timestep, for locating events
+            covering = []
+            if si.events and integrator.t_old is not None and \
+                    integrator.t > t_cur:
+                covering.append(integrator.dense_output())
+            while integrator.t < t_next and integrator.status == 'running':
+                integrator.step()
+                if si.events:
+                    covering.append(integrator.dense_output())
+            if integrator.status == 'failed':
+                raise RuntimeError(integrator.message)
+            if integrator.t == t_next:
+                y_next = integrator.y
+            else:
+                y_next = integrator.dense_output()(t_next)
+            update_coupled(t_next, y_next, si, feedback)
+            t_cur = t_next
+            y_cur = si.y[timer.current_timestep()]
+            sol = None
+            if covering:
+                sol = OdeSolution([covering[0].t_old] +
+                                  [step.t for step in covering],
+                                  covering)
+            fired = events.detect(si, sol)
+            if events.discontinuous(fired):
+                integrator = None
+            save_checkpoint(si, t_bound=t_bound, integrator=integrator)
+            changed = yield timer.current_timestep()
+            if events.terminal(fired):
+                return
+            if changed:
+                jac = jacobian.Jacobian(si)
+                integrator = None
+
+
+def solve_multirate(si, y, infile, resume=None):
+    """Conducts the solution step with the multi-rate scheme in
+    pyrk.multirate. The thermal hydraulics block takes large steps across a
+    window of output timesteps while the neutronics block subcycles inside
+    it. Windows double in length after converging within two iterations and
+    are halved when they fail to converge. A window is cut short after an
+    event that changes the equations. Yields the index of the initial
+    timestep and of each timestep solved.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param y: the solution vector
+    :type y: np.ndarray
+    :param infile: the imported infile module
+    :type infile: imported module
+    :param resume: the solver state from a checkpoint, or None
+    :type resume: dict
+    """
+    timer = si.timer
+    t_cur = timer.seconds(timer.ts)
+    if resume is None:
+        resume = {'n_steps': 1}
+        y_cur = y0(si)
+    else:
+        y_cur = si.y[timer.current_timestep()]
+    n_steps = resume['n_steps']
+    yield timer.current_timestep()
+    for t_bound, feedback in feedback_segments(si):
+        idx_bound = timer.idx(t_bound)
+        while timer.current_timestep() < idx_bound:
+            ts = timer.current_timestep()
+            n_steps = min(n_steps, idx_bound - ts)
+            t_out = timer.seconds(np.arange(ts + 1, ts + n_steps + 1))
+            window = multirate.solve_window(si, t_cur, y_cur, t_out, feedback)
+            if window is None:
+                if n_steps == 1:
+                    msg = 'The multirate coupling did not converge at time '
+                    msg += str(timer.current_time())
+                    raise RuntimeError(msg)
+                n_steps //= 2
+                continue
+            ys, iterations = window
+            for t_next, y_next in zip(t_out, ys):
+                timer.advance_one_timestep()
+                si.db.record_all(timer.current_timestep() - 1)
+                update_coupled(t_next, y_next, si, feedback)
+                t_cur = t_next
+                fired = events.detect(si)
+                if events.terminal(fired):
+                    save_checkpoint(si, n_steps=n_steps)
+                    yield timer.current_timestep()
+                    return
+                changed = yield timer.current_timestep()
+                if events.discontinuous(fired) or changed:
+                    iterations = None
+                    break
+            y_cur = si.y[timer.current_timestep()]
+            if iterations is None:
+                n_steps = 1
+            elif iterations <= 2:
+                n_steps *= 2
+            save_checkpoint(si, n_steps=n_steps)
 
 
 def log_results(si):
-    pyrklog.info("\nReactivity : \n" + str(si.ne._rho))
-    pyrklog.info("\nFinal Result : \n" + np.array_str(si.y))
+    if not si.history:
+        # the arrays of the whole run were not kept
+        return
+    pyrklog.info("\nReactivity : \n" + str(np.asarray(si.ne._rho)))
+    pyrklog.info("\nFinal Result : \n" + np.array_str(np.asarray(si.y)))
     for comp in si.components:
-        pyrklog.info("\n" + comp.name + ":\n" + np.array_str(comp.T.magnitude))
+        pyrklog.info("\n" + comp.name + ":\n" +
+                     np.array_str(np.asarray(comp.T.magnitude)))
     pyrklog.info("\nPrecursor lambdas: \n" + str(si.ne._pd.lambdas()))
     pyrklog.info("\nDelayed neutron frac: \n" + str(si.ne._pd.beta()))
     pyrklog.info("\nPrecursor betas: \n" + str(si.ne._pd.betas()))
@@ -233,32 +656,119 @@ def load_infile(infile_path):
     return infile
 
 
+def sim_info_from_infile(infile, db, plotdir='images', infile_path=None):
+    """Returns the simulation info object described by an input file
+
+    :param infile: the imported infile module
+    :type infile: imported module
+    :param db: the output database
+    :type db: Database
+    :param plotdir: the directory where the plots will be placed
+    :type plotdir: string
+    :param infile_path: the path to the input file, stored in the metadata
+    :type infile_path: string
+    """
+    if not hasattr(infile, 'n_ref'):
+        n_ref = 0
+    else:
+        n_ref = infile.n_ref
+    # optional solver settings fall back to the SimInfo defaults
+    solver_params = {}
+    for param in ['solver', 'rtol', 'atol', 'jacobian', 'prompt_jump',
+                  'steady_state', 'events', 'checkpoint', 'cache',
+                  'history']:
+        if hasattr(infile, param):
+            solver_params[param] = getattr(infile, param)
+    return sim_info.SimInfo(timer=infile.ti,
+                            components=infile.components,
+                            iso=infile.fission_iso,
+                            e=infile.spectrum,
+                            n_precursors=infile.n_pg,
+                            n_decay=infile.n_dg,
+                            n_fic=n_ref,
+                            kappa=infile.kappa,
+                            feedback=infile.feedback,
+                            rho_ext=infile.rho_ext,
+                            plotdir=plotdir,
+                            infile=infile_path,
+                            db=db,
+                            **solver_params)
+
+
+def set_up_checkpoint(si, args):
+    """Applies the checkpoint options of the command line to the simulation
+    and, for a restart, restores it from the last checkpoint.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param args: the parsed command line options
+    :type args: argparse.Namespace
+    :return: the solver state to resume from, or None
+    :rtype: dict
+    """
+    filepath = args.checkpoint
+    if filepath is None:
+        if si.checkpoint is not None:
+            filepath = si.checkpoint.filepath
+        else:
+            filepath = os.path.splitext(args.outfile)[0] + '_checkpoint.h5'
+    if args.checkpoint_every is not None:
+        si.checkpoint = checkpoint.Checkpoint(filepath, args.checkpoint_every)
+    elif si.checkpoint is None:
+        si.checkpoint = checkpoint.Checkpoint(filepath)
+    else:
+        si.checkpoint.filepath = filepath
+    if args.restart:
+        return si.checkpoint.load(si)
+    return None
+
+
+def set_up_cache(si, args):
+    """Applies the cache options of the command line to the simulation
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param args: the parsed command line options
+    :type args: argparse.Namespace
+    """
+    if args.no_cache:
+        si.cache = None
+    elif args.cache is not None:
+        si.cache = cache.Cache(args.cache)
+    if si.cache is not None and args.cache_size is not None:
+        si.cache.max_bytes = args.cache_size * 2**20
+
+
+def set_up_recording(db, args):
+    """Applies the output rate options of the command line to the database
+
+    :param db: the output database
+    :type db: Database
+    :param args: the parsed command line options
+    :type args: argparse.Namespace
+    """
+    db.stride = args.record_every
+    if args.record_power_tol is not None:
+        db.tolerance['power'] = args.record_power_tol
+    if args.record_temp_tol is not None:
+        db.tolerance['temp'] = args.record_temp_tol
+    db.envelope = args.envelope
+
+
 def main(args, curr_dir):
     np.set_printoptions(precision=5, threshold=np.inf)
     logger.set_up_pyrklog(args.logfile)
     infile = load_infile(args.infile)
     out_db = database.Database(filepath=args.outfile)
-    if not hasattr(infile, 'n_ref'):
-        n_ref = 0
-    else:
-        n_ref = infile.n_ref
-    si = sim_info.SimInfo(timer=infile.ti,
-                          components=infile.components,
-                          iso=infile.fission_iso,
-                          e=infile.spectrum,
-                          n_precursors=infile.n_pg,
-                          n_decay=infile.n_dg,
-                          n_fic=n_ref,
-                          kappa=infile.kappa,
-                          feedback=infile.feedback,
-                          rho_ext=infile.rho_ext,
-                          plotdir=args.plotdir,
-                          infile=args.infile,
-                          db=out_db)
+    set_up_recording(out_db, args)
+    si = sim_info_from_infile(infile, out_db, plotdir=args.plotdir,
+                              infile_path=args.infile)
     # TODO: think about weather to add n_ref to all input files, or put n_ref
     # in database files
+    resume = set_up_checkpoint(si, args)
+    set_up_cache(si, args)
     print_logo(curr_dir)
-    sol = solve(si=si, y=si.y, infile=infile)
+    sol = solve(si=si, y=si.y, infile=infile, resume=resume)
     log_results(si)
     out_db.close_db()
     print(si.plotdir)
@@ -266,10 +776,12 @@ def main(args, curr_dir):
     pyrklog.critical("\nSimulation succeeded.\n")
 
 
-"""Run it as a script"""
-if __name__ == "__main__":
-    curr_dir = os.path.dirname(__file__)
-    ap = argparse.ArgumentParser(description='PyRK parameters')
+def add_arguments(ap):
+    """Adds the command line options of a single simulation to a parser
+
+    :param ap: the parser
+    :type ap: argparse.ArgumentParser
+    """
     ap.add_argument('--infile', help='the name of the input file',
                     default='input')
     ap.add_argument('--logfile', help='the name of the log file',
@@ -280,5 +792,39 @@ if __name__ == "__main__":
         default='images')
     ap.add_argument('--outfile', help='the name of the output database',
                     default='pyrk.h5')
+    ap.add_argument('--checkpoint',
+                    help='the name of the checkpoint file, by default the '
+                    'output database name ending in _checkpoint.h5')
+    ap.add_argument('--checkpoint-every', type=int,
+                    help='the number of timesteps between checkpoints')
+    ap.add_argument('--restart', action='store_true',
+                    help='continue from the last checkpoint')
+    ap.add_argument('--cache',
+                    help='the directory of the result cache, which returns '
+                    'the stored solution of a simulation solved before')
+    ap.add_argument('--cache-size', type=int,
+                    help='the largest size of the result cache in MiB, by '
+                    'default 1024')
+    ap.add_argument('--no-cache', action='store_true',
+                    help='solve without the cache of the input file')
+    ap.add_argument('--record-every', type=int, default=1,
+                    help='record only every n-th timestep in the output '
+                    'database')
+    ap.add_argument('--record-power-tol', type=float,
+                    help='record a timestep only if the normalized power '
+                    'moved by more than this since the last one recorded')
+    ap.add_argument('--record-temp-tol', type=float,
+                    help='record a timestep only if a temperature moved by '
+                    'more than this many kelvin since the last one recorded')
+    ap.add_argument('--envelope', action='store_true',
+                    help='record the smallest and largest power and '
+                    'temperatures between the timesteps recorded')
+    return ap
+
+
+"""Run it as a script"""
+if __name__ == "__main__":
+    curr_dir = os.path.dirname(__file__)
+    ap = add_arguments(argparse.ArgumentParser(description='PyRK parameters'))
     args = ap.parse_args()
     main(args, curr_dir)
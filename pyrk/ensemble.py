@@ -0,0 +1,248 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Ensembles of parameter samples of one reactor model, integrated together.
+
+Each member of an ensemble has the components of the nominal model, with the
+same names and connections, but its own material properties, heat transfer
+coefficients and temperature coefficients of reactivity. The compiled
+thermal networks of the members are stacked into one block diagonal system,
+so the right hand side of every member is evaluated at once on a batched
+state array of shape (n_members, n_entries). One implicit integrator
+advances the whole batch.
+"""
+import numpy as np
+from scipy import sparse
+from scipy.integrate import BDF
+
+from pyrk import driver
+from pyrk.jacobian import Jacobian
+from pyrk.th_network import THNetwork
+
+
+class Ensemble(object):
+    """This class holds the batched model of the members of an ensemble.
+    """
+
+    def __init__(self, si, members):
+        """Compiles the thermal networks of the members and stacks them.
+
+        :param si: the simulation info object of the nominal model. The
+          timer, neutronics data, external reactivity, kappa, feedback,
+          prompt_jump, steady_state and tolerances are shared by every member
+        :type si: SimInfo
+        :param members: the components of each member, in the order of
+          si.components. A generator keeps only one member's components in
+          memory at a time.
+        :type members: iterable of lists of THComponent objects
+        """
+        self.si = si
+        self.n_n = 1 + si.n_pg + si.n_dg
+        self.n = si.n_entries()
+        names = [comp.name for comp in si.components]
+        nets = []
+        alphas = []
+        temps0 = []
+        for components in members:
+            if [comp.name for comp in components] != names:
+                msg = 'The components of ensemble member ' + str(len(nets))
+                msg += ' do not match the components of the simulation: '
+                msg += str(names)
+                raise ValueError(msg)
+            nets.append(THNetwork(components, si.kappa))
+            alphas.append([comp.alpha_temp.magnitude for comp in components])
+            temps0.append([comp.T0.magnitude for comp in components])
+        self.n_members = len(nets)
+        """n_members (int): the number of members in the ensemble"""
+        n_c = len(names)
+        shape = (self.n_members, n_c)
+        self.rho_a = np.array([net.rho_a for net in nets]).reshape(shape)
+        """rho_a (ndarray): constant term of each density model"""
+        self.rho_b = np.array([net.rho_b for net in nets]).reshape(shape)
+        """rho_b (ndarray): temperature coefficient of each density model"""
+        self.cp = np.array([net.cp for net in nets]).reshape(shape)
+        """cp (ndarray): specific heat capacity of each component"""
+        self.gen_power = np.array([net.gen_power
+                                   for net in nets]).reshape(shape)
+        """gen_power (ndarray): volumetric heat generation per unit power"""
+        self.gen_decay = np.array([net.gen_decay
+                                   for net in nets]).reshape(shape)
+        """gen_decay (ndarray): volumetric heat generation per unit of the
+        summed decay heat"""
+        self.adv_diag = np.array([net.adv_diag for net in nets]).reshape(shape)
+        """adv_diag (ndarray): advection coefficient on each temperature"""
+        self.adv_src = np.array([net.adv_src for net in nets]).reshape(shape)
+        """adv_src (ndarray): advection source from the inlet temperatures"""
+        self.cond = sparse.block_diag([net.cond for net in nets],
+                                      format='csr')
+        """cond (csr_matrix): block diagonal conduction and convection
+        coefficients of all members"""
+        self.alphas = np.array(alphas, dtype=float).reshape(shape)
+        """alphas (ndarray): temperature coefficient of reactivity of each
+        component"""
+        self.temps_fb = np.array(temps0, dtype=float).reshape(shape)
+        """temps_fb (ndarray): the temperatures at which feedback starts"""
+        self.y0 = self.initial_state(nets, self.temps_fb)
+        """y0 (ndarray): the initial state of each member"""
+        self.y = None
+        """y (ndarray): the recorded history after solve, indexed by
+        timestep, member and recorded entry"""
+        self.peak = None
+        """peak (ndarray): the largest value of each entry of each member
+        over the simulation, after solve"""
+
+    def initial_state(self, nets, temps0):
+        """Returns the initial state of each member, like driver.y0.
+
+        :param nets: the compiled thermal network of each member
+        :type nets: list of THNetwork objects
+        :param temps0: the initial temperatures of each member
+        :type temps0: np.ndarray
+        """
+        si = self.si
+        y0 = np.zeros((self.n_members, self.n))
+        y_n = si.ne.equilibrium(power=1.0)
+        if not si.steady_state:
+            y_n[1 + si.n_pg:] = 0.0
+        y0[:, :self.n_n] = y_n
+        for idx, net in enumerate(nets):
+            if si.steady_state:
+                y0[idx, self.n_n:] = net.steady_state(y_n[0],
+                                                      y_n[1 + si.n_pg:],
+                                                      temps0[idx])
+            else:
+                y0[idx, self.n_n:] = temps0[idx]
+        return y0
+
+    def reactivity(self, t, temps, feedback):
+        """Returns the reactivity of each member at time t
+
+        :param t: the time [s]
+        :type t: float
+        :param temps: the component temperatures of each member, in kelvin
+        :type temps: np.ndarray
+        :param feedback: whether temperature feedback is active
+        :type feedback: bool
+        """
+        rho = self.si.ne.reactivity_at(t, self.si.components, temps, feedback,
+                                       self.alphas, self.temps_fb)
+        return np.full(self.n_members, rho)
+
+    def power(self, y, rho):
+        """Returns the normalized power of each member, like
+        Neutronics.power
+
+        :param y: the batched state
+        :type y: np.ndarray
+        :param rho: the reactivity of each member
+        :type rho: np.ndarray
+        """
+        ne = self.si.ne
+        if not ne.prompt_jump:
+            return y[:, 0]
+        if np.any(rho >= ne._beta):
+            msg = 'The prompt jump approximation requires the reactivity '
+            msg += 'to stay below beta = ' + str(ne._beta)
+            msg += '. The largest reactivity was: ' + str(np.max(rho))
+            raise ValueError(msg)
+        zetas = y[:, 1:1 + self.si.n_pg]
+        return ne._Lambda * zetas.dot(ne._lambdas) / (ne._beta - rho)
+
+    def dydt(self, t, y, feedback):
+        """Returns the derivative of the batched state, flattened like y.
+        Each member follows driver.f_coupled.
+
+        :param t: the time [s]
+        :type t: float
+        :param y: the flattened batched state
+        :type y: np.ndarray
+        :param feedback: whether temperature feedback is active
+        :type feedback: bool
+        """
+        si = self.si
+        ne = si.ne
+        end_pg = 1 + si.n_pg
+        y = y.reshape(self.n_members, self.n)
+        temps = y[:, self.n_n:]
+        rho = self.reactivity(t, temps, feedback)
+        power = self.power(y, rho)
+        f = np.empty_like(y)
+        if ne.prompt_jump:
+            y_n = y[:, :self.n_n].copy()
+            y_n[:, 0] = power
+            f[:, :self.n_n] = y_n.dot(ne._pke.T)
+            f[:, 0] = ne._Lambda * f[:, 1:end_pg].dot(ne._lambdas) / \
+                (ne._beta - rho)
+        else:
+            f[:, :self.n_n] = y[:, :self.n_n].dot(ne._pke.T)
+            f[:, 0] += rho * y[:, 0] / ne._Lambda
+        heat = self.cond.dot(temps.ravel()).reshape(temps.shape)
+        heat += self.gen_power * power[:, np.newaxis]
+        heat += self.gen_decay * np.sum(y[:, end_pg:self.n_n],
+                                        axis=1)[:, np.newaxis]
+        heat += np.where(temps == 0.0, 0.0,
+                         self.adv_diag * temps + self.adv_src)
+        f[:, self.n_n:] = heat / ((self.rho_a + self.rho_b * temps) * self.cp)
+        return f.ravel()
+
+    def sparsity(self):
+        """Returns the sparsity structure of the Jacobian of dydt, one block
+        of the nominal model's structure per member
+
+        :rtype: scipy.sparse.csc_matrix
+        """
+        block = Jacobian(self.si).sparsity()
+        return sparse.block_diag([block] * self.n_members, format='csc')
+
+    def solve(self, columns=None):
+        """Integrates every member over the timer's grid with one BDF
+        integrator, whose Jacobian is estimated by finite differences over
+        the block diagonal sparsity structure. Like driver.solve_coupled,
+        the integrator restarts where temperature feedback turns on.
+
+        :param columns: the entries of the solution vector to record at
+          every timestep, or None for all of them. Large ensembles can
+          record only the power, [0], to save memory.
+        :type columns: list of int
+        :return: the recorded entries, indexed by timestep, member and
+          entry
+        :rtype: np.ndarray
+        """
+        si = self.si
+        timer = si.timer
+        columns = np.arange(self.n) if columns is None else \
+            np.asarray(columns, dtype=int)
+        self.y = np.zeros((timer.timesteps(), self.n_members, len(columns)))
+        y = self.y0.copy()
+        self.y[0] = y[:, columns]
+        self.peak = y.copy()
+        sparsity = self.sparsity()
+        t_cur = timer.t0.magnitude
+        ts = 0
+        for t_bound, feedback in driver.feedback_segments(si):
+            # like the components' temperature history at t_feedback
+            self.temps_fb = y[:, self.n_n:].copy()
+            integrator = BDF(lambda t, y_t: self.dydt(t, y_t, feedback),
+                             t_cur, y.ravel(), t_bound, rtol=si.rtol,
+                             atol=si.atol, jac_sparsity=sparsity)
+            idx_bound = timer.idx(t_bound)
+            while ts < idx_bound:
+                ts += 1
+                t_next = timer.seconds(ts)
+                while integrator.t < t_next and \
+                        integrator.status == 'running':
+                    integrator.step()
+                if integrator.status == 'failed':
+                    raise RuntimeError(integrator.message)
+                if integrator.t == t_next:
+                    y_next = integrator.y
+                else:
+                    y_next = integrator.dense_output()(t_next)
+                y = y_next.reshape(self.n_members, self.n)
+                if si.ne.prompt_jump:
+                    rho = self.reactivity(t_next, y[:, self.n_n:], feedback)
+                    y = y.copy()
+                    y[:, 0] = self.power(y, rho)
+                self.y[ts] = y[:, columns]
+                np.maximum(self.peak, y, out=self.peak)
+            t_cur = t_bound
+        return self.y
@@ -0,0 +1,281 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Events stop or change a simulation when a quantity crosses a threshold.
+
+An input file may hold a list of events, for example::
+
+    events = [Event('trip', 'power', 1.2, action='scram',
+                    rho=-5000 * units.pcm),
+              Event('fuel_limit', 'fuel', 1400 * units.kelvin),
+              Event('settled', 'drift', 1e-4 / units.seconds,
+                    direction=-1)]
+
+After each timestep the solvers check whether an event's quantity crossed
+its threshold since the previous timestep. The crossing time is found by
+root-finding on the solver's dense output, or on a linear interpolation
+between the two timesteps for the split solvers. Each event fires once, is
+logged in the metadata/events table of the database and then acts on the
+simulation.
+"""
+import numpy as np
+from scipy.optimize import brentq
+
+from pyrk.db.descriptions import EventRow
+from pyrk.inp import validation
+from pyrk.utilities.ur import units
+
+
+class Event(object):
+    """This class describes a threshold crossing and the action it triggers.
+    """
+
+    quantities = ['power', 'reactivity', 'drift', 'time']
+    """quantities (list): the supported quantities besides the temperature
+    of a component, which is given by the component's name"""
+
+    actions = ['terminate', 'scram', 'decimate']
+    """actions (list): the supported values of the action parameter"""
+
+    unit_names = {'power': 'dimensionless', 'reactivity': 'delta_k',
+                  'drift': '1/second', 'time': 'second'}
+    """unit_names (dict): the units of each quantity's threshold. Component
+    temperatures are in kelvin."""
+
+    def __init__(self, name, quantity, threshold, direction=1,
+                 action='terminate', rho=0.0 * units.delta_k, stride=10):
+        """Creates an event for the simulation
+
+        :param name: the name of the event, for the event log, of at most as
+          many characters as its column holds
+        :type name: str
+        :param quantity: 'power' (normalized), 'reactivity', 'drift' (the
+          largest relative rate of change of the solution vector, which
+          falls to zero at a steady state), 'time', or the name of a
+          component whose temperature is watched
+        :type quantity: str
+        :param threshold: the value at which the event fires
+        :type threshold: float or Quantity in the units of the quantity
+        :param direction: 1 fires when the quantity rises through the
+          threshold, -1 when it falls through it and 0 for either
+        :type direction: int
+        :param action: 'terminate' ends the simulation, 'scram' replaces the
+          external reactivity with rho, and 'decimate' records only every
+          stride-th timestep in the database
+        :type action: str
+        :param rho: the external reactivity after a scram
+        :type rho: Quantity, units of delta_k
+        :param stride: the recording stride after a 'decimate' event
+        :type stride: int
+        """
+        width = EventRow.columns['name'].itemsize
+        if len(name.encode()) > width:
+            msg = 'The name of an event must fit the event log, at most '
+            msg += str(width) + ' characters. The name was: ' + name
+            raise ValueError(msg)
+        self.name = name
+        self.quantity = quantity
+        self.threshold = self.magnitude(threshold)
+        self.direction = validation.validate_supported("direction",
+                                                       direction, [-1, 0, 1])
+        self.action = validation.validate_supported("action", action,
+                                                    self.actions)
+        self.rho = rho.to('delta_k').magnitude
+        self.stride = int(validation.validate_ge("stride", stride, 1))
+        self.t = None
+        """t (float): the time [s] at which the event fired, or None"""
+        self.t_idx = None
+        """t_idx (int): the timestep in which the event fired, or None"""
+
+    def magnitude(self, threshold):
+        """Returns the threshold as a float in the units of the quantity
+
+        :param threshold: the value at which the event fires
+        :type threshold: float or Quantity
+        """
+        validation.validate_num("threshold", threshold)
+        if not isinstance(threshold, units.Quantity):
+            return float(threshold)
+        unit = self.unit_names.get(self.quantity, 'kelvin')
+        return float(threshold.to(unit).magnitude)
+
+    @property
+    def fired(self):
+        """True once the event has fired"""
+        return self.t is not None
+
+    @property
+    def terminal(self):
+        """True if the event ends the simulation"""
+        return self.action == 'terminate'
+
+    @property
+    def discontinuous(self):
+        """True if the event changes the equations being solved, so that
+        integrators have to be restarted after it fires"""
+        return self.action == 'scram'
+
+    def value(self, si, t, y):
+        """Returns the quantity minus the threshold, which changes sign when
+        the event fires
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        :param t: the time [s]
+        :type t: float
+        :param y: the full solution vector at t
+        :type y: np.ndarray
+        """
+        if self.quantity == 'time':
+            return t - self.threshold
+        end_pg = 1 + si.n_pg
+        n_n = 1 + si.n_pg + si.n_dg
+        temps = y[n_n:]
+        rho = reactivity(si, t, temps)
+        if self.quantity == 'reactivity':
+            return rho - self.threshold
+        power = si.ne.power(y, rho)
+        if self.quantity == 'power':
+            return power - self.threshold
+        net = si.th.get_network()
+        if self.quantity == 'drift':
+            f = np.concatenate([si.ne.dydt(y[:n_n], rho),
+                                net.dtempdt(temps, power, y[end_pg:n_n])])
+            return np.max(np.abs(f) / (np.abs(y) + si.atol)) - self.threshold
+        return temps[net.names[self.quantity]] - self.threshold
+
+    def crossed(self, g0, g1):
+        """Returns True if the value went through zero in the direction of
+        the event
+
+        :param g0: the value at the start of the timestep
+        :type g0: float
+        :param g1: the value at the end of the timestep
+        :type g1: float
+        """
+        if self.direction >= 0 and g0 < 0.0 <= g1:
+            return True
+        return self.direction <= 0 and g0 > 0.0 >= g1
+
+    def locate(self, si, t0, t1, sol):
+        """Returns the time at which the value crosses zero in [t0, t1]
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        :param t0: the start of the timestep [s]
+        :type t0: float
+        :param t1: the end of the timestep [s]
+        :type t1: float
+        :param sol: the solution vector as a function of time in [t0, t1]
+        :type sol: function
+        """
+        def g(t):
+            return self.value(si, t, sol(t))
+        g0 = g(t0)
+        g1 = g(t1)
+        # the interpolant may disagree with the timesteps at the ends
+        if g1 == 0.0 or np.sign(g0) == np.sign(g1):
+            return t1
+        return brentq(g, t0, t1)
+
+    def fire(self, si, t, t_idx):
+        """Logs the event in the database and applies its action
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        :param t: the time [s] of the crossing
+        :type t: float
+        :param t_idx: the timestep in which the crossing was detected
+        :type t_idx: int
+        """
+        self.t = t
+        self.t_idx = t_idx
+        if self.action == 'scram':
+            si.ne.set_rho_ext(t_idx + 1, self.rho)
+        elif self.action == 'decimate':
+            si.db.stride = self.stride
+        si.db.add_row(si.db.get_table('metadata', 'events'), self.record())
+
+    def record(self):
+        """A recorder function for the metadata/events table
+        """
+        rec = {'t_idx': self.t_idx,
+               'time': self.t,
+               'name': self.name,
+               'quantity': self.quantity,
+               'threshold': self.threshold,
+               'action': self.action}
+        return rec
+
+
+def reactivity(si, t, temps):
+    """Returns the reactivity at time t for the given temperatures, with
+    temperature feedback after the feedback timestep
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param t: the time [s]
+    :type t: float
+    :param temps: the component temperatures, in kelvin
+    :type temps: np.ndarray
+    """
+    timer = si.timer
+    t_idx = min(timer.idx(t), timer.timesteps() - 1)
+    feedback = si.feedback and t_idx > timer.t_idx_feedback
+    return si.ne.reactivity_at(t, si.components, temps, feedback)
+
+
+def detect(si, sol=None):
+    """Checks the events over the timestep that just finished, and fires
+    those that crossed their thresholds in the order of their crossing
+    times. Nothing fires after a terminal event.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param sol: the solution vector as a function of time over the
+      timestep, or None to interpolate linearly between the timesteps
+    :type sol: function
+    :return: the events that fired
+    :rtype: list of Event objects
+    """
+    if not si.events:
+        return []
+    t_idx = si.timer.current_timestep()
+    t0 = si.timer.seconds(t_idx - 1)
+    t1 = si.timer.seconds(t_idx)
+    y0 = si.y[t_idx - 1]
+    y1 = si.y[t_idx]
+    if sol is None:
+        def sol(t):
+            return y0 + (t - t0) / (t1 - t0) * (y1 - y0)
+    crossings = []
+    for event in si.events:
+        if event.fired:
+            continue
+        if event.crossed(event.value(si, t0, y0), event.value(si, t1, y1)):
+            crossings.append((event.locate(si, t0, t1, sol), event))
+    fired = []
+    for t, event in sorted(crossings, key=lambda crossing: crossing[0]):
+        event.fire(si, t, t_idx)
+        fired.append(event)
+        if event.terminal:
+            break
+    return fired
+
+
+def terminal(fired):
+    """Returns True if any of the fired events ends the simulation
+
+    :param fired: the events returned by detect
+    :type fired: list of Event objects
+    """
+    return any(event.terminal for event in fired)
+
+
+def discontinuous(fired):
+    """Returns True if any of the fired events requires integrators to
+    restart
+
+    :param fired: the events returned by detect
+    :type fired: list of Event objects
+    """
+    return any(event.discontinuous for event in fired)
@@ -0,0 +1,369 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Storage for the solution history of a simulation.
+
+By default SimInfo.y holds every timestep. A simulation that is streamed
+without its history keeps only the last few timesteps in a Window, which is
+indexed by timestep like the full array, along with the timesteps that stay
+in use, such as the reference of the temperature feedback. Its memory stays
+the same however long it runs. The older timesteps are only in the database.
+
+A simulation whose history should not be allocated up front keeps it in
+chunks instead, which are added as the simulation advances. With a spill
+file, only the most recently used chunks stay in memory::
+
+    si = SimInfo(..., history=Chunks(chunk_rows=4096, spill='history.h5'))
+
+The temperatures of the components are views of the temperature columns of
+the solution, whichever way it is stored.
+"""
+import collections
+
+import numpy as np
+import tables as tb
+
+from pyrk.inp import validation
+from pyrk.utilities.ur import units
+
+
+class Window(object):
+    """This class holds the last n_rows timesteps of a history, indexed by
+    timestep, and the pinned timesteps, such as the feedback reference,
+    for the whole run. Its memory does not depend on the number of
+    timesteps.
+    """
+
+    def __init__(self, n_rows, n_entries=None, pinned=()):
+        """Creates an empty window
+
+        :param n_rows: the number of timesteps kept
+        :type n_rows: int
+        :param n_entries: the length of the vector of each timestep, or None
+          for a number
+        :type n_entries: int or None
+        :param pinned: the timesteps that are kept however old they are
+        :type pinned: list of int
+        """
+        shape = (n_rows,) if n_entries is None else (n_rows, n_entries)
+        self.rows = np.zeros(shape=shape, dtype=float)
+        """rows (ndarray): timestep t_idx is row t_idx % n_rows"""
+        self.owners = np.full(n_rows, -1, dtype=int)
+        """owners (ndarray): the timestep held by each row"""
+        self.pinned = dict((t_idx, np.zeros(shape=shape[1:], dtype=float))
+                           for t_idx in pinned)
+        """pinned (dict): the entries of the pinned timesteps, by timestep
+        """
+
+    def row(self, t_idx):
+        """Returns the index of the row holding a timestep. A timestep newer
+        than the one in its row replaces it with zeros.
+
+        :param t_idx: the timestep
+        :type t_idx: int
+        """
+        if not isinstance(t_idx, (int, np.integer)):
+            msg = 'Only the last ' + str(len(self.rows))
+            msg += ' timesteps are kept, one at a time. Keep the history '
+            msg += 'to read more.'
+            raise IndexError(msg)
+        row = t_idx % len(self.rows)
+        if self.owners[row] < t_idx:
+            self.rows[row] = 0.0
+            self.owners[row] = t_idx
+        elif self.owners[row] > t_idx:
+            msg = 'Timestep ' + str(t_idx) + ' is older than the last '
+            msg += str(len(self.rows)) + ' timesteps, which are kept.'
+            raise IndexError(msg)
+        return row
+
+    def is_pinned(self, t_idx):
+        return isinstance(t_idx, (int, np.integer)) and t_idx in self.pinned
+
+    def __len__(self):
+        # one past the last timestep used, like a full history
+        return int(max([self.owners.max()] + list(self.pinned))) + 1
+
+    def __getitem__(self, t_idx):
+        if self.is_pinned(t_idx):
+            pinned = self.pinned[t_idx]
+            return pinned if pinned.ndim else pinned[()]
+        return self.rows[self.row(t_idx)]
+
+    def __setitem__(self, key, value):
+        key = key if isinstance(key, tuple) else (key,)
+        t_idx, entries = key[0], key[1:]
+        if self.is_pinned(t_idx):
+            self.pinned[t_idx][entries] = value
+        else:
+            self.rows[(self.row(t_idx),) + entries] = value
+
+    def column(self, col):
+        """Returns a view of one entry of a window of vectors
+
+        :param col: the index of the entry
+        :type col: int
+        :rtype: Column
+        """
+        return Column(self, col)
+
+
+class Chunks(object):
+    """This class describes how a simulation stores its history in chunks,
+    and creates the stores.
+    """
+
+    def __init__(self, chunk_rows=4096, spill=None, resident=8):
+        """Describes chunked storage
+
+        :param chunk_rows: the number of timesteps in a chunk
+        :type chunk_rows: int
+        :param spill: the HDF5 file that chunks are moved to when more than
+          resident chunks of a store are in memory, or None to keep them all
+          in memory. The file is overwritten.
+        :type spill: str or None
+        :param resident: the number of chunks of each store kept in memory
+          with a spill file
+        :type resident: int
+        """
+        self.chunk_rows = int(validation.validate_g("chunk_rows", chunk_rows,
+                                                    0))
+        self.spill = spill
+        self.resident = int(validation.validate_g("resident", resident, 0))
+        self._created = False
+
+    def store(self, name, row_shape=()):
+        """Returns a new, empty store
+
+        :param name: the name of the store in the spill file
+        :type name: str
+        :param row_shape: the shape of the entry of each timestep
+        :type row_shape: tuple
+        :rtype: Chunked
+        """
+        return Chunked(self, name, row_shape)
+
+    def spill_file(self, mode):
+        """Opens the spill file, which is created on first use
+
+        :param mode: 'r' to read or 'a' to write
+        :type mode: str
+        """
+        if mode == 'a' and not self._created:
+            mode = 'w'
+            self._created = True
+        return tb.open_file(self.spill, mode=mode)
+
+
+class Chunked(object):
+    """This class holds a history that grows in chunks of timesteps as they
+    are first written, indexed by timestep like an array. Integers give a
+    view of the entry of one timestep and slices give a copy of several. A
+    timestep and entries, as in y[t_idx, 1:], write part of one timestep.
+    """
+
+    def __init__(self, chunks, name, row_shape=()):
+        """Creates an empty store
+
+        :param chunks: the description of the chunks
+        :type chunks: Chunks
+        :param name: the name of the store in the spill file
+        :type name: str
+        :param row_shape: the shape of the entry of each timestep
+        :type row_shape: tuple
+        """
+        self.chunks = chunks
+        self.name = name
+        self.row_shape = tuple(row_shape)
+        self.n_rows = 0
+        """n_rows (int): one past the last timestep used"""
+        self._resident = collections.OrderedDict()
+        """_resident (OrderedDict): the chunks in memory, by index, least
+        recently used first"""
+        self._spilled = set()
+        """_spilled (set): the indices of the chunks in the spill file"""
+
+    def __len__(self):
+        return self.n_rows
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:self.n_rows], dtype=dtype)
+
+    def _node(self, idx):
+        return self.name + '_' + str(idx)
+
+    def _empty(self):
+        return np.zeros((self.chunks.chunk_rows,) + self.row_shape)
+
+    def _spill(self):
+        """Moves the least recently used chunks past the resident limit to
+        the spill file"""
+        while len(self._resident) > self.chunks.resident:
+            idx, chunk = self._resident.popitem(last=False)
+            with self.chunks.spill_file('a') as h5file:
+                if self._node(idx) in h5file.root:
+                    h5file.remove_node('/', self._node(idx))
+                h5file.create_array('/', self._node(idx), chunk)
+            self._spilled.add(idx)
+
+    def chunk(self, idx):
+        """Returns the chunk of an index, in memory, creating or loading it
+        if needed
+
+        :param idx: the index of the chunk
+        :type idx: int
+        """
+        chunk = self._resident.get(idx)
+        if chunk is not None:
+            self._resident.move_to_end(idx)
+            return chunk
+        if idx in self._spilled:
+            with self.chunks.spill_file('r') as h5file:
+                chunk = h5file.get_node('/', self._node(idx)).read()
+        else:
+            chunk = self._empty()
+        self._resident[idx] = chunk
+        if self.chunks.spill is not None:
+            self._spill()
+        return chunk
+
+    def read_chunk(self, idx):
+        """Returns the chunk of an index without moving it into memory
+
+        :param idx: the index of the chunk
+        :type idx: int
+        """
+        if idx in self._resident:
+            return self._resident[idx]
+        if idx in self._spilled:
+            with self.chunks.spill_file('r') as h5file:
+                return h5file.get_node('/', self._node(idx)).read()
+        return self._empty()
+
+    def _rows(self, key):
+        start, stop, step = key.indices(self.n_rows if key.stop is None
+                                        else max(key.stop, 0))
+        if step != 1:
+            raise IndexError('Only contiguous timesteps can be sliced.')
+        return start, max(start, stop)
+
+    def __getitem__(self, key):
+        n = self.chunks.chunk_rows
+        if isinstance(key, slice):
+            start, stop = self._rows(key)
+            ret = np.empty((stop - start,) + self.row_shape)
+            for idx in range(start // n, (stop + n - 1) // n):
+                lo = max(start, idx * n)
+                hi = min(stop, (idx + 1) * n)
+                ret[lo - start:hi - start] = \
+                    self.read_chunk(idx)[lo - idx * n:hi - idx * n]
+            return ret
+        if key < 0:
+            key += self.n_rows
+        if not 0 <= key < self.n_rows:
+            msg = 'Timestep ' + str(key) + ' is past the last of the '
+            msg += str(self.n_rows) + ' timesteps written.'
+            raise IndexError(msg)
+        return self.chunk(key // n)[key % n]
+
+    def __setitem__(self, key, value):
+        n = self.chunks.chunk_rows
+        if isinstance(key, slice):
+            start, stop = self._rows(key)
+            value = np.broadcast_to(value, (stop - start,) + self.row_shape)
+            for idx in range(start // n, (stop + n - 1) // n):
+                lo = max(start, idx * n)
+                hi = min(stop, (idx + 1) * n)
+                self.chunk(idx)[lo - idx * n:hi - idx * n] = \
+                    value[lo - start:hi - start]
+            self.n_rows = max(self.n_rows, stop)
+            return
+        key = key if isinstance(key, tuple) else (key,)
+        t_idx, entries = key[0], key[1:]
+        if t_idx < 0:
+            t_idx += self.n_rows
+        self.n_rows = max(self.n_rows, t_idx + 1)
+        self.chunk(t_idx // n)[(t_idx % n,) + entries] = value
+
+    def column(self, col):
+        """Returns a view of one entry of a store of vectors
+
+        :param col: the index of the entry
+        :type col: int
+        :rtype: Column
+        """
+        return Column(self, col)
+
+
+class Column(object):
+    """This class is a view of one entry of the vectors in a Chunked store
+    or a Window, indexed by timestep.
+    """
+
+    def __init__(self, store, col):
+        """Creates the view
+
+        :param store: the store of vectors
+        :type store: Chunked or Window
+        :param col: the index of the entry
+        :type col: int
+        """
+        self.store = store
+        self.col = col
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def shape(self):
+        return (len(self.store),)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:len(self.store)], dtype=dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.store[key][:, self.col]
+        return self.store[key][self.col]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            start, stop = self.store._rows(key)
+            rows = self.store[start:stop]
+            rows[:, self.col] = value
+            self.store[start:stop] = rows
+            return
+        self.store[key, self.col] = value
+
+
+class QuantityColumn(object):
+    """This class is a view of a Column with units, indexed like a Quantity
+    array. It stands in for the temperature history of a component whose
+    simulation keeps its history in chunks.
+    """
+
+    def __init__(self, column, unit):
+        """Creates the view
+
+        :param column: the column of magnitudes
+        :type column: Column
+        :param unit: the units of the magnitudes
+        :type unit: str
+        """
+        self.magnitude = column
+        """magnitude (Column): the magnitudes, without units"""
+        self.units = units.Unit(unit)
+
+    def __len__(self):
+        return len(self.magnitude)
+
+    @property
+    def shape(self):
+        return self.magnitude.shape
+
+    def __getitem__(self, key):
+        return units.Quantity(self.magnitude[key], self.units)
+
+    def __setitem__(self, key, value):
+        if isinstance(value, units.Quantity):
+            value = value.to(self.units).magnitude
+        self.magnitude[key] = value
@@ -6,11 +6,25 @@ from pyrk import neutronics
 import pyrk.reactivity_insertion as ri
 from pyrk import th_system
 from pyrk.db import database
+from pyrk.events import Event
+from pyrk.history import Chunked
+from pyrk.history import Chunks
+from pyrk.history import QuantityColumn
+from pyrk.history import Window
+from pyrk.inp import validation
+from pyrk.utilities.ur import units
 
 
 class SimInfo(object):
     """This class holds information about a reactor kinetics simulation"""
 
+    solvers = ['split', 'bdf', 'radau', 'lsoda', 'multirate',
+               'exponential']
+    """solvers (list): the supported values of the solver parameter"""
+
+    jacobians = ['analytic', 'sparsity', 'dense']
+    """jacobians (list): the supported values of the jacobian parameter"""
+
     def __init__(self,
                  timer=Timer(),
                  components=None,
@@ -22,6 +36,17 @@ class SimInfo(object):
                  kappa=0.0,
                  rho_ext=None,
                  feedback=False,
+                 solver='split',
+                 rtol=1e-6,
+                 atol=1e-9,
+                 jacobian='analytic',
+                 prompt_jump=False,
+                 steady_state=False,
+                 events=None,
+                 checkpoint=None,
+                 cache=None,
+                 history=True,
+                 window=2,
                  plotdir='images',
                  infile=None,
                  sim_id=None,
@@ -49,6 +74,49 @@ class SimInfo(object):
         :type rho_ext: a ReactivityInsertion object or None
         :param feedback: is reactivity feedback present in the simulation
         :type feedback: bool
+        :param solver: 'split' takes turns integrating the neutronics and
+          thermal hydraulics blocks with dopri5. 'bdf', 'radau' and 'lsoda'
+          integrate the full coupled state vector with an implicit method.
+          'multirate' subcycles the neutronics block inside large thermal
+          hydraulics steps. 'exponential' is 'split' with the neutronics
+          block advanced exactly by a cached matrix exponential.
+        :type solver: string
+        :param rtol: relative tolerance for the coupled implicit solvers, and
+          for the coupling iterations of the multirate solver
+        :type rtol: float
+        :param atol: absolute tolerance for the coupled implicit solvers, and
+          for the coupling iterations of the multirate solver
+        :type atol: float
+        :param jacobian: the Jacobian given to the coupled solvers. 'analytic'
+          is assembled from the model, 'sparsity' passes only its sparse
+          structure for grouped finite differences, and 'dense' lets the
+          integrator use dense finite differences.
+        :type jacobian: string
+        :param prompt_jump: if True, the power follows the prompt jump
+          approximation instead of the point kinetics power equation, which
+          removes the stiffness set by the prompt neutron generation time
+        :type prompt_jump: bool
+        :param steady_state: if True, the transient starts from the steady
+          state at unit power rather than from the T0 of each component
+        :type steady_state: bool
+        :param events: threshold crossings that terminate the simulation,
+          scram the reactor or reduce the output rate
+        :type events: list of Event objects or None
+        :param checkpoint: where and how often the simulation is saved so
+          that it can be restarted
+        :type checkpoint: Checkpoint or None
+        :param cache: where finished simulations are stored and looked up
+          before solving
+        :type cache: Cache or None
+        :param history: if False, y keeps only the last window timesteps,
+          for simulations that are streamed with driver.stream. Checkpoints and
+          the cache need the history. With Chunks, y and the reactivity grow
+          in chunks as the simulation advances instead of being allocated
+          for every timestep up front.
+        :type history: bool or Chunks
+        :param window: the number of timesteps kept without the history,
+          at least two
+        :type window: int
         :param plotdir: the directory where the plots will be placed
         :type plotdir: string
         """
@@ -60,11 +128,39 @@ class SimInfo(object):
         self.n_dg = n_decay
         self.rho_ext = self.init_rho_ext(rho_ext)
         self.feedback = feedback
+        self.solver = validation.validate_supported("solver", solver,
+                                                    self.solvers)
+        self.rtol = validation.validate_g("rtol", rtol, 0.0)
+        self.atol = validation.validate_g("atol", atol, 0.0)
+        self.jacobian = validation.validate_supported("jacobian", jacobian,
+                                                      self.jacobians)
+        self.prompt_jump = prompt_jump
+        self.steady_state = steady_state
         self.ne = self.init_ne()
         self.kappa = kappa
         self.th = th_system.THSystem(kappa=kappa, components=components)
-        self.y = np.zeros(shape=(timer.timesteps(), self.n_entries()),
-                          dtype=float)
+        self.events = self.init_events(events)
+        self.checkpoint = checkpoint
+        self.cache = cache
+        self.history = history
+        if not history and (checkpoint is not None or cache is not None):
+            raise ValueError('Checkpoints and the cache need the history.')
+        self.cache_key = ''
+        """cache_key (str): the key of the simulation in the cache, once it
+        is solved with one"""
+        if isinstance(history, Chunks):
+            self.y = history.store('y', (self.n_entries(),))
+            self.ne._rho = history.store('rho')
+        elif history:
+            self.y = np.zeros(shape=(timer.timesteps(), self.n_entries()),
+                              dtype=float)
+        else:
+            window = int(validation.validate_ge("window", window, 2))
+            # the feedback reference is used until the end
+            pinned = [timer.t_idx_feedback]
+            self.y = Window(window, self.n_entries(), pinned=pinned)
+            self.ne._rho = Window(window)
+        self.bind_temperatures()
         self.plotdir = plotdir
         self.infile = infile
         if sim_id is not None:
@@ -85,6 +181,9 @@ class SimInfo(object):
                                   timeseries=False)
         self.db.register_recorder('metadata', 'sim_timeseries', self.record,
                                   timeseries=True)
+        self.db.register_monitor(['power'] + [c.name for c in
+                                              self.components],
+                                 self.monitor)
         self.db.register_recorder('neutronics', 'neutronics_params',
                                   self.ne.record,
                                   timeseries=True)
@@ -108,6 +207,34 @@ class SimInfo(object):
             rho_ext = ri.ReactivityInsertion(self.timer)
         return rho_ext
 
+    def init_events(self, events):
+        """Checks that each event watches a supported quantity or one of the
+        components.
+
+        :param events: the events of the simulation
+        :type events: list of Event objects or None
+        """
+        events = list(events) if events else []
+        supported = Event.quantities + [c.name for c in self.components]
+        for event in events:
+            validation.validate_supported("event quantity", event.quantity,
+                                          supported)
+        return events
+
+    def bind_temperatures(self):
+        """Makes the temperature history of each component a view of its
+        column of y, so that it is stored once.
+        """
+        n_n = 1 + self.n_pg + self.n_dg
+        for idx, comp in enumerate(self.components):
+            if isinstance(self.y, (Chunked, Window)):
+                T = QuantityColumn(self.y.column(n_n + idx), 'kelvin')
+            else:
+                T = units.Quantity(self.y[:, n_n + idx], 'kelvin')
+            # a component is not given an array of its own only to be dropped
+            T[0] = comp.T0 if comp._T is None else comp.T[0]
+            comp.T = T
+
     def init_ne(self):
         """Initializes the neutronics object owned by the siminfo object
         """
@@ -116,7 +243,8 @@ class SimInfo(object):
                                    n_decay=self.n_dg,
                                    timer=self.timer,
                                    rho_ext=self.rho_ext,
-                                   feedback=self.feedback)
+                                   feedback=self.feedback,
+                                   prompt_jump=self.prompt_jump)
         return ne
 
     def n_components(self):
@@ -199,9 +327,37 @@ class SimInfo(object):
                'n_pg': self.n_pg,
                'n_dg': self.n_dg,
                'kappa': self.kappa,
-               'plotdir': self.plotdir}
+               'solver': self.solver,
+               'plotdir': self.plotdir,
+               'cachekey': self.cache_key}
         return rec
 
+    def monitor(self, t_idx):
+        """Returns the power and the temperature [K] of each component at a
+        timestep, which the database watches to decide what to record
+
+        :param t_idx: the timestep
+        :type t_idx: int
+        """
+        n_n = 1 + self.n_pg + self.n_dg
+        row = self.y[t_idx]
+        return np.concatenate([row[:1], row[n_n:]])
+
+    def record_cache_key(self, key):
+        """Sets the cache key and writes it into the metadata/sim_info row,
+        which is recorded when the simulation info is created
+
+        :param key: the key of the simulation in the cache
+        :type key: str
+        """
+        self.cache_key = key
+        tab = self.db.get_table('metadata', 'sim_info')
+        if tab is None:
+            return
+        tab.modify_column(start=tab.nrows - 1, colname='cachekey',
+                          column=[key.encode()])
+        tab.flush()
+
     def record(self):
         """A recorder function for the metadata/sim_timeseries table
 
@@ -210,5 +366,6 @@ class SimInfo(object):
         t_idx = self.timer.current_timestep() - 1
         power = self.y[t_idx][0]
         rec = {'t_idx': t_idx,
+               'time': self.timer.seconds(t_idx),
                'power': power}
         return rec
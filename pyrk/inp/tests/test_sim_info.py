@@ -87,3 +87,9 @@ def test_sim_id():
     assert not first_id == next_id
     info.db.close_db()
     info.db.delete_db()
+
+
+def test_unsupported_solver():
+    with pytest.raises(ValueError) as excinfo:
+        si.SimInfo(solver='euler')
+    assert excinfo.type is ValueError
@@ -0,0 +1,208 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+The analytical Jacobian of the coupled point kinetics and thermal hydraulics
+system that driver.f_coupled evaluates.
+"""
+import numpy as np
+from scipy import sparse
+
+
+class Jacobian(object):
+    """This class assembles the sparse Jacobian of the full state vector.
+
+    The numerator of each dT/dt is a fixed sparse linear operator on the
+    state, taken from the compiled THNetwork of the thermal hydraulics
+    system. Only the heat capacities, which follow the density model, and
+    the power-reactivity terms of the neutronics block change between calls.
+    """
+
+    def __init__(self, si):
+        """Assembles the constant parts of the Jacobian of the simulation.
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        """
+        self.si = si
+        self.n_n = 1 + si.n_pg + si.n_dg
+        self.n = si.n_entries()
+        self.network = si.th.get_network()
+        rows = []
+        cols = []
+        vals = []
+        self.alphas = np.array([comp.alpha_temp.magnitude
+                                for comp in si.components])
+        if si.ne.prompt_jump:
+            self._assemble_prompt_jump(rows, cols, vals)
+        else:
+            self._assemble_neutronics(rows, cols, vals)
+        n_const = len(vals)
+        self._assemble_th()
+        th = self.th_op.tocoo()
+        # the thermal hydraulics entries are scaled by the heat capacity of
+        # their row at each call, and each row gets a diagonal correction for
+        # the temperature dependence of that heat capacity
+        self.th_slice = slice(n_const, n_const + th.nnz)
+        self.th_vals = th.data
+        self.th_rows = th.row
+        rows.extend(self.n_n + th.row)
+        cols.extend(th.col)
+        vals.extend(th.data)
+        n_c = si.n_components()
+        self.diag_slice = slice(len(vals), len(vals) + n_c)
+        rows.extend(self.n_n + np.arange(n_c))
+        cols.extend(self.n_n + np.arange(n_c))
+        vals.extend(np.zeros(n_c))
+        if si.ne.prompt_jump:
+            self._assemble_prompt_power(rows, cols, vals)
+        self.rows = np.array(rows, dtype=int)
+        self.cols = np.array(cols, dtype=int)
+        self.vals = np.array(vals, dtype=float)
+
+    def _assemble_neutronics(self, rows, cols, vals):
+        """Adds the point kinetics entries of the Jacobian. The entries that
+        depend on the reactivity and on the power are filled in per call.
+        The rest come from the point kinetics matrix of the Neutronics object.
+        """
+        si = self.si
+        self.Lambda = si.ne._Lambda
+        pke = sparse.coo_matrix(si.ne.pke_matrix())
+        # dP/dP depends on the reactivity
+        self.p_idx = len(vals)
+        self.p_0 = si.ne._pke[0, 0]
+        rows.append(0)
+        cols.append(0)
+        vals.append(0.0)
+        off_p = (pke.row != 0) | (pke.col != 0)
+        rows.extend(pke.row[off_p])
+        cols.extend(pke.col[off_p])
+        vals.extend(pke.data[off_p])
+        # dP/dT through the temperature feedback reactivity
+        self.fb_slice = slice(len(vals), len(vals) + si.n_components())
+        rows.extend([0] * si.n_components())
+        cols.extend(self.n_n + np.arange(si.n_components()))
+        vals.extend(np.zeros(si.n_components()))
+
+    def _assemble_prompt_jump(self, rows, cols, vals):
+        """Adds the neutronics entries of the Jacobian under the prompt jump
+        approximation. The whole block follows the reactivity, so it is
+        filled per call from Neutronics.pke_matrix. With feedback, every
+        neutronics row also depends on every temperature.
+        """
+        si = self.si
+        pke = sparse.coo_matrix(si.ne.pke_matrix())
+        self.n_slice = slice(len(vals), len(vals) + pke.nnz)
+        self.n_rows = pke.row
+        self.n_cols = pke.col
+        rows.extend(pke.row)
+        cols.extend(pke.col)
+        vals.extend(pke.data)
+        if si.feedback:
+            n_c = si.n_components()
+            self.fb_slice = slice(len(vals), len(vals) + self.n_n * n_c)
+            rows.extend(np.repeat(np.arange(self.n_n), n_c))
+            cols.extend(np.tile(self.n_n + np.arange(n_c), self.n_n))
+            vals.extend(np.zeros(self.n_n * n_c))
+
+    def _assemble_prompt_power(self, rows, cols, vals):
+        """Adds the dependence of the heat generation on the precursors and,
+        with feedback, on the temperatures, through the prompt jump power.
+        """
+        si = self.si
+        n_c = si.n_components()
+        self.heat_rows = np.nonzero(self.network.gen_power)[0]
+        n_h = len(self.heat_rows)
+        self.pp_slice = slice(len(vals), len(vals) + n_h * si.n_pg)
+        rows.extend(np.repeat(self.n_n + self.heat_rows, si.n_pg))
+        cols.extend(np.tile(1 + np.arange(si.n_pg), n_h))
+        vals.extend(np.zeros(n_h * si.n_pg))
+        if si.feedback:
+            self.ppfb_slice = slice(len(vals), len(vals) + n_h * n_c)
+            rows.extend(np.repeat(self.n_n + self.heat_rows, n_c))
+            cols.extend(np.tile(self.n_n + np.arange(n_c), n_h))
+            vals.extend(np.zeros(n_h * n_c))
+
+    def _assemble_th(self):
+        """Assembles the sparse operator mapping the state onto the numerator
+        of each dT/dt from the compiled thermal network.
+        """
+        si = self.si
+        net = self.network
+        end_pg = 1 + si.n_pg
+        n_c = net.n_components()
+        op = sparse.lil_matrix((n_c, self.n))
+        op[:, self.n_n:] = net.operator()
+        if not si.ne.prompt_jump:
+            # with the prompt jump, the power is not part of the state
+            op[:, 0] = net.gen_power.reshape(-1, 1)
+        for k in range(0, si.n_dg):
+            op[:, end_pg + k] = net.gen_decay.reshape(-1, 1)
+        self.th_op = op.tocsr()
+        self.th_op.eliminate_zeros()
+
+    def _fill_prompt_jump(self, vals, y, rho, feedback):
+        """Fills the neutronics entries under the prompt jump approximation.
+        P = c . zetas with c = Lambda * lambdas / (beta - rho), so both P
+        and c change with the reactivity by a factor 1 / (beta - rho).
+        """
+        ne = self.si.ne
+        pke = ne.pke_matrix(rho)
+        vals[self.n_slice] = pke[self.n_rows, self.n_cols]
+        if feedback:
+            y_n = y[:self.n_n]
+            zetas = slice(1, 1 + self.si.n_pg)
+            c = ne.prompt_coefficients(rho)
+            dpower = ne.power(y_n, rho) / (ne._beta - rho)
+            # d/drho of the derivative of the neutronics block
+            drho = ne._pke[:, 0] * dpower
+            drho[0] = (c / (ne._beta - rho)).dot(pke[zetas, :].dot(y_n)) + \
+                c.dot(ne._pke[zetas, 0]) * dpower
+            vals[self.fb_slice] = np.outer(drho, self.alphas).ravel()
+
+    def sparsity(self):
+        """Returns the sparsity structure of the Jacobian
+
+        :rtype: scipy.sparse.csc_matrix
+        """
+        ones = np.ones(len(self.vals))
+        return sparse.csc_matrix((ones, (self.rows, self.cols)),
+                                 shape=(self.n, self.n))
+
+    def __call__(self, t, y, feedback):
+        """Returns the Jacobian of driver.f_coupled at time t and state y.
+
+        :param t: the time [s]
+        :type t: float
+        :param y: the full solution vector
+        :type y: np.ndarray
+        :param feedback: whether temperature feedback is active
+        :type feedback: bool
+        :rtype: scipy.sparse.csc_matrix
+        """
+        si = self.si
+        t_idx = min(si.timer.idx(t), si.timer.timesteps() - 1)
+        temps = y[self.n_n:]
+        rho = si.ne.reactivity_from_temps(t_idx, si.components, temps,
+                                          feedback)
+        vals = self.vals.copy()
+        power = si.ne.power(y, rho)
+        if si.ne.prompt_jump:
+            self._fill_prompt_jump(vals, y, rho, feedback)
+        else:
+            vals[self.p_idx] = self.p_0 + rho / self.Lambda
+            if feedback:
+                vals[self.fb_slice] = y[0] * self.alphas / self.Lambda
+        net = self.network
+        cap = net.capacity(temps)
+        numerator = net.heat(temps, power, y[1 + si.n_pg:self.n_n])
+        vals[self.th_slice] = self.th_vals / cap[self.th_rows]
+        vals[self.diag_slice] = -numerator * net.rho_b * net.cp / cap**2
+        if si.ne.prompt_jump:
+            gen = net.gen_power[self.heat_rows] / cap[self.heat_rows]
+            c = si.ne.prompt_coefficients(rho)
+            vals[self.pp_slice] = np.outer(gen, c).ravel()
+            if feedback:
+                dpower = power / (si.ne._beta - rho)
+                vals[self.ppfb_slice] = np.outer(gen * dpower,
+                                                 self.alphas).ravel()
+        return sparse.csc_matrix((vals, (self.rows, self.cols)),
+                                 shape=(self.n, self.n))
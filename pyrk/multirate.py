@@ -0,0 +1,136 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Multi-rate coupling of the point kinetics and thermal hydraulics blocks.
+
+Over a window of several output timesteps the neutronics block subcycles at
+its own step size against an interpolated temperature history, and the
+thermal hydraulics block takes large implicit steps against the power history
+of the neutronics solution. The two are iterated over the window until the
+temperature history stops changing to within the simulation tolerances.
+"""
+import numpy as np
+from scipy.integrate import solve_ivp
+
+
+def neutronics_window(si, t0, y_n0, t1, temps, feedback):
+    """Integrates the neutronics block over [t0, t1] with the component
+    temperatures given as a function of time.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param t0: the start of the window [s]
+    :type t0: float
+    :param y_n0: the neutronics block at t0
+    :type y_n0: np.ndarray
+    :param t1: the end of the window [s]
+    :type t1: float
+    :param temps: the component temperatures at a time in the window
+    :type temps: function
+    :param feedback: whether temperature feedback is active
+    :type feedback: bool
+    :return: the dense neutronics solution
+    :rtype: scipy.integrate.OdeSolution
+    """
+    def rho(t):
+        return si.ne.reactivity_at(t, si.components,
+                                   temps(t) if feedback else None, feedback)
+    sol = solve_ivp(lambda t, y_n: si.ne.dydt(y_n, rho(t)), (t0, t1), y_n0,
+                    method='BDF', dense_output=True, rtol=si.rtol,
+                    atol=si.atol,
+                    jac=lambda t, y_n: si.ne.pke_matrix(rho(t)))
+    if sol.status < 0:
+        raise RuntimeError(sol.message)
+    return sol.sol
+
+
+def thermal_window(si, t0, temps0, t1, y_n, feedback):
+    """Integrates the thermal hydraulics block over [t0, t1] with the power
+    and decay heat given as a function of time.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param t0: the start of the window [s]
+    :type t0: float
+    :param temps0: the component temperatures at t0
+    :type temps0: np.ndarray
+    :param t1: the end of the window [s]
+    :type t1: float
+    :param y_n: the neutronics block at a time in the window
+    :type y_n: function
+    :param feedback: whether temperature feedback is active
+    :type feedback: bool
+    :return: the dense thermal hydraulics solution
+    :rtype: scipy.integrate.OdeSolution
+    """
+    net = si.th.get_network()
+    end_pg = 1 + si.n_pg
+
+    def power(t, n, temps):
+        if si.ne.prompt_jump:
+            return si.ne.power(n, si.ne.reactivity_at(t, si.components,
+                                                      temps, feedback))
+        return n[0]
+
+    def f(t, temps):
+        n = y_n(t)
+        return net.dtempdt(temps, power(t, n, temps), n[end_pg:])
+
+    def jac(t, temps):
+        n = y_n(t)
+        return net.jacobian(temps, power(t, n, temps), n[end_pg:])
+    sol = solve_ivp(f, (t0, t1), temps0, method='BDF', dense_output=True,
+                    rtol=si.rtol, atol=si.atol, jac=jac)
+    if sol.status < 0:
+        raise RuntimeError(sol.message)
+    return sol.sol
+
+
+def solve_window(si, t0, y0, t_out, feedback, max_iter=10):
+    """Advances the full state vector from t0 across a window ending at the
+    last of the output times.
+
+    The first temperature history is extrapolated linearly from the
+    derivative at t0. Each iteration then subcycles the neutronics block
+    against the current temperature history and integrates the thermal
+    hydraulics block against the resulting power. The window converges when
+    the new temperature history agrees with the previous one at every output
+    time, to within si.rtol and si.atol.
+
+    :param si: the simulation info object
+    :type si: SimInfo
+    :param t0: the start of the window [s]
+    :type t0: float
+    :param y0: the full solution vector at t0
+    :type y0: np.ndarray
+    :param t_out: the output times in the window, ending with its end [s]
+    :type t_out: np.ndarray
+    :param feedback: whether temperature feedback is active
+    :type feedback: bool
+    :param max_iter: the number of iterations allowed before giving up
+    :type max_iter: int
+    :return: the solution at each output time, one row per time, and the
+      number of iterations, or None if the window did not converge
+    :rtype: tuple of (np.ndarray, int) or None
+    """
+    n_n = 1 + si.n_pg + si.n_dg
+    end_pg = 1 + si.n_pg
+    t1 = t_out[-1]
+    y_n0 = y0[:n_n]
+    temps0 = y0[n_n:]
+    slope = si.th.get_network().dtempdt(temps0, y_n0[0], y_n0[end_pg:])
+
+    def temps(t):
+        return temps0 + (t - t0) * slope
+    prev = temps0[:, np.newaxis] + np.outer(slope, t_out - t0)
+    for iteration in range(1, max_iter + 1):
+        sol_n = neutronics_window(si, t0, y_n0, t1, temps, feedback)
+        sol_th = thermal_window(si, t0, temps0, t1, sol_n, feedback)
+        new = sol_th(t_out).reshape(len(temps0), len(t_out))
+        err = np.abs(new - prev) / (si.atol + si.rtol * np.abs(new))
+        # without feedback the neutronics never see the temperatures
+        if not feedback or err.size == 0 or np.max(err) <= 1.0:
+            ys = np.vstack([sol_n(t_out).reshape(n_n, len(t_out)), new])
+            return ys.T, iteration
+        temps = sol_th
+        prev = new
+    return None
@@ -1,5 +1,6 @@
 # Licensed under a 3-clause BSD-style license
 import numpy as np
+from scipy.linalg import expm
 from pyrk.inp import validation as v
 
 from pyrk.data import precursors as pr
@@ -14,11 +15,16 @@ class Neutronics(object):
     neutronics subblock
     """
 
+    max_propagators = 256
+    """max_propagators (int): the number of matrix exponentials kept in the
+    propagator cache before it is cleared"""
+
     def __init__(self, iso="u235", e="thermal", n_precursors=6, n_decay=11,
                  n_fic=0,
                  timer=Timer(),
                  rho_ext=None,
-                 feedback=False):
+                 feedback=False,
+                 prompt_jump=False):
         """
         Creates a Neutronics object that holds the neutronics simulation
         information.
@@ -36,6 +42,12 @@ class Neutronics(object):
         :type n_fic: int
         :param rho_ext: External reactivity, a function of time
         :type rho_ext: function
+        :param feedback: is reactivity feedback present in the simulation
+        :type feedback: bool
+        :param prompt_jump: if True, the power follows the prompt jump
+          approximation, an algebraic function of the precursors, instead of
+          its own stiff differential equation
+        :type prompt_jump: bool
         :returns: A Neutronics object that holds neutronics simulation info
         """
 
@@ -62,25 +74,79 @@ class Neutronics(object):
         self._dd = dh.DecayData(iso, e, n_decay)
         """_dd (DecayData): A data.decay_heat.DecayData object"""
 
+        self._betas = np.array(self._pd.betas(), dtype=float)
+        """_betas (ndarray): delayed neutron fraction of each precursor group"""
+
+        self._lambdas = np.array(self._pd.lambdas(), dtype=float)
+        """_lambdas (ndarray): decay constants of the precursor groups"""
+
+        self._beta = float(self._pd.beta())
+        """_beta (float): total delayed neutron fraction"""
+
+        self._Lambda = float(self._pd.Lambda())
+        """_Lambda (float): prompt neutron generation time"""
+
+        self._kappas = np.array(self._dd.kappas()[:n_decay], dtype=float)
+        """_kappas (ndarray): decay heat values of the decay heat groups"""
+
+        self._decay_lambdas = np.array(self._dd.lambdas()[:n_decay],
+                                       dtype=float)
+        """_decay_lambdas (ndarray): decay constants of the decay heat groups"""
+
+        self._pke = self._init_pke()
+        """_pke (ndarray): the point kinetics matrix at zero reactivity"""
+
         self._timer = timer
         """_timer: the time instance object"""
 
         self._rho = np.zeros(self._timer.timesteps())
         """_rho (ndarray): An array of reactivity values for each timestep."""
 
-        self._rho_ext = self.init_rho_ext(rho_ext).reactivity
+        rho_ext = self.init_rho_ext(rho_ext)
+        self._rho_ext = rho_ext.reactivity
         """_rho_ext (ReactivityInsertion): Reactivity function from the
         reactivity insertion model"""
 
+        self._rho_ext_vals = np.array([rho.to('delta_k').magnitude
+                                       for rho in rho_ext.vals], dtype=float)
+        """_rho_ext_vals (ndarray): the external reactivity at each timestep,
+        in delta_k, for use inside the solver"""
+
         self.feedback = feedback
         """feedback (bool): False if no reactivity feedbacks, true otherwise"""
 
+        self.prompt_jump = prompt_jump
+        """prompt_jump (bool): True if the power follows the prompt jump
+        approximation"""
+
+        self._propagators = {}
+        """_propagators (dict): matrix exponentials of the point kinetics
+        matrix, keyed by (reactivity, timestep size)"""
+
+    def _init_pke(self):
+        """Assembles the point kinetics matrix for zero reactivity, for the
+        ordering [power, zetas, omegas].
+        """
+        n_pg = len(self._lambdas)
+        n_dg = len(self._kappas)
+        n = 1 + n_pg + n_dg
+        a = np.zeros(shape=(n, n), dtype=float)
+        a[0, 0] = -self._beta / self._Lambda
+        a[0, 1:1 + n_pg] = self._lambdas
+        zetas = np.arange(1, 1 + n_pg)
+        a[zetas, 0] = self._betas / self._Lambda
+        a[zetas, zetas] = -self._lambdas
+        omegas = np.arange(1 + n_pg, n)
+        a[omegas, 0] = self._kappas
+        a[omegas, omegas] = -self._decay_lambdas
+        return a
+
     def init_rho_ext(self, rho_ext):
         if rho_ext is None:
             rho_ext = ReactivityInsertion(self._timer)
         return rho_ext
 
-    def dpdt(self, t_idx, components, power, zetas):
+    def dpdt(self, t_idx, components, power, zetas, rho=None):
         """Calculates the power term. The first in the neutronics block.
 
         :param t_idx: the time step index
@@ -91,8 +157,11 @@ class Neutronics(object):
         :type power: float.
         :param zetas: the current delayed neutron precursor populations, zeta_i
         :type zetas: np.ndarray.
+        :param rho: the reactivity, if it has already been calculated
+        :type rho: float, units of delta_k, or None
         """
-        rho = self.reactivity(t_idx, components)
+        if rho is None:
+            rho = self.reactivity(t_idx, components)
         beta = self._pd.beta()
         lams = self._pd.lambdas()
         Lambda = self._pd.Lambda()
@@ -136,6 +205,111 @@ class Neutronics(object):
         lam = self._dd.lambdas()[k]
         return kappa * p - lam * omega
 
+    def pke_matrix(self, rho=0.0):
+        """Returns the matrix of the linear point kinetics system, so that
+        d/dt of [power, zetas, omegas] is its product with that vector.
+
+        :param rho: the reactivity
+        :type rho: float, units of delta_k
+        :rtype: np.ndarray
+        """
+        a = self._pke.copy()
+        if self.prompt_jump:
+            # substitute P = c . zetas into every row, then let P follow
+            # the precursors along the prompt jump relation
+            n_pg = len(self._lambdas)
+            c = self.prompt_coefficients(rho)
+            a[:, 1:1 + n_pg] += np.outer(a[:, 0], c)
+            a[:, 0] = 0.0
+            a[0, :] = c.dot(a[1:1 + n_pg, :])
+        else:
+            a[0, 0] += rho / self._Lambda
+        return a
+
+    def prompt_coefficients(self, rho):
+        """Returns the coefficients c of the prompt jump approximation,
+        P = c . zetas, with c = Lambda * lambdas / (beta - rho).
+
+        :param rho: the reactivity
+        :type rho: float, units of delta_k
+        :rtype: np.ndarray
+        """
+        if rho >= self._beta:
+            msg = 'The prompt jump approximation requires the reactivity '
+            msg += 'to stay below beta = ' + str(self._beta)
+            msg += '. The reactivity was: ' + str(rho)
+            raise ValueError(msg)
+        return self._Lambda * self._lambdas / (self._beta - rho)
+
+    def power(self, y, rho):
+        """Returns the normalized power of the neutronics block y. With the
+        prompt jump approximation this is computed from the precursors.
+        Otherwise it is y[0].
+
+        :param y: the neutronics block, [power, zetas, omegas]
+        :type y: np.ndarray
+        :param rho: the reactivity
+        :type rho: float, units of delta_k
+        :rtype: float
+        """
+        if self.prompt_jump:
+            n_pg = len(self._lambdas)
+            return self.prompt_coefficients(rho).dot(y[1:1 + n_pg])
+        return y[0]
+
+    def equilibrium(self, power=1.0):
+        """Returns the neutronics block in equilibrium at a constant power,
+        with the precursors and decay heat groups at their saturated values.
+
+        :param power: normalized nuclear power
+        :type power: float
+        :return: [power, zetas, omegas]
+        :rtype: np.ndarray
+        """
+        zetas = self._betas / (self._lambdas * self._Lambda) * power
+        omegas = self._kappas / self._decay_lambdas * power
+        return np.concatenate([[power], zetas, omegas])
+
+    def propagator(self, rho, dt):
+        """Returns the matrix that advances the neutronics block exactly over
+        a step of length dt at constant reactivity, the exponential of the
+        point kinetics matrix times dt. Each distinct (rho, dt) pair is
+        computed once and cached.
+
+        :param rho: the reactivity
+        :type rho: float, units of delta_k
+        :param dt: the step size
+        :type dt: float, units of seconds
+        :rtype: np.ndarray
+        """
+        key = (float(rho), float(dt))
+        prop = self._propagators.get(key)
+        if prop is None:
+            if len(self._propagators) >= self.max_propagators:
+                self._propagators.clear()
+            prop = expm(self.pke_matrix(rho) * dt)
+            self._propagators[key] = prop
+        return prop
+
+    def dydt(self, y, rho, out=None):
+        """Returns the time derivative of the whole neutronics block at once,
+        as one product with the precomputed point kinetics matrix.
+
+        :param y: the neutronics block, [power, zetas, omegas]
+        :type y: np.ndarray
+        :param rho: the reactivity
+        :type rho: float, units of delta_k
+        :param out: preallocated array for the result, or None
+        :type out: np.ndarray
+        :return: d/dt of [power, zetas, omegas]
+        :rtype: np.ndarray
+        """
+        if self.prompt_jump:
+            return np.dot(self.pke_matrix(rho), y, out=out)
+        out = np.dot(self._pke, y, out=out)
+        out[0] += rho * y[0] / self._Lambda
+        return out
+
     def reactivity(self, t_idx, components):
         """Returns the reactivity, in $\Delta k$, at time t
         :param t_idx: time step that reactivity is calculated
@@ -145,23 +319,98 @@ class Neutronics(object):
         :param components: thermal hydraulic component objects
         :type components: list of THComponent and/or THSuperComponent objects
         """
-        rho = {}
-        if self.feedback and t_idx > self._timer.t_idx_feedback:
-            for component in components:
-                rho[component.name] = component.temp_reactivity(t_idx)
-        rho["external"] = self._rho_ext(t_idx=t_idx).to('delta_k')
-        to_ret = sum(rho.values()).magnitude
+        feedback = self.feedback and t_idx > self._timer.t_idx_feedback
+        temps = None
+        if feedback:
+            # the temperatures of the last completed timestep
+            temps = [component.T.magnitude[t_idx - 1]
+                     for component in components]
+        to_ret = self.reactivity_from_temps(t_idx, components, temps, feedback)
         self._rho[t_idx] = to_ret
         return to_ret
 
+    def reactivity_from_temps(self, t_idx, components, temps, feedback,
+                              alphas=None, temps_fb=None):
+        """Returns the reactivity, in $\\Delta k$, for a given set of component
+        temperatures rather than the recorded temperature history. This is
+        the feedback used when the whole system is solved as one state vector.
+        Every solver computes its feedback here, so that they agree.
+
+        :param t_idx: time step at which the external reactivity is evaluated
+        :type t_idx: int, index
+        :param components: thermal hydraulic component objects
+        :type components: list of THComponent and/or THSuperComponent objects
+        :param temps: the current component temperatures, in kelvin, or one
+          row of them per model of a batch
+        :type temps: np.ndarray
+        :param feedback: whether temperature feedback is active
+        :type feedback: bool
+        :param alphas: the temperature coefficients, or None for those of the
+          components
+        :type alphas: np.ndarray
+        :param temps_fb: the temperatures at which feedback starts, or None
+          for those the components recorded at the feedback timestep
+        :type temps_fb: np.ndarray
+        :return: the reactivity, or one per row of temps
+        :rtype: float or np.ndarray
+        """
+        to_ret = 0.0
+        if feedback:
+            if alphas is None:
+                alphas = np.array([component.alpha_temp.magnitude
+                                   for component in components])
+            if temps_fb is None:
+                t_fb = self._timer.t_idx_feedback
+                temps_fb = np.array([component.T.magnitude[t_fb]
+                                     for component in components])
+            to_ret = np.sum(alphas * (np.asarray(temps) - temps_fb), axis=-1)
+        return to_ret + self._rho_ext_vals[t_idx]
+
+    def reactivity_at(self, t, components, temps, feedback, alphas=None,
+                      temps_fb=None):
+        """Returns the reactivity at time t, like reactivity_from_temps with
+        the external reactivity of the timestep holding t, or of the last
+        timestep past tf.
+
+        :param t: the time [s]
+        :type t: float
+        :param components: thermal hydraulic component objects
+        :type components: list of THComponent and/or THSuperComponent objects
+        :param temps: the current component temperatures, in kelvin, or one
+          row of them per model of a batch
+        :type temps: np.ndarray
+        :param feedback: whether temperature feedback is active
+        :type feedback: bool
+        :param alphas: the temperature coefficients, or None for those of the
+          components
+        :type alphas: np.ndarray
+        :param temps_fb: the temperatures at which feedback starts, or None
+          for those the components recorded at the feedback timestep
+        :type temps_fb: np.ndarray
+        :rtype: float or np.ndarray
+        """
+        t_idx = min(self._timer.idx(t), self._timer.timesteps() - 1)
+        return self.reactivity_from_temps(t_idx, components, temps, feedback,
+                                          alphas, temps_fb)
+
+    def set_rho_ext(self, t_idx, rho):
+        """Replaces the external reactivity from timestep t_idx onwards, as
+        when the reactor is scrammed.
+
+        :param t_idx: the first timestep with the new external reactivity
+        :type t_idx: int, index
+        :param rho: the new external reactivity
+        :type rho: float, units of delta_k
+        """
+        self._rho_ext_vals[t_idx:] = rho
+
     def record(self):
         """A recorder function to hold total and external reactivity
         """
         t = self._timer.current_timestep() - 1
         rec = {'t_idx': t,
                'rho_tot': self._rho[t],
-               'rho_ext':
-               self._rho_ext(t_idx=t).to('delta_k').magnitude
+               'rho_ext': self._rho_ext_vals[t]
               }
         return rec
 
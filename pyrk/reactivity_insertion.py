@@ -150,12 +150,16 @@ class RampReactivityInsertion(ReactivityInsertion):
         if x < self.timer.t_idx(self.t_start):
             return self.rho_init
         elif x <= self.timer.t_idx(self.t_end):
+            start = self.timer.t(self.timer.t_idx(self.t_start))
             return self.rho_init + \
-                self.slope() * (x - self.timer.t_idx(self.t_start))
+                self.slope() * (self.timer.t(x) - start)
         else:
             return self.rho_final
 
     def slope(self):
+        """Returns the rise of the ramp per second, between the timesteps
+        nearest to t_start and t_end"""
         rise = self.rho_rise - self.rho_init
-        run = self.timer.t_idx(self.t_end) - self.timer.t_idx(self.t_start)
+        run = self.timer.t(self.timer.t_idx(self.t_end)) - \
+            self.timer.t(self.timer.t_idx(self.t_start))
         return rise / run
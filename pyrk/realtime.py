@@ -0,0 +1,150 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Real-time runs that advance in step with the wall clock, for example behind
+the front end of a training simulator.
+
+Each output timestep of the timer is a frame. A frame is released when its
+simulated time is reached on the wall clock, scaled by speed, so the output
+cadence follows the timer's grid. Between frames, the commands waiting in the
+queue are applied from the next timestep on. A command is a path and a
+value: 'rho_ext' replaces the external reactivity, and any other path names
+a parameter of a component as in pyrk.sweep, such as the mass flow or the
+inlet temperature of an advection::
+
+    rt = RealTime(si, infile)
+    rt.put('rho_ext', 100 * units.pcm)
+    rt.put('cool.adv.cool.m_flow', 0.0035)
+    for t, power, zetas, omegas, temps, rho in rt.stream():
+        display(t, power, temps)
+
+The front end may call put from another thread. A frame that is solved after
+its release time is an overrun. Overruns are kept in the overruns attribute
+and summarized in the log when the run ends.
+"""
+import queue
+import time
+
+from pyrk import driver
+from pyrk import sweep
+from pyrk.utilities.logger import pyrklog
+from pyrk.utilities.ur import units
+
+
+class RealTime(object):
+    """This class runs a simulation in step with the wall clock and applies
+    the commands it is sent between timesteps.
+    """
+
+    def __init__(self, si, infile, speed=1.0, commands=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        """Prepares a real-time run
+
+        :param si: the simulation info object
+        :type si: SimInfo
+        :param infile: the imported infile module, or an object with its
+          solver settings such as nsteps
+        :type infile: imported module
+        :param speed: simulated seconds per wall clock second, or None to
+          release every frame as soon as it is solved
+        :type speed: float or None
+        :param commands: the command queue, by default a new one
+        :type commands: queue.Queue
+        :param clock: returns the wall clock time in seconds
+        :type clock: function
+        :param sleep: waits for a number of seconds
+        :type sleep: function
+        """
+        self.si = si
+        self.infile = infile
+        self.speed = speed
+        self.commands = commands if commands is not None else queue.Queue()
+        """commands (Queue): the (path, value) commands not yet applied"""
+        self.clock = clock
+        self.sleep = sleep
+        self.overruns = []
+        """overruns (list): the timestep and the lateness [s] of each frame
+        that was solved after its release time"""
+
+    def put(self, path, value):
+        """Queues a command, which is applied before the next timestep
+
+        :param path: 'rho_ext', or the path of a component parameter
+        :type path: str
+        :param value: the new value. A plain number takes the units of the
+          value it replaces, and the external reactivity is in delta_k.
+        :type value: float or Quantity
+        """
+        self.commands.put((path, value))
+
+    def apply(self, path, value):
+        """Applies a command from the timestep after the current one on
+
+        :param path: 'rho_ext', or the path of a component parameter
+        :type path: str
+        :param value: the new value
+        :type value: float or Quantity
+        """
+        si = self.si
+        if path == 'rho_ext':
+            if isinstance(value, units.Quantity):
+                value = value.to('delta_k').magnitude
+            si.ne.set_rho_ext(si.timer.current_timestep() + 1, value)
+        else:
+            sweep.set_param(si, path, value)
+            # the thermal network holds the advection terms
+            si.th.compile()
+
+    def apply_all(self):
+        """Applies the queued commands and returns True if there were any
+        """
+        changed = False
+        while True:
+            try:
+                path, value = self.commands.get_nowait()
+            except queue.Empty:
+                return changed
+            self.apply(path, value)
+            changed = True
+
+    def stream(self):
+        """Solves the simulation, yielding the time [s], the normalized
+        power, the precursor concentrations, the decay heats, the component
+        temperatures [K] and the reactivity [dk] of each frame, like
+        driver.stream, at its release time.
+        """
+        si = self.si
+        end_pg = 1 + si.n_pg
+        n_n = 1 + si.n_pg + si.n_dg
+        t0 = si.timer.t0.magnitude
+        self.overruns = []
+        steps = driver.steps(si, si.y, self.infile)
+        start = None
+        t_idx = next(steps)
+        while True:
+            t = si.timer.seconds(t_idx)
+            if self.speed is not None:
+                now = self.clock()
+                if start is None:
+                    start = now
+                deadline = start + (t - t0) / self.speed
+                if now > deadline:
+                    self.overruns.append((t_idx, now - deadline))
+                else:
+                    self.sleep(deadline - now)
+            row = si.y[t_idx]
+            yield (t, row[0], row[1:end_pg].copy(), row[end_pg:n_n].copy(),
+                   row[n_n:].copy(), si.ne._rho[t_idx])
+            try:
+                t_idx = steps.send(self.apply_all())
+            except StopIteration:
+                break
+        self.report()
+
+    def report(self):
+        """Logs the number of overruns and the largest lateness"""
+        if not self.overruns:
+            return
+        late = max(lateness for _, lateness in self.overruns)
+        msg = str(len(self.overruns)) + ' frames overran their release '
+        msg += 'time, by up to ' + str(late) + ' s.'
+        pyrklog.warning(msg)
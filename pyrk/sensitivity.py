@@ -0,0 +1,510 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Forward sensitivity analysis of a simulation with respect to its parameters.
+
+The sensitivity s_k = dy/dp_k of the solution vector to a parameter p_k
+follows the linear equations
+
+    ds_k/dt = J(t, y) s_k + df/dp_k(t, y) + df/dT_fb(t, y) s_k(t_feedback)
+
+where J is the analytical Jacobian of driver.f_coupled and the last term
+accounts for the feedback reference temperatures, which are themselves part
+of the solution. The sensitivities are integrated alongside the state with
+the same BDF integrator and on its steps, so one augmented run gives dy/dp
+for every timestep in place of finite differences of reruns.
+
+The partial derivative df/dp_k is analytical. The point kinetics matrix is
+linear in the delayed neutron fractions and in 1/Lambda, and the heat
+balance of the THNetwork is linear in the temperature coefficients, the
+heat generation, the advected mass flows and the heat transfer coefficients
+of its convective models, so each parameter has a fixed derivative of the
+compiled arrays. The initial sensitivities follow the same way from the
+equilibrium of the point kinetics and, from a steady state, from the
+derivative of the steady state heat balance.
+"""
+import numpy as np
+from scipy import sparse
+from scipy.integrate import BDF
+
+from pyrk import driver
+from pyrk import jacobian
+from pyrk import sweep
+from pyrk.convective_model import ConvectiveModel
+from pyrk.th_component import THComponent
+from pyrk.th_network import THNetwork
+
+
+class Sensitivity(object):
+    """This class integrates a simulation together with the sensitivities of
+    its solution vector to a set of parameters.
+    """
+
+    neutronics_params = ['beta', 'Lambda']
+    """neutronics_params (list): the parameters of the point kinetics. 'beta'
+    scales every delayed neutron fraction by the same factor."""
+
+    component_params = ['alpha_temp', 'power_tot']
+    """component_params (list): the parameters of a component"""
+
+    def __init__(self, si, params, atol=None):
+        """Prepares the derivatives of the model with respect to each
+        parameter.
+
+        :param si: the simulation info object, with a coupled solver
+        :type si: SimInfo
+        :param params: 'beta', 'Lambda', or the path of a component
+          parameter as in pyrk.sweep: the alpha_temp or power_tot of a
+          component, such as 'fuel.alpha_temp', the m_flow of an advection,
+          such as 'cool.adv.cool.m_flow', or the h0 of a convective model,
+          such as 'fuel.conv.cool.h.h0'. Sensitivities are per unit of the
+          magnitude of the parameter, in the units it is stored in.
+        :type params: list of str
+        :param atol: the absolute tolerance of the sensitivities, one for
+          every parameter or one per parameter, or None for the absolute
+          tolerance of the state divided by the magnitude of each parameter.
+          An infinite tolerance leaves the sensitivities out of the error
+          control, so the steps are those the state alone would take.
+        :type atol: float, sequence of floats or None
+        """
+        if si.solver not in driver.coupled_integrators:
+            msg = 'Sensitivity analysis needs a coupled solver, one of '
+            msg += str(list(driver.coupled_integrators))
+            msg += '. The solver was: ' + si.solver
+            raise ValueError(msg)
+        self.si = si
+        self.params = list(params)
+        self.n_n = 1 + si.n_pg + si.n_dg
+        self.n = si.n_entries()
+        self.net = THNetwork(si.components, si.kappa)
+        """net (THNetwork): the compiled thermal network of the simulation"""
+        self.alphas = np.array([comp.alpha_temp.magnitude
+                                for comp in si.components])
+        """alphas (ndarray): the temperature coefficient of each component"""
+        n_p = len(self.params)
+        n_c = len(si.components)
+        self.d_pke = np.zeros((n_p, self.n_n, self.n_n))
+        """d_pke (ndarray): the derivative of the point kinetics matrix at
+        zero reactivity with respect to each parameter"""
+        self.d_beta = np.zeros(n_p)
+        """d_beta (ndarray): the derivative of beta with respect to each
+        parameter"""
+        self.d_Lambda = np.zeros(n_p)
+        """d_Lambda (ndarray): the derivative of Lambda with respect to each
+        parameter"""
+        self.d_alphas = np.zeros((n_p, n_c))
+        """d_alphas (ndarray): the derivative of the temperature coefficients
+        with respect to each parameter"""
+        self.d_gen_power = np.zeros((n_p, n_c))
+        """d_gen_power (ndarray): the derivative of the heat generation per
+        unit power with respect to each parameter"""
+        self.d_adv_diag = np.zeros((n_p, n_c))
+        """d_adv_diag (ndarray): the derivative of the advection coefficients
+        with respect to each parameter"""
+        self.d_adv_src = np.zeros((n_p, n_c))
+        """d_adv_src (ndarray): the derivative of the advection sources with
+        respect to each parameter"""
+        self.d_cond = [None] * n_p
+        """d_cond (list): the derivative of the conductive and convective
+        coefficients with respect to each parameter, or None"""
+        for k, path in enumerate(self.params):
+            self.differentiate(k, path)
+        if atol is None:
+            atol = [si.atol / (abs(self.value(path)) or 1.0)
+                    for path in self.params]
+        self.atol = np.broadcast_to(np.asarray(atol, dtype=float),
+                                    (n_p,)).copy()
+        """atol (ndarray): the absolute tolerance of the sensitivities to each
+        parameter"""
+        self.s = None
+        """s (ndarray): the sensitivities after solve, indexed by timestep,
+        parameter and entry of the solution vector"""
+
+    def value(self, path):
+        """Returns the magnitude of a parameter
+
+        :param path: the parameter
+        :type path: str
+        """
+        if path == 'beta':
+            return self.si.ne._beta
+        elif path == 'Lambda':
+            return self.si.ne._Lambda
+        value = sweep.get_param(self.si, path)
+        return float(getattr(value, 'magnitude', value))
+
+    def differentiate(self, k, path):
+        """Fills the derivatives of the model with respect to parameter k
+
+        :param k: the index of the parameter
+        :type k: int
+        :param path: the parameter
+        :type path: str
+        """
+        ne = self.si.ne
+        net = self.net
+        n_pg = self.si.n_pg
+        zetas = np.arange(1, 1 + n_pg)
+        if path == 'beta':
+            # the fractions scale together, d(betas)/d(beta) = betas / beta
+            self.d_beta[k] = 1.0
+            self.d_pke[k, 0, 0] = -1.0 / ne._Lambda
+            self.d_pke[k, zetas, 0] = ne._betas / ne._beta / ne._Lambda
+            return
+        elif path == 'Lambda':
+            self.d_Lambda[k] = 1.0
+            self.d_pke[k, 0, 0] = ne._beta / ne._Lambda**2
+            self.d_pke[k, zetas, 0] = -ne._betas / ne._Lambda**2
+            return
+        obj, key = sweep._split(self.si, path)
+        if isinstance(obj, THComponent) and key in self.component_params:
+            i = net.names[obj.name]
+            if key == 'alpha_temp':
+                self.d_alphas[k, i] = 1.0
+            elif obj.heatgen:
+                self.d_gen_power[k, i] = (1 - net.kappa) / obj.vol.magnitude
+            return
+        elif isinstance(obj, ConvectiveModel) and key == 'h0':
+            # h is h0 itself only for the constant model
+            d_cond = net.conv_derivative(obj)
+            self.d_cond[k] = d_cond if obj.model == 'constant' else \
+                d_cond * 0.0
+            return
+        elif isinstance(obj, dict) and key == 'm_flow':
+            for i, comp in enumerate(net.components):
+                if any(d is obj for d in comp.adv.values()):
+                    vol = comp.vol.magnitude
+                    cp = obj['cp'].magnitude
+                    self.d_adv_diag[k, i] += -2.0 * cp / vol
+                    self.d_adv_src[k, i] += \
+                        2.0 * cp * obj['t_in'].magnitude / vol
+                    return
+        msg = 'The sensitivity to ' + path + ' is not supported. Use beta, '
+        msg += 'Lambda, the alpha_temp or power_tot of a component, the '
+        msg += 'm_flow of an advection or the h0 of a convective model.'
+        raise ValueError(msg)
+
+    def reactivity(self, t, y, feedback, temps_fb):
+        """Returns the reactivity, with Neutronics.reactivity_at
+
+        :param t: the time [s]
+        :type t: float
+        :param y: the solution vector
+        :type y: np.ndarray
+        :param feedback: whether temperature feedback is active
+        :type feedback: bool
+        :param temps_fb: the feedback reference temperatures
+        :type temps_fb: np.ndarray
+        """
+        return self.si.ne.reactivity_at(t, self.si.components, y[self.n_n:],
+                                        feedback, self.alphas, temps_fb)
+
+    def rhs(self, y, rho):
+        """Returns the derivative of the solution vector at a given
+        reactivity, like driver.f_coupled
+
+        :param y: the solution vector
+        :type y: np.ndarray
+        :param rho: the reactivity
+        :type rho: float
+        """
+        ne = self.si.ne
+        f = np.empty(self.n)
+        ne.dydt(y[:self.n_n], rho, out=f[:self.n_n])
+        self.net.dtempdt(y[self.n_n:], ne.power(y, rho),
+                         y[1 + self.si.n_pg:self.n_n], out=f[self.n_n:])
+        return f
+
+    def d_kinetics(self, y, rho, d_pke, d_rho, d_beta, d_Lambda):
+        """Returns the derivative of the point kinetics block of
+        driver.f_coupled, and of the power, given the derivatives of the
+        point kinetics matrix at zero reactivity, of the reactivity, of beta
+        and of Lambda. With the prompt jump approximation, the power is
+        c . zetas with c = Lambda * lambdas / (beta - rho), and its derivative
+        is the product rule over Neutronics.pke_matrix.
+
+        :param y: the solution vector
+        :type y: np.ndarray
+        :param rho: the reactivity
+        :type rho: float
+        :param d_pke: the derivative of the point kinetics matrix at zero
+          reactivity
+        :type d_pke: np.ndarray
+        :param d_rho: the derivative of the reactivity
+        :type d_rho: float
+        :param d_beta: the derivative of beta
+        :type d_beta: float
+        :param d_Lambda: the derivative of Lambda
+        :type d_Lambda: float
+        :rtype: (np.ndarray, float)
+        """
+        ne = self.si.ne
+        y_n = y[:self.n_n]
+        Lambda = ne._Lambda
+        if not ne.prompt_jump:
+            ret = d_pke.dot(y_n)
+            ret[0] += (d_rho / Lambda - rho * d_Lambda / Lambda**2) * y_n[0]
+            return ret, 0.0
+        zetas = slice(1, 1 + self.si.n_pg)
+        a = ne._pke
+        c = ne.prompt_coefficients(rho)
+        d_c = c * (d_Lambda / Lambda + (d_rho - d_beta) / (ne._beta - rho))
+        power = c.dot(y_n[zetas])
+        d_power = d_c.dot(y_n[zetas])
+        ret = np.empty(self.n_n)
+        # every row but the first, with P = c . zetas in place of y[0]
+        f = a[1:, 1:].dot(y_n[1:]) + a[1:, 0] * power
+        ret[1:] = d_pke[1:, 1:].dot(y_n[1:]) + d_pke[1:, 0] * power + \
+            a[1:, 0] * d_power
+        # the power follows the precursors, dP/dt = c . dzetas/dt
+        ret[0] = d_c.dot(f[:self.si.n_pg]) + c.dot(ret[zetas])
+        return ret, d_power
+
+    def d_heat(self, k, y, power):
+        """Returns the derivative of the heat flowing into each component
+        with respect to parameter k, at fixed temperatures, power and decay
+        heat, like THNetwork.heat
+
+        :param k: the index of the parameter
+        :type k: int
+        :param y: the solution vector
+        :type y: np.ndarray
+        :param power: the normalized power
+        :type power: float
+        :rtype: np.ndarray
+        """
+        temps = y[self.n_n:]
+        ret = self.d_gen_power[k] * power
+        ret += np.where(temps == 0.0, 0.0,
+                        self.d_adv_diag[k] * temps + self.d_adv_src[k])
+        if self.d_cond[k] is not None:
+            ret += self.d_cond[k].dot(temps)
+        return ret
+
+    def dfdrho(self, y, rho):
+        """Returns the derivative of driver.f_coupled with respect to the
+        reactivity.
+
+        :param y: the solution vector
+        :type y: np.ndarray
+        :param rho: the reactivity
+        :type rho: float
+        """
+        ret = np.empty(self.n)
+        ret[:self.n_n], d_power = self.d_kinetics(
+            y, rho, np.zeros((self.n_n, self.n_n)), 1.0, 0.0, 0.0)
+        ret[self.n_n:] = self.net.gen_power * d_power / \
+            self.net.capacity(y[self.n_n:])
+        return ret
+
+    def dfdp(self, k, y, rho, dfdrho, feedback, temps_fb):
+        """Returns the partial derivative of driver.f_coupled with respect to
+        parameter k. A parameter of the point kinetics changes the point
+        kinetics matrix and, with the prompt jump approximation, the power.
+        Any other changes the heat balance, or the reactivity through the
+        temperature coefficients.
+
+        :param k: the index of the parameter
+        :type k: int
+        :param y: the solution vector
+        :type y: np.ndarray
+        :param rho: the reactivity
+        :type rho: float
+        :param dfdrho: the derivative of f with respect to the reactivity
+        :type dfdrho: np.ndarray
+        :param feedback: whether temperature feedback is active
+        :type feedback: bool
+        :param temps_fb: the feedback reference temperatures
+        :type temps_fb: np.ndarray
+        """
+        n_n = self.n_n
+        net = self.net
+        ret = np.empty(self.n)
+        ret[:n_n], d_power = self.d_kinetics(
+            y, rho, self.d_pke[k], 0.0, self.d_beta[k], self.d_Lambda[k])
+        d_heat = self.d_heat(k, y, self.si.ne.power(y, rho))
+        ret[n_n:] = (d_heat + net.gen_power * d_power) / \
+            net.capacity(y[n_n:])
+        if feedback:
+            ret += dfdrho * self.d_alphas[k].dot(y[n_n:] - temps_fb)
+        return ret
+
+    def dsdt(self, t, s, y, jac, feedback, temps_fb, s_fb):
+        """Returns the derivative of the sensitivities
+
+        :param t: the time [s]
+        :type t: float
+        :param s: the sensitivity to each parameter, flattened
+        :type s: np.ndarray
+        :param y: the solution vector at t
+        :type y: np.ndarray
+        :param jac: the Jacobian of the simulation
+        :type jac: jacobian.Jacobian
+        :param feedback: whether temperature feedback is active
+        :type feedback: bool
+        :param temps_fb: the feedback reference temperatures
+        :type temps_fb: np.ndarray
+        :param s_fb: the sensitivities of the feedback reference
+          temperatures, indexed by parameter
+        :type s_fb: np.ndarray
+        """
+        s = s.reshape(len(self.params), self.n)
+        rho = self.reactivity(t, y, feedback, temps_fb)
+        ds = jac(t, y, feedback).dot(s.T).T
+        dfdrho = self.dfdrho(y, rho)
+        for k in range(len(self.params)):
+            ds[k] += self.dfdp(k, y, rho, dfdrho, feedback, temps_fb)
+        if feedback:
+            # the reference temperatures enter only through the reactivity
+            ds -= np.outer(s_fb.dot(self.alphas), dfdrho)
+        return ds.ravel()
+
+    def initial(self):
+        """Returns the sensitivities of the initial solution vector, like
+        driver.y0, indexed by parameter. The precursors start in equilibrium
+        at unit power. From a steady state, the temperatures follow the
+        derivative of the steady state heat balance.
+
+        :rtype: np.ndarray
+        """
+        si = self.si
+        ne = si.ne
+        n_pg = si.n_pg
+        s0 = np.zeros((len(self.params), self.n))
+        y_0 = driver.y0(si)
+        zetas = y_0[1:1 + n_pg]
+        for k in range(len(self.params)):
+            s0[k, 1:1 + n_pg] = zetas * (self.d_beta[k] / ne._beta -
+                                         self.d_Lambda[k] / ne._Lambda)
+            if si.steady_state:
+                s0[k, self.n_n:] = self.net.steady_state_derivative(
+                    self.d_heat(k, y_0, y_0[0]))
+        return s0
+
+    def power(self, t, y, s, feedback, temps_fb, s_fb):
+        """Returns the sensitivity of the recorded power to each parameter
+        under the prompt jump approximation, where the power is c . zetas,
+        a function of the precursors and the reactivity rather than part of
+        the state.
+
+        :param t: the time [s]
+        :type t: float
+        :param y: the solution vector
+        :type y: np.ndarray
+        :param s: the sensitivities, indexed by parameter
+        :type s: np.ndarray
+        :param feedback: whether temperature feedback is active
+        :type feedback: bool
+        :param temps_fb: the feedback reference temperatures
+        :type temps_fb: np.ndarray
+        :param s_fb: the sensitivities of the feedback reference
+          temperatures, indexed by parameter
+        :type s_fb: np.ndarray
+        """
+        ne = self.si.ne
+        n_n = self.n_n
+        zetas = slice(1, 1 + self.si.n_pg)
+        rho = self.reactivity(t, y, feedback, temps_fb)
+        c = ne.prompt_coefficients(rho)
+        d_rho = np.zeros(len(self.params))
+        if feedback:
+            d_rho = (s[:, n_n:] - s_fb).dot(self.alphas) + \
+                self.d_alphas.dot(y[n_n:] - temps_fb)
+        d_c = c * (self.d_Lambda[:, np.newaxis] / ne._Lambda +
+                   (d_rho - self.d_beta)[:, np.newaxis] / (ne._beta - rho))
+        return d_c.dot(y[zetas]) + s[:, zetas].dot(c)
+
+    def dzdt(self, t, z, jac, feedback, temps_fb, s_fb):
+        """Returns the derivative of the state and its sensitivities
+
+        :param t: the time [s]
+        :type t: float
+        :param z: the solution vector followed by the sensitivity to each
+          parameter
+        :type z: np.ndarray
+        :param jac: the Jacobian of the simulation
+        :type jac: jacobian.Jacobian
+        :param feedback: whether temperature feedback is active
+        :type feedback: bool
+        :param temps_fb: the feedback reference temperatures
+        :type temps_fb: np.ndarray
+        :param s_fb: the sensitivities of the feedback reference
+          temperatures, indexed by parameter
+        :type s_fb: np.ndarray
+        """
+        y = z[:self.n]
+        rho = self.reactivity(t, y, feedback, temps_fb)
+        return np.concatenate([
+            self.rhs(y, rho),
+            self.dsdt(t, z[self.n:], y, jac, feedback, temps_fb, s_fb)])
+
+    def solve(self):
+        """Integrates the simulation and the sensitivities together with
+        BDF, sampling them on the timer's grid like driver.solve_coupled.
+        The solution is recorded in the simulation as usual. Events are not
+        checked. The error of the sensitivities is controlled with the
+        relative tolerance of the simulation and the absolute tolerance atol.
+
+        :return: the sensitivities, indexed by timestep, parameter and entry
+        :rtype: np.ndarray
+        """
+        si = self.si
+        timer = si.timer
+        n = self.n
+        n_p = len(self.params)
+        si.th.compile()
+        jac = jacobian.Jacobian(si)
+        self.s = np.zeros((timer.timesteps(), n_p, n))
+        self.s[0] = self.initial()
+        y_cur = si.y[0]
+        atol = np.concatenate([np.full(n, si.atol),
+                               np.repeat(self.atol, n)])
+        t_cur = timer.t0.magnitude
+        temps_fb = None
+        s_fb = None
+        for t_bound, feedback in driver.feedback_segments(si):
+            if feedback:
+                t_fb = timer.t_idx_feedback
+                temps_fb = np.array([comp.T.magnitude[t_fb]
+                                     for comp in si.components])
+                s_fb = self.s[t_fb][:, self.n_n:].copy()
+            z0 = np.concatenate([y_cur, self.s[timer.current_timestep()]
+                                 .ravel()])
+            integrator = BDF(
+                lambda t, z: self.dzdt(t, z, jac, feedback, temps_fb, s_fb),
+                t_cur, z0, t_bound, rtol=si.rtol, atol=atol,
+                jac=lambda t, z: sparse.block_diag(
+                    [jac(t, z[:n], feedback)] * (1 + n_p), format='csc'))
+            while timer.current_timestep() < timer.idx(t_bound):
+                timer.advance_one_timestep()
+                si.db.record_all(timer.current_timestep() - 1)
+                t_next = timer.seconds(timer.ts)
+                while integrator.t < t_next and \
+                        integrator.status == 'running':
+                    integrator.step()
+                if integrator.status == 'failed':
+                    raise RuntimeError(integrator.message)
+                if integrator.t == t_next:
+                    z = integrator.y
+                else:
+                    z = integrator.dense_output()(t_next)
+                ts = timer.current_timestep()
+                driver.update_coupled(t_next, z[:n], si, feedback)
+                self.s[ts] = z[n:].reshape(n_p, n)
+                if si.ne.prompt_jump:
+                    self.s[ts, :, 0] = self.power(t_next, z[:n], self.s[ts],
+                                                  feedback, temps_fb, s_fb)
+                y_cur = si.y[ts]
+                t_cur = t_next
+        si.db.flush(timer.current_timestep())
+        return self.s
+
+    def peak(self, column):
+        """Returns the largest value of an entry of the solution vector over
+        the simulation, and its sensitivity to each parameter.
+
+        :param column: the entry of the solution vector
+        :type column: int
+        :rtype: (float, np.ndarray)
+        """
+        ts = int(np.argmax(self.si.y[:len(self.s), column]))
+        return self.si.y[ts, column], self.s[ts, :, column]
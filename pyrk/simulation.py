@@ -0,0 +1,172 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Simulations built and run from python, with results kept in memory.
+
+A Simulation takes the same objects as an input file::
+
+    sim = Simulation(timer=ti, components=[fuel, cool], rho_ext=rho_ext,
+                     n_decay=0, feedback=True, solver='bdf')
+    y = sim.run()
+    power = sim.power()
+
+Unlike driver.main, nothing is imported from sys.path and, unless asked for,
+no database is written, the git revision is not looked up, nothing is
+plotted and nothing is logged. A database, plots and the log of the arrays
+are sinks that are turned on with the db, plotdir and logfile parameters.
+run may be called again, for example after changing a parameter of a
+component, and starts the transient over.
+"""
+from pyrk import driver
+from pyrk.db import database
+from pyrk.inp import sim_info
+from pyrk.utilities import logger
+from pyrk.utilities import plotter
+
+
+class Simulation(object):
+    """This class runs a reactor kinetics simulation in memory.
+    """
+
+    def __init__(self, timer, components, nsteps=1000, db=None,
+                 plotdir=None, logfile=None, **params):
+        """Describes a simulation
+
+        :param timer: the Timer object for the simulation
+        :type timer: Timer
+        :param components: the components making up the reactor
+        :type components: list of THComponent objects
+        :param nsteps: the largest number of internal steps of each dopri5
+          integration of the split solvers
+        :type nsteps: int
+        :param db: the database the simulation is recorded in, or None to
+          record nothing
+        :type db: Database or None
+        :param plotdir: the directory the plots are written to, or None to
+          plot nothing
+        :type plotdir: string or None
+        :param logfile: the file the results are logged to, or None to log
+          nothing
+        :type logfile: string or None
+        :param params: the other parameters of SimInfo, such as rho_ext,
+          n_precursors, n_decay, feedback, solver, rtol, atol or events
+        :type params: dict
+        """
+        self.timer = timer
+        self.components = list(components)
+        self.nsteps = nsteps
+        self.db = db
+        self.plotdir = plotdir
+        self.logfile = logfile
+        self.params = params
+        self.si = None
+        """si (SimInfo): the simulation info object of the last run"""
+        self.y = None
+        """y (ndarray): the solution of the last run, up to its last
+        timestep"""
+
+    @classmethod
+    def from_infile(cls, infile, **kwargs):
+        """Returns the simulation described by an input file module that
+        was already imported, or by any object with its attributes
+
+        :param infile: the imported infile module
+        :type infile: imported module
+        :param kwargs: the sinks, db, plotdir and logfile
+        :type kwargs: dict
+        """
+        params = dict(iso=infile.fission_iso, e=infile.spectrum,
+                      n_precursors=infile.n_pg, n_decay=infile.n_dg,
+                      n_fic=getattr(infile, 'n_ref', 0),
+                      kappa=infile.kappa, feedback=infile.feedback,
+                      rho_ext=infile.rho_ext)
+        for param in ['solver', 'rtol', 'atol', 'jacobian', 'prompt_jump',
+                      'steady_state', 'events', 'checkpoint', 'cache',
+                      'history']:
+            if hasattr(infile, param):
+                params[param] = getattr(infile, param)
+        params.update(kwargs)
+        return cls(infile.ti, infile.components,
+                   nsteps=getattr(infile, 'nsteps', 1000), **params)
+
+    def reset(self):
+        """Returns the timer, the components and the events to the start of
+        the transient, so that the simulation can be run again
+        """
+        self.timer.ts = 0
+        for comp in self.components:
+            # the next run binds the temperatures to a history of its own,
+            # which leaves the solution of this one as it is
+            comp.T = None
+            comp.prev_t_idx = 0
+        for event in self.params.get('events') or []:
+            event.t = None
+            event.t_idx = None
+
+    def start(self):
+        """Resets the simulation and creates the simulation info object of
+        a new run"""
+        self.reset()
+        db = self.db if self.db is not None else database.NullDatabase()
+        plotdir = self.plotdir if self.plotdir is not None else 'images'
+        self.si = sim_info.SimInfo(timer=self.timer,
+                                   components=self.components,
+                                   plotdir=plotdir, db=db, **self.params)
+        return self.si
+
+    def run(self):
+        """Solves the simulation and returns the solution, indexed by
+        timestep and entry, up to the last timestep solved. Without the
+        history, only the last timestep is returned.
+
+        :rtype: np.ndarray
+        """
+        self.start()
+        self.y = driver.solve(si=self.si, y=self.si.y, infile=self)
+        if self.logfile is not None:
+            logger.set_up_pyrklog(self.logfile)
+            driver.log_results(self.si)
+        if self.plotdir is not None:
+            plotter.plot(self.y, self.si)
+        return self.y
+
+    def stream(self):
+        """Solves the simulation and yields the time, power, precursor
+        concentrations, decay heats, temperatures and reactivity of each
+        timestep as it is solved, like driver.stream. Pass history=False to
+        keep only the last window timesteps in memory, two by default.
+        """
+        self.start()
+        self.y = None
+        for state in driver.stream(self.si, self):
+            yield state
+
+    def t(self):
+        """Returns the times of the solved timesteps, in seconds"""
+        return self.timer.series.magnitude[:len(self.y)]
+
+    def power(self):
+        """Returns the normalized power at each solved timestep"""
+        return self.y[:, 0]
+
+    def zetas(self):
+        """Returns the precursor concentrations at each solved timestep"""
+        return self.y[:, 1:1 + self.si.n_pg]
+
+    def omegas(self):
+        """Returns the decay heats at each solved timestep"""
+        n_n = 1 + self.si.n_pg + self.si.n_dg
+        return self.y[:, 1 + self.si.n_pg:n_n]
+
+    def temps(self):
+        """Returns the temperature [K] of each component at each solved
+        timestep, keyed by component name
+
+        :rtype: dict
+        """
+        n_n = 1 + self.si.n_pg + self.si.n_dg
+        return dict((comp.name, self.y[:, n_n + idx])
+                    for idx, comp in enumerate(self.components))
+
+    def rho(self):
+        """Returns the total reactivity [dk] at each solved timestep"""
+        return self.si.ne._rho[:len(self.y)]
@@ -0,0 +1,519 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Parameter sweeps of one input file over a pool of worker processes.
+
+A sample is a dictionary of parameter values keyed by their path in the input
+module. The first part of a path names a component of the input file, or else
+a module level variable, and the following parts name attributes or
+dictionary keys below it, for example::
+
+    {'fuel.alpha_temp': -3.0 * units.pcm / units.kelvin,
+     'cool.adv.cool.m_flow': 900.0}
+
+A plain number takes the units of the value it replaces. Every sample is run
+in a fresh copy of the input module, so that values computed at import time
+are drawn again. The workers write their solutions into one shared memory
+array indexed by sample id, and the sweep writes that array to a single HDF5
+file.
+"""
+import argparse
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import importlib.util
+import numpy as np
+import tables as tb
+
+from pyrk import driver
+from pyrk.db import database
+from pyrk.inp import validation
+from pyrk.reactivity_insertion import ReactivityInsertion
+from pyrk.utilities.ur import units
+
+
+distributions = ['uniform', 'gauss']
+"""distributions (list): the supported distributions of sampled parameters"""
+
+
+def load_fresh(infile_path):
+    """Executes the input file as a new module object, even if it was
+    imported before, and returns it.
+
+    :param infile_path: path to the infile
+    :type infile_path: string
+    """
+    name = driver.name_from_path(infile_path)
+    path = os.path.splitext(infile_path)[0] + '.py'
+    spec = importlib.util.spec_from_file_location(name, path)
+    infile = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(infile)
+    return infile
+
+
+def _split(infile, path):
+    """Returns the object holding the last part of a parameter path, and that
+    part.
+
+    :param infile: the imported infile module
+    :type infile: imported module
+    :param path: the parameter path, parts separated by dots
+    :type path: str
+    """
+    parts = path.split('.')
+    comps = dict((comp.name, comp) for comp in infile.components)
+    if parts[0] in comps and len(parts) > 1:
+        obj = comps[parts[0]]
+    else:
+        obj = infile
+        parts.insert(0, None)
+    for part in parts[1:-1]:
+        obj = obj[part] if isinstance(obj, dict) else getattr(obj, part)
+    return obj, parts[-1]
+
+
+def get_param(infile, path):
+    """Returns the value of a parameter of the input file
+
+    :param infile: the imported infile module
+    :type infile: imported module
+    :param path: the parameter path, parts separated by dots
+    :type path: str
+    """
+    obj, key = _split(infile, path)
+    return obj[key] if isinstance(obj, dict) else getattr(obj, key)
+
+
+def set_param(infile, path, value):
+    """Replaces the value of a parameter of the input file. A plain number
+    replacing a Quantity takes its units. A reactivity insertion, such as
+    rho_ext, recomputes its values when one of its parameters changes.
+
+    :param infile: the imported infile module
+    :type infile: imported module
+    :param path: the parameter path, parts separated by dots
+    :type path: str
+    :param value: the new value
+    :type value: float or Quantity
+    """
+    obj, key = _split(infile, path)
+    old = obj[key] if isinstance(obj, dict) else getattr(obj, key)
+    if isinstance(old, units.Quantity) and \
+            not isinstance(value, units.Quantity):
+        value = units.Quantity(value, old.units)
+    if isinstance(obj, dict):
+        obj[key] = value
+    else:
+        setattr(obj, key, value)
+    if isinstance(obj, ReactivityInsertion):
+        obj.vals = [obj.f(t_idx) for t_idx in range(obj.timer.timesteps())]
+
+
+def grid(params):
+    """Returns the samples of the cartesian product of the parameter values
+
+    :param params: the values of each parameter, keyed by path
+    :type params: dict of lists
+    :rtype: list of dicts
+    """
+    paths = sorted(params)
+    return [dict(zip(paths, values))
+            for values in itertools.product(*[params[p] for p in paths])]
+
+
+def n_entries(infile):
+    """Returns the length of the solution vector of an input file
+
+    :param infile: the imported infile module
+    :type infile: imported module
+    """
+    n_ref = getattr(infile, 'n_ref', 0)
+    return 1 + infile.n_pg + n_ref + infile.n_dg + len(infile.components)
+
+
+def solve_sample(infile_path, sample):
+    """Runs one sample and returns its solution. Nothing is recorded, since
+    the solution is returned.
+
+    :param infile_path: path to the infile
+    :type infile_path: string
+    :param sample: the parameter values of the sample, keyed by path
+    :type sample: dict
+    :return: the solution, up to the last timestep solved
+    :rtype: np.ndarray
+    """
+    infile = load_fresh(infile_path)
+    for path, value in sample.items():
+        set_param(infile, path, value)
+    si = driver.sim_info_from_infile(infile, database.NullDatabase(),
+                                     infile_path=infile_path)
+    return driver.solve(si=si, y=si.y, infile=infile)
+
+
+def mark_started(flags_name, idx):
+    """Sets entry idx of the shared flags of the samples that started
+
+    :param flags_name: the name of the shared memory block of the flags, or
+      None
+    :type flags_name: str
+    :param idx: the sample id
+    :type idx: int
+    """
+    if flags_name is None:
+        return
+    flags = shared_memory.SharedMemory(name=flags_name)
+    try:
+        flags.buf[idx] = 1
+    finally:
+        flags.close()
+
+
+def run_sample(infile_path, sample, shm_name, shape, idx, flags_name=None):
+    """Runs one sample in a worker and writes its solution into row idx of
+    the shared result array. Before the run, entry idx of the shared flags is
+    set, to tell that the sample started.
+
+    :param infile_path: path to the infile
+    :type infile_path: string
+    :param sample: the parameter values of the sample, keyed by path
+    :type sample: dict
+    :param shm_name: the name of the shared memory block of the results
+    :type shm_name: str
+    :param shape: the shape of the result array
+    :type shape: tuple
+    :param idx: the sample id
+    :type idx: int
+    :param flags_name: the name of the shared memory block of the flags of
+      the samples that started, or None
+    :type flags_name: str
+    :return: the number of timesteps solved
+    :rtype: int
+    """
+    mark_started(flags_name, idx)
+    sol = solve_sample(infile_path, sample)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        y = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        y[idx, :len(sol)] = sol
+    finally:
+        shm.close()
+    return len(sol)
+
+
+class Sweep(object):
+    """This class runs the samples of a parameter sweep in parallel.
+    """
+
+    def __init__(self, infile_path, samples, max_workers=None, retries=1):
+        """Prepares a sweep of an input file
+
+        :param infile_path: path to the infile
+        :type infile_path: string
+        :param samples: the parameter values of each sample, keyed by path
+        :type samples: list of dicts
+        :param max_workers: the number of worker processes, or None for the
+          number of processors
+        :type max_workers: int
+        :param retries: how many times a failed sample is run again
+        :type retries: int
+        """
+        self.infile_path = infile_path
+        self.samples = list(samples)
+        self.max_workers = max_workers
+        self.retries = retries
+        infile = load_fresh(infile_path)
+        for sample in self.samples:
+            for path in sample:
+                get_param(infile, path)
+        self.shape = (len(self.samples), infile.ti.timesteps(),
+                      n_entries(infile))
+        """shape (tuple): samples, timesteps and entries of the results"""
+        self.y = None
+        """y (ndarray): the solution of each sample, NaN past the end of a
+        run and for failed samples"""
+        self.n_steps = np.zeros(len(self.samples), dtype=int)
+        """n_steps (ndarray): the number of timesteps solved in each sample,
+        zero for failed samples"""
+        self.errors = {}
+        """errors (dict): the error message of each failed sample"""
+
+    def run(self):
+        """Runs every sample and returns the solutions. Each sample is its own
+        task, so that workers that finish short runs take the next sample.
+        A sample that raises, or whose worker dies, is run again up to
+        retries times, and the others are kept. Only the samples that had
+        started when a worker died count the attempt.
+
+        :return: the solutions, indexed by sample, timestep and entry
+        :rtype: np.ndarray
+        """
+        nbytes = max(int(np.prod(self.shape)), 1) * 8
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        flags = shared_memory.SharedMemory(create=True,
+                                           size=max(len(self.samples), 1))
+        try:
+            y = np.ndarray(self.shape, dtype=float, buffer=shm.buf)
+            y[:] = np.nan
+            self._run_all(shm.name, flags)
+            self.y = y.copy()
+            del y
+        finally:
+            shm.close()
+            shm.unlink()
+            flags.close()
+            flags.unlink()
+        return self.y
+
+    def _run_all(self, shm_name, flags):
+        """Runs the samples on a process pool, which is replaced when one of
+        its workers dies.
+
+        :param shm_name: the name of the shared memory block of the results
+        :type shm_name: str
+        :param flags: the shared memory block of the flags of the samples
+          that started
+        :type flags: SharedMemory
+        """
+        todo = [(idx, 0) for idx in range(len(self.samples))]
+        self.errors = {}
+        while todo:
+            executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            try:
+                todo = self._run_pool(executor, todo, shm_name, flags)
+            finally:
+                executor.shutdown(wait=True)
+
+    def _run_pool(self, executor, todo, shm_name, flags):
+        """Runs samples on one process pool until they are done or the pool
+        breaks. When a worker dies, every sample that had started on the pool
+        counts the attempt as failed, since the one that killed the worker
+        is unknown. The samples still queued run again on the next pool
+        without counting an attempt, unless none had started, so that a
+        sample that kills its worker before it starts cannot loop forever.
+
+        :param executor: the process pool
+        :type executor: ProcessPoolExecutor
+        :param todo: the (sample id, attempt) pairs to run
+        :type todo: list of tuples
+        :param shm_name: the name of the shared memory block of the results
+        :type shm_name: str
+        :param flags: the shared memory block of the flags of the samples
+          that started
+        :type flags: SharedMemory
+        :return: the (sample id, attempt) pairs left to run on a new pool
+        :rtype: list of tuples
+        """
+        pending = {}
+        left = []
+        queued = []
+        broken = False
+        charged = False
+        for idx, attempt in todo:
+            fut = self.submit(executor, idx, shm_name, flags)
+            pending[fut] = (idx, attempt)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                idx, attempt = pending.pop(fut)
+                try:
+                    self.n_steps[idx] = fut.result()
+                    continue
+                except BrokenProcessPool as err:
+                    error = err
+                    broken = True
+                    if not flags.buf[idx]:
+                        queued.append((idx, attempt, error))
+                        continue
+                    charged = True
+                except Exception as err:
+                    error = err
+                if self._out_of_retries(idx, attempt, error):
+                    continue
+                if not broken:
+                    # the pool may have broken before its futures tell
+                    try:
+                        fut = self.submit(executor, idx, shm_name, flags)
+                        pending[fut] = (idx, attempt + 1)
+                        continue
+                    except BrokenProcessPool:
+                        broken = True
+                left.append((idx, attempt + 1))
+        for idx, attempt, error in queued:
+            if not charged:
+                # nothing had started, so the queued samples count the attempt
+                if self._out_of_retries(idx, attempt, error):
+                    continue
+                attempt += 1
+            left.append((idx, attempt))
+        return left
+
+    def _out_of_retries(self, idx, attempt, error):
+        """Records the error of a sample that failed its last attempt
+
+        :param idx: the sample id
+        :type idx: int
+        :param attempt: the number of attempts before this one
+        :type attempt: int
+        :param error: the error of the attempt
+        :type error: Exception
+        :return: whether the sample failed for good
+        :rtype: bool
+        """
+        if attempt < self.retries:
+            return False
+        self.errors[idx] = repr(error)
+        self.n_steps[idx] = 0
+        return True
+
+    def submit(self, executor, idx, shm_name, flags):
+        """Submits one sample to the process pool, and clears its flag
+
+        :param executor: the process pool
+        :type executor: ProcessPoolExecutor
+        :param idx: the sample id
+        :type idx: int
+        :param shm_name: the name of the shared memory block of the results
+        :type shm_name: str
+        :param flags: the shared memory block of the flags of the samples
+          that started
+        :type flags: SharedMemory
+        :return: the future of the number of timesteps solved
+        :rtype: Future
+        """
+        flags.buf[idx] = 0
+        return executor.submit(run_sample, self.infile_path,
+                               self.samples[idx], shm_name, self.shape, idx,
+                               flags.name)
+
+    def write(self, filepath, groupname='sweep', mode='w'):
+        """Writes the sweep to one HDF5 file. The /sweep group holds the
+        solutions y, the number of timesteps n_steps of each sample and the
+        numeric parameter values params, whose paths are in its 'paths'
+        attribute, along with the error messages of the failed samples.
+
+        :param filepath: the location of the h5 file
+        :type filepath: str
+        :param groupname: the name of the group
+        :type groupname: str
+        :param mode: 'w' to write a new file, 'a' to add to an existing one
+        :type mode: str
+        """
+        paths = sorted(set(p for sample in self.samples for p in sample))
+        params = np.full((len(self.samples), len(paths)), np.nan)
+        for idx, sample in enumerate(self.samples):
+            for col, path in enumerate(paths):
+                value = sample.get(path, np.nan)
+                if isinstance(value, units.Quantity):
+                    value = value.magnitude
+                params[idx, col] = value
+        with tb.open_file(filepath, mode=mode, title='PyRK Sweep') as h5file:
+            group = h5file.create_group('/', groupname, 'Parameter Sweep')
+            h5file.create_array(group, 'y', self.y, 'Solutions')
+            h5file.create_array(group, 'n_steps', self.n_steps,
+                                'Timesteps Solved')
+            arr = h5file.create_array(group, 'params', params,
+                                      'Parameter Values')
+            arr.attrs.paths = paths
+            group._v_attrs.errors = dict((int(k), v)
+                                         for k, v in self.errors.items())
+
+
+def parse_values(spec):
+    """Returns the path and the values of a --grid option, 'path=v1,v2,...'
+
+    :param spec: the option value
+    :type spec: str
+    """
+    path, values = spec.split('=', 1)
+    return path, [float(v) for v in values.split(',')]
+
+
+def parse_distribution(spec):
+    """Returns the path and the distribution of a sampled parameter option,
+    'path=gauss:mean:std' or 'path=uniform:low:high', as (name, a, b)
+
+    :param spec: the option value
+    :type spec: str
+    """
+    path, dist = spec.split('=', 1)
+    name, a, b = dist.split(':')
+    validation.validate_supported("distribution", name, distributions)
+    return path, (name, float(a), float(b))
+
+
+def draw(dist, rng, n):
+    """Returns n random values of a distribution
+
+    :param dist: the distribution, ('gauss', mean, std) or
+      ('uniform', low, high)
+    :type dist: tuple
+    :param rng: the random number generator
+    :type rng: np.random.Generator
+    :param n: the number of values
+    :type n: int
+    """
+    name, a, b = dist
+    if name == 'gauss':
+        return rng.normal(a, b, n)
+    return rng.uniform(a, b, n)
+
+
+def samples_from_args(args):
+    """Returns the samples described by the sweep options
+
+    :param args: the parsed command line options
+    :type args: argparse.Namespace
+    """
+    samples = grid(dict(parse_values(spec) for spec in args.grid))
+    if args.sample:
+        rng = np.random.default_rng(args.seed)
+        dists = [parse_distribution(spec) for spec in args.sample]
+        draws = dict((path, draw(dist, rng, args.n_samples))
+                     for path, dist in dists)
+        samples = [dict(base, **dict((p, v[i]) for p, v in draws.items()))
+                   for base in samples for i in range(args.n_samples)]
+    return samples
+
+
+def add_arguments(ap):
+    """Adds the command line options of a sweep to a parser
+
+    :param ap: the parser
+    :type ap: argparse.ArgumentParser
+    """
+    ap.add_argument('--infile', help='the name of the input file',
+                    default='input')
+    ap.add_argument('--outfile', help='the name of the sweep database',
+                    default='sweep.h5')
+    ap.add_argument('--grid', action='append', default=[],
+                    help='a parameter and its values, path=v1,v2,...')
+    ap.add_argument('--sample', action='append', default=[],
+                    help='a sampled parameter, path=gauss:mean:std or '
+                    'path=uniform:low:high')
+    ap.add_argument('--n-samples', type=int, default=1,
+                    help='the number of random samples per grid point')
+    ap.add_argument('--seed', type=int, default=None,
+                    help='the seed of the random samples')
+    ap.add_argument('--workers', type=int, default=None,
+                    help='the number of worker processes')
+    ap.add_argument('--retries', type=int, default=1,
+                    help='how many times a failed sample is run again')
+    return ap
+
+
+def main(args):
+    sweep = Sweep(args.infile, samples_from_args(args),
+                  max_workers=args.workers, retries=args.retries)
+    sweep.run()
+    sweep.write(args.outfile)
+    for idx, msg in sorted(sweep.errors.items()):
+        print('sample ' + str(idx) + ' failed: ' + msg)
+    return sweep
+
+
+"""Run it as a script"""
+if __name__ == "__main__":
+    ap = add_arguments(argparse.ArgumentParser(description='PyRK sweep'))
+    main(ap.parse_args())
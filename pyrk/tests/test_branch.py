@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import tables as tb
+
+from pyrk import branch
+from pyrk import cli
+from pyrk import sweep
+from pyrk.utilities.ur import units
+
+
+samples = [{'rho_ext.rho_final': 0.002},
+           {'rho_ext.rho_final': -0.001, 'rho_ext.t_step': 0.4},
+           {'mod.adv.mod.t_in': 700.0}]
+
+
+def test_branches_match_direct_runs(infile, tmp_path):
+    outfile = str(tmp_path / 'pyrk.h5')
+    br = branch.Branches(infile, 0.3 * units.seconds, samples,
+                         filepath=outfile, max_workers=2)
+    y = br.run()
+    assert br.t_idx == 3
+    assert y.shape == (3, 8, 9)
+    assert br.errors == {}
+    assert list(br.n_steps) == [8, 8, 8]
+    # the branches share the state at the branch point
+    assert np.all(y[:, 0] == y[0, 0])
+    # insertions after the branch time give the runs they would alone
+    for idx, sample in enumerate(samples[:2]):
+        direct = sweep.solve_sample(infile, sample)
+        assert np.allclose(br.solution(idx), direct, rtol=1e-4, atol=1e-8)
+    assert not np.allclose(y[0], y[1])
+    # the inlet temperature changes at the branch time, not from the start
+    alone = sweep.solve_sample(infile, samples[2])
+    assert not np.allclose(br.solution(2)[:4], alone[:4])
+    assert y[2, -1, -1] < y[0, -1, -1]
+
+
+def test_branch_records_nothing(infile, tmp_path, monkeypatch):
+    outfile = str(tmp_path / 'pyrk.h5')
+    br = branch.Branches(infile, 0.3 * units.seconds, samples[:1],
+                         filepath=outfile, max_workers=1)
+    y = br.run()
+    # outside a git checkout, where a database could not get its metadata
+    rundir = tmp_path / 'branch'
+    rundir.mkdir()
+    monkeypatch.chdir(rundir)
+    sol = branch.solve_branch(infile, branch.snapshot_path(outfile),
+                              samples[0])
+    assert np.array_equal(sol, y[0])
+    assert not list(rundir.iterdir())
+
+
+def test_branches_are_written_under_the_parent(infile, tmp_path):
+    outfile = str(tmp_path / 'run.h5')
+    br = cli.main(['branch', '--infile', infile, '--outfile', outfile,
+                   '--t-branch', '0.3',
+                   '--grid', 'rho_ext.rho_final=0.001,0.002',
+                   '--workers', '2'])
+    with tb.open_file(outfile, mode='r') as h5file:
+        group = h5file.root.branches
+        history = group.history.read()
+        y = group.y.read()
+        assert group._v_attrs.t_idx == 3
+        parent = group._v_attrs.parent
+        paths = group.params.attrs.paths
+        # next to the tables of the parent run
+        assert '/th/th_timeseries' in h5file
+    assert parent == br.sim_id
+    assert history.shape == (4, 9)
+    assert y.shape == (2, 8, 9)
+    assert np.array_equal(history[-1], y[0, 0])
+    assert paths == ['rho_ext.rho_final']
+
+
+def test_branch_time_inside_the_run(infile):
+    with pytest.raises(ValueError):
+        branch.Branches(infile, 0.0 * units.seconds, samples)
+    with pytest.raises(ValueError):
+        branch.Branches(infile, 1.0 * units.seconds, samples)
@@ -0,0 +1,118 @@
+import argparse
+import os
+
+import numpy as np
+import pytest
+
+from pyrk import driver
+from pyrk.cache import Cache
+from pyrk.db import database
+from pyrk.events import Event
+from pyrk.inp.sim_info import SimInfo
+from pyrk.utilities.ur import units
+
+
+class SplitInput(object):
+    nsteps = 1000
+
+
+@pytest.fixture
+def sim(fuel_mod):
+    def make(tmp_path, name, solver='bdf', rho_final=100, alpha=-1,
+             cache=None):
+        events = [Event('trip', 'power', 1.05, action='scram',
+                        rho=-1000 * units.pcm)]
+        db = database.Database(filepath=str(tmp_path / (name + '.h5')))
+        if cache is None:
+            cache = Cache(str(tmp_path / 'cache'))
+        return SimInfo(n_decay=0, feedback=True, solver=solver,
+                       events=events, db=db, cache=cache,
+                       **fuel_mod(dt=0.05, t_step=0.3, alpha_fuel=alpha,
+                                  rho_final=rho_final))
+    return make
+
+
+def tables(si):
+    ret = [si.db.get_table(group, table).read() for group, table in
+           [('metadata', 'sim_timeseries'), ('metadata', 'events'),
+            ('th', 'th_timeseries'), ('neutronics', 'neutronics_params')]]
+    si.db.close_db()
+    return ret
+
+
+@pytest.fixture
+def keys(sim):
+    def key(tmp_path, **kwargs):
+        si = sim(tmp_path, 'key', **kwargs)
+        ret = si.cache.key(si, SplitInput())
+        si.db.close_db()
+        return ret
+    return key
+
+
+def test_key_depends_on_the_model_only(tmp_path, keys):
+    key = keys(tmp_path)
+    assert len(key) == 64
+    assert keys(tmp_path) == key
+    assert keys(tmp_path, rho_final=101) != key
+    assert keys(tmp_path, alpha=-2) != key
+    assert keys(tmp_path, solver='radau') != key
+
+
+@pytest.mark.parametrize("solver", ['split', 'bdf', 'multirate'])
+def test_hit_restores_the_solution_without_solving(solver, tmp_path,
+                                                   monkeypatch, sim):
+    first = sim(tmp_path, 'first', solver)
+    sol = driver.solve(first, first.y, SplitInput()).copy()
+    expected = tables(first)
+    assert first.events[0].fired
+    assert os.listdir(str(tmp_path / 'cache')) == [first.cache_key + '.h5']
+
+    def fail(*args):
+        raise AssertionError('solved again')
+    for name in ['solve_split', 'solve_coupled', 'solve_multirate']:
+        monkeypatch.setattr(driver, name, fail)
+    second = sim(tmp_path, 'second', solver)
+    hit = driver.solve(second, second.y, SplitInput())
+    assert np.array_equal(hit, sol)
+    assert second.events[0].fired
+    assert second.cache_key == first.cache_key
+    for comp, other in zip(second.components, first.components):
+        assert np.array_equal(comp.T.magnitude[:len(sol)],
+                              other.T.magnitude[:len(sol)])
+    rows = second.db.get_table('metadata', 'sim_info').read()
+    assert rows['cachekey'][-1] == first.cache_key.encode()
+    for exp, table in zip(expected, tables(second)):
+        assert np.array_equal(exp, table)
+
+
+def test_least_recently_used_results_are_removed(tmp_path, sim):
+    cache = Cache(str(tmp_path / 'cache'))
+    paths = []
+    for idx, rho_final in enumerate([100, 110, 120]):
+        si = sim(tmp_path, 'run' + str(idx), rho_final=rho_final,
+                 cache=cache)
+        driver.solve(si, si.y, SplitInput())
+        si.db.close_db()
+        paths.append(cache.path(si.cache_key))
+        os.utime(paths[-1], (idx, idx))
+    size = os.path.getsize(paths[0])
+    # a hit on the oldest makes it the most recently used
+    si = sim(tmp_path, 'again', rho_final=100, cache=cache)
+    driver.solve(si, si.y, SplitInput())
+    si.db.close_db()
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert [os.path.exists(path) for path in paths] == [True, False, True]
+
+
+def test_command_line_options(tmp_path, sim):
+    si = sim(tmp_path, 'options')
+    ap = driver.add_arguments(argparse.ArgumentParser())
+    driver.set_up_cache(si, ap.parse_args(['--cache', 'dir',
+                                           '--cache-size', '10']))
+    assert si.cache.directory == 'dir'
+    assert si.cache.max_bytes == 10 * 2**20
+    driver.set_up_cache(si, ap.parse_args(['--no-cache']))
+    assert si.cache is None
+    si.db.close_db()
@@ -0,0 +1,91 @@
+import argparse
+
+import numpy as np
+import pytest
+
+from pyrk import driver
+from pyrk.checkpoint import Checkpoint
+from pyrk.db import database
+from pyrk.events import Event
+from pyrk.inp.sim_info import SimInfo
+from pyrk.utilities.ur import units
+
+
+class SplitInput(object):
+    nsteps = 1000
+
+
+@pytest.fixture
+def sim(fuel_mod):
+    def make(solver, tmp_path, name, every):
+        events = [Event('trip', 'power', 1.05, action='scram',
+                        rho=-1000 * units.pcm),
+                  Event('slow', 'fuel', 900.25 * units.kelvin,
+                        action='decimate', stride=3)]
+        db = database.Database(filepath=str(tmp_path / (name + '.h5')))
+        checkpoint = Checkpoint(str(tmp_path / 'checkpoint.h5'), every=every)
+        return SimInfo(n_decay=0, feedback=True, solver=solver,
+                       events=events, db=db, checkpoint=checkpoint,
+                       **fuel_mod(dt=0.05, t_step=0.3))
+    return make
+
+
+def tables(si):
+    ret = [si.db.get_table(group, table).read() for group, table in
+           [('metadata', 'sim_timeseries'), ('metadata', 'events'),
+            ('th', 'th_timeseries'), ('neutronics', 'neutronics_params')]]
+    si.db.close_db()
+    return ret
+
+
+@pytest.mark.parametrize("solver", ['split', 'exponential', 'bdf', 'radau',
+                                    'lsoda', 'multirate'])
+def test_restart_continues_from_the_last_checkpoint(solver, tmp_path, sim):
+    full = sim(solver, tmp_path, 'full', every=12)
+    sol = driver.solve(full, full.y, SplitInput()).copy()
+    expected = tables(full)
+    # the multirate solver saves at the end of a window
+    ts = full.checkpoint.t_idx
+    assert 12 <= ts < full.events[1].t_idx
+    restarted = sim(solver, tmp_path, 'restarted', every=12)
+    resume = restarted.checkpoint.load(restarted)
+    assert restarted.timer.current_timestep() == ts
+    assert np.array_equal(restarted.y[:ts + 1], sol[:ts + 1])
+    assert restarted.events[0].fired and not restarted.events[1].fired
+    rest = driver.solve(restarted, restarted.y, SplitInput(), resume=resume)
+    assert restarted.db.stride == 3
+    if solver == 'lsoda':
+        # restarted at the checkpoint rather than resumed
+        assert np.allclose(rest, sol, rtol=1e-4)
+        restarted.db.close_db()
+        return
+    assert np.array_equal(rest, sol)
+    assert np.array_equal(restarted.ne._rho, full.ne._rho)
+    for exp, table in zip(expected, tables(restarted)):
+        assert np.array_equal(exp, table)
+
+
+def test_restart_needs_the_same_solver(tmp_path, sim):
+    full = sim('bdf', tmp_path, 'full', every=5)
+    driver.solve(full, full.y, SplitInput())
+    other = sim('radau', tmp_path, 'other', every=5)
+    with pytest.raises(ValueError):
+        other.checkpoint.load(other)
+    full.db.close_db()
+
+
+def test_command_line_options(tmp_path, sim):
+    si = sim('bdf', tmp_path, 'full', every=0)
+    si.checkpoint = None
+    ap = driver.add_arguments(argparse.ArgumentParser())
+    args = ap.parse_args(['--outfile', 'run.h5', '--checkpoint-every', '7'])
+    assert driver.set_up_checkpoint(si, args) is None
+    assert si.checkpoint.filepath == 'run_checkpoint.h5'
+    assert si.checkpoint.every == 7
+    args = ap.parse_args(['--restart', '--checkpoint',
+                          str(tmp_path / 'missing.h5')])
+    with pytest.raises(IOError):
+        driver.set_up_checkpoint(si, args)
+    # the interval of the input file is kept
+    assert si.checkpoint.every == 7
+    si.db.close_db()
@@ -1,4 +1,13 @@
+import numpy as np
+import pytest
+
 from pyrk import driver
+from pyrk import multirate
+from pyrk.checkpoint import Checkpoint
+from pyrk.db import database
+from pyrk.history import Chunks
+from pyrk.inp.sim_info import SimInfo
+from pyrk.utilities.ur import units
 
 
 def test_name_from_path():
@@ -14,3 +23,280 @@ def test_name_from_path_has_p():
     assert driver.name_from_path("testp.py") == "testp"
     assert driver.name_from_path("~/testp.py") == "testp"
     assert driver.name_from_path("~/testp") == "testp"
+
+
+@pytest.fixture
+def coupled_sim(fuel_mod):
+    def make(solver, feedback=True, cooled=False, n_decay=0, t_feedback=0.2,
+             **kwargs):
+        model = fuel_mod(t_feedback=t_feedback,
+                         m_flow=10.0 if cooled else None)
+        if 'db' not in kwargs:
+            kwargs['db'] = database.Database(mode='w')
+        return SimInfo(n_decay=n_decay, feedback=feedback, solver=solver,
+                       **model, **kwargs)
+    return make
+
+
+def test_f_coupled_matches_split_blocks_at_t0(coupled_sim):
+    si = coupled_sim('bdf')
+    y = driver.y0(si)
+    n_n = 1 + si.n_pg + si.n_dg
+    f = driver.f_coupled(0.0, y, si, False)
+    assert np.allclose(f[:n_n], driver.f_n(0.0, y[:n_n], si))
+    assert np.allclose(f[n_n:], driver.f_th(0.0, y[n_n:], si))
+    si.db.close_db()
+    si.db.delete_db()
+
+
+def test_coupled_solvers_agree(coupled_sim):
+    sols = {}
+    for solver in ['bdf', 'radau', 'lsoda']:
+        si = coupled_sim(solver)
+        sols[solver] = driver.solve(si, si.y, None).copy()
+        assert np.all(si.y[:, 0] > 0)
+        si.db.close_db()
+        si.db.delete_db()
+    assert np.allclose(sols['bdf'], sols['radau'], rtol=1e-4)
+    assert np.allclose(sols['bdf'], sols['lsoda'], rtol=1e-4)
+
+
+@pytest.mark.parametrize("solver", ['bdf', 'multirate', 'exponential'])
+def test_no_feedback_when_it_starts_at_tf(solver, coupled_sim):
+    sols = {}
+    rhos = {}
+    for name in ['split', solver]:
+        si = coupled_sim(name, t_feedback=1.0,
+                         db=database.NullDatabase())
+        sols[name] = driver.solve(si, si.y, SplitInput()).copy()
+        rhos[name] = np.array(si.ne._rho)
+    # only the step insertion, as without feedback
+    assert np.allclose(rhos[solver], rhos['split'], atol=1e-12)
+    assert np.allclose(rhos['split'][-1], 1e-3)
+    # the split solver is only first order accurate in the coupling
+    assert np.allclose(sols[solver][:, 0], sols['split'][:, 0], rtol=1e-2)
+    assert np.allclose(sols[solver][:, -2:], sols['split'][:, -2:],
+                       rtol=1e-4)
+
+
+class SplitInput(object):
+    nsteps = 1000
+
+
+def f_th_pint(t, y_th, si):
+    """The per-component reference for f_th, evaluated with Quantities"""
+    t_idx = si.timer.t_idx(t * units.seconds)
+    f = units.Quantity(np.zeros(shape=(si.n_components(),), dtype=float),
+                       'kelvin / second')
+    omegas = si.y[t_idx][1 + si.n_pg:1 + si.n_pg + si.n_dg]
+    for idx, comp in enumerate(si.components):
+        f[idx] = si.th.dtempdt(component=comp, power=si.y[t_idx][0],
+                               omegas=omegas, t_idx=t_idx)
+    return f
+
+
+def test_reactivity_matches_quantity_reference(coupled_sim):
+    si = coupled_sim('split')
+    for idx in range(1, 5):
+        si.timer.advance_one_timestep()
+        for comp in si.components:
+            comp.update_temp(idx, (comp.T0.magnitude + 3.0 * idx) *
+                             units.kelvin)
+    for idx in range(si.timer.t_idx_feedback + 1, 5):
+        exp = sum(comp.temp_reactivity(idx) for comp in si.components)
+        exp = (exp + si.rho_ext.reactivity(idx).to('delta_k')).magnitude
+        assert si.ne.reactivity(idx, si.components) == exp
+    si.db.close_db()
+    si.db.delete_db()
+
+
+def test_split_solve_matches_quantity_reference(monkeypatch, coupled_sim):
+    si = coupled_sim('split')
+    obs = driver.solve(si, si.y, SplitInput()).copy()
+    obs_rho = si.ne._rho.copy()
+    si.db.close_db()
+    si.db.delete_db()
+    monkeypatch.setattr(driver, 'f_th', f_th_pint)
+    ref = coupled_sim('split')
+    exp = driver.solve(ref, ref.y, SplitInput())
+    ref.db.close_db()
+    ref.db.delete_db()
+    assert np.allclose(obs, exp, rtol=1e-12, atol=0)
+    assert np.array_equal(obs_rho, ref.ne._rho)
+
+
+@pytest.mark.parametrize("feedback", [False, True])
+def test_multirate_agrees_with_bdf(feedback, coupled_sim):
+    sols = {}
+    for solver in ['bdf', 'multirate']:
+        si = coupled_sim(solver, feedback=feedback)
+        sols[solver] = driver.solve(si, si.y, None).copy()
+        si.db.close_db()
+        si.db.delete_db()
+    assert np.allclose(sols['multirate'], sols['bdf'], rtol=1e-4)
+
+
+def test_multirate_window_converges(coupled_sim):
+    si = coupled_sim('multirate')
+    si.th.compile()
+    y = driver.y0(si)
+    for idx in [1, 2]:
+        si.timer.advance_one_timestep()
+        driver.update_coupled(0.1 * idx, y, si, False)
+    t_out = np.array([0.3, 0.4, 0.5, 0.6])
+    ys, iterations = multirate.solve_window(si, 0.2, y, t_out, True)
+    assert ys.shape == (len(t_out), si.n_entries())
+    assert 1 < iterations <= 10
+    assert multirate.solve_window(si, 0.2, y, t_out, True, max_iter=1) is None
+    si.db.close_db()
+    si.db.delete_db()
+
+
+def test_exponential_is_exact_for_step_insertion(coupled_sim):
+    si = coupled_sim('exponential', feedback=False)
+    obs = driver.solve(si, si.y, SplitInput()).copy()
+    # the step insertion and the zero reactivity before it
+    assert len(si.ne._propagators) == 2
+    si.db.close_db()
+    si.db.delete_db()
+    ref = coupled_sim('split', feedback=False)
+    exp = driver.solve(ref, ref.y, SplitInput())
+    ref.db.close_db()
+    ref.db.delete_db()
+    assert np.allclose(obs, exp, rtol=1e-6)
+
+
+def test_prompt_jump_is_close_to_full_kinetics(coupled_sim):
+    sols = {}
+    for prompt_jump in [False, True]:
+        for solver in ['bdf', 'multirate']:
+            si = coupled_sim(solver)
+            si.ne.prompt_jump = prompt_jump
+            sols[(prompt_jump, solver)] = driver.solve(si, si.y, None).copy()
+            si.db.close_db()
+            si.db.delete_db()
+    assert np.allclose(sols[(True, 'bdf')], sols[(True, 'multirate')],
+                       rtol=1e-4)
+    assert np.allclose(sols[(True, 'bdf')], sols[(False, 'bdf')], rtol=1e-3)
+
+
+def test_steady_state_seeds_initial_conditions(coupled_sim):
+    si = coupled_sim('bdf', cooled=True, n_decay=11, steady_state=True)
+    y = driver.y0(si)
+    n_n = 1 + si.n_pg + si.n_dg
+    assert np.array_equal(si.y[0], y)
+    assert [comp.T[0].magnitude for comp in si.components] == list(y[n_n:])
+    # the coolant carries the fission and decay heat away
+    omegas = y[1 + si.n_pg:n_n]
+    assert np.all(omegas > 0)
+    assert np.isclose(2 * 10 * 1000 * (y[-1] - 800), 1e6 + np.sum(omegas))
+    f = driver.f_coupled(0.0, y, si, False)
+    assert np.allclose(f, 0, atol=1e-9)
+    si.db.close_db()
+    si.db.delete_db()
+
+
+@pytest.mark.parametrize("solver", ['split', 'exponential'])
+def test_steady_state_is_solved_once(solver, monkeypatch, coupled_sim):
+    calls = []
+    solve_steady_state = driver.steady_state
+    monkeypatch.setattr(driver, 'steady_state',
+                        lambda si: calls.append(si) or solve_steady_state(si))
+    si = coupled_sim(solver, cooled=True, n_decay=11, steady_state=True,
+                     db=database.NullDatabase())
+    driver.solve(si, si.y, SplitInput())
+    assert len(calls) == 1
+
+
+def test_steady_state_requires_heat_removal(coupled_sim):
+    si = coupled_sim('bdf', steady_state=True)
+    with pytest.raises(ValueError):
+        driver.y0(si)
+    si.db.close_db()
+    si.db.delete_db()
+
+
+@pytest.mark.parametrize("solver", ['split', 'exponential', 'bdf',
+                                    'multirate'])
+def test_stream_yields_each_timestep(solver, coupled_sim):
+    si = coupled_sim(solver, cooled=True, n_decay=11)
+    states = list(driver.stream(si, SplitInput()))
+    sol = si.y
+    si.db.close_db()
+    si.db.delete_db()
+    assert len(states) == si.timer.timesteps()
+    t, power, zetas, omegas, temps, rho = [np.array(col)
+                                           for col in zip(*states)]
+    assert np.allclose(t, np.linspace(0, 1, 11))
+    assert np.array_equal(power, sol[:, 0])
+    assert np.array_equal(zetas, sol[:, 1:7])
+    assert np.array_equal(omegas, sol[:, 7:18])
+    assert np.array_equal(temps, sol[:, 18:])
+    assert np.array_equal(rho, si.ne._rho)
+
+
+def test_stream_stops_early_and_keeps_no_history(coupled_sim):
+    si = coupled_sim('bdf', db=database.NullDatabase())
+    stream = driver.stream(si, SplitInput())
+    first = [next(stream) for _ in range(4)]
+    stream.close()
+    assert si.timer.current_timestep() == 3
+    assert first[3][0] == pytest.approx(0.3)
+    light = coupled_sim('bdf', db=database.NullDatabase(), history=False)
+    assert light.y.rows.shape == (2, 9)
+    states = list(driver.stream(light, SplitInput()))
+    full = coupled_sim('bdf', db=database.NullDatabase())
+    sol = driver.solve(full, full.y, SplitInput())
+    assert np.array_equal([state[1] for state in states], sol[:, 0])
+    assert np.array_equal([state[4] for state in states], sol[:, -2:])
+    with pytest.raises(IndexError):
+        light.y[:3]
+    light = coupled_sim('bdf', db=database.NullDatabase(), history=False)
+    assert np.array_equal(driver.solve(light, light.y, SplitInput()),
+                          sol[-1:])
+    with pytest.raises(ValueError):
+        coupled_sim('bdf', db=database.NullDatabase(), history=False,
+                    checkpoint=Checkpoint('unused.h5'))
+
+
+def test_temperatures_are_views_of_the_solution(coupled_sim):
+    si = coupled_sim('bdf', db=database.NullDatabase())
+    for comp in si.components:
+        assert np.shares_memory(comp.T.magnitude, si.y)
+    sol = driver.solve(si, si.y, SplitInput())
+    assert np.array_equal(si.components[0].T.magnitude, sol[:, -2])
+
+
+@pytest.mark.parametrize("solver", ['split', 'bdf', 'multirate'])
+def test_chunked_history_matches_the_full_one(solver, tmp_path, coupled_sim):
+    full = coupled_sim(solver, db=database.NullDatabase())
+    sol = driver.solve(full, full.y, SplitInput())
+    chunks = Chunks(chunk_rows=3, spill=str(tmp_path / 'spill.h5'),
+                    resident=2)
+    chunked = coupled_sim(solver, db=database.NullDatabase(),
+                          history=chunks)
+    assert len(chunked.y) == 1
+    assert np.array_equal(driver.solve(chunked, chunked.y, SplitInput()),
+                          sol)
+    assert chunked.y._spilled
+    assert np.array_equal(chunked.ne._rho[:], full.ne._rho)
+    for comp, other in zip(chunked.components, full.components):
+        assert np.array_equal(comp.T.magnitude[:], other.T.magnitude)
+
+
+@pytest.mark.parametrize("solver", ['split', 'exponential', 'bdf',
+                                    'multirate'])
+def test_rolling_window_matches_the_full_history(solver, coupled_sim):
+    full = coupled_sim(solver, db=database.NullDatabase())
+    sol = driver.solve(full, full.y, SplitInput())
+    light = coupled_sim(solver, db=database.NullDatabase(), history=False,
+                        window=3)
+    states = list(driver.stream(light, SplitInput()))
+    assert light.y.rows.shape == (3, 9)
+    assert light.ne._rho.rows.shape == (3,)
+    assert list(light.y.pinned) == [light.timer.t_idx_feedback]
+    for comp in light.components:
+        assert comp.T.magnitude.store is light.y
+    assert np.array_equal([state[1] for state in states], sol[:, 0])
+    assert np.array_equal([state[4] for state in states], sol[:, -2:])
+    assert np.array_equal([state[5] for state in states], full.ne._rho)
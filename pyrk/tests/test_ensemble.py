@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from pyrk import driver
+from pyrk.db import database
+from pyrk.ensemble import Ensemble
+from pyrk.inp.sim_info import SimInfo
+from pyrk.reactivity_insertion import StepReactivityInsertion
+from pyrk.timer import Timer
+from pyrk.utilities.ur import units
+
+
+ti = Timer(t0=0.0 * units.seconds, tf=1.0 * units.seconds,
+           dt=0.1 * units.seconds, t_feedback=0.2 * units.seconds)
+
+
+@pytest.fixture
+def components(fuel_mod):
+    """A fuel and moderator pair, cooled by advection"""
+    def make(alpha_fuel=-1.0, k=10.0, cp=1000.0):
+        return fuel_mod(ti=ti, alpha_fuel=alpha_fuel, k=k, cp=cp,
+                        m_flow=10.0)['components']
+    return make
+
+
+def sim(comps, **kwargs):
+    rho_ext = StepReactivityInsertion(timer=ti, t_step=0.5 * units.seconds,
+                                      rho_final=100 * units.pcm)
+    ti.ts = 0
+    return SimInfo(timer=ti, components=comps, n_decay=11, rho_ext=rho_ext,
+                   feedback=True, solver='bdf', db=database.Database(mode='w'),
+                   **kwargs)
+
+
+samples = [(-1.0, 10.0, 1000.0), (-3.0, 20.0, 1200.0), (-0.5, 5.0, 800.0)]
+
+
+@pytest.mark.parametrize("options", [{}, {'prompt_jump': True},
+                                     {'steady_state': True}])
+def test_members_match_individual_runs(options, components):
+    si = sim(components(), **options)
+    ens = Ensemble(si, (components(*sample) for sample in samples))
+    assert ens.n_members == len(samples)
+    obs = ens.solve()
+    si.db.close_db()
+    si.db.delete_db()
+    assert obs.shape == (ti.timesteps(), len(samples), si.n_entries())
+    for idx, sample in enumerate(samples):
+        ref = sim(components(*sample), **options)
+        exp = driver.solve(ref, ref.y, None)
+        ref.db.close_db()
+        ref.db.delete_db()
+        assert np.allclose(obs[:, idx], exp, rtol=1e-4, atol=1e-6)
+        assert np.array_equal(ens.peak[idx], np.max(obs[:, idx], axis=0))
+    # the members differ from each other
+    assert not np.allclose(obs[-1, 0], obs[-1, 1], rtol=1e-4)
+
+
+def test_records_selected_columns(components):
+    si = sim(components())
+    ens = Ensemble(si, [components(*sample) for sample in samples])
+    powers = ens.solve(columns=[0])
+    full = Ensemble(si, [components(*sample) for sample in samples]).solve()
+    si.db.close_db()
+    si.db.delete_db()
+    assert powers.shape == (ti.timesteps(), len(samples), 1)
+    assert np.array_equal(powers[:, :, 0], full[:, :, 0])
+
+
+def test_members_must_match_the_model(components):
+    si = sim(components())
+    comps = components()
+    comps[1].name = 'refl'
+    with pytest.raises(ValueError):
+        Ensemble(si, [components(), comps])
+    si.db.close_db()
+    si.db.delete_db()
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from pyrk import driver
+from pyrk.db import database
+from pyrk.events import Event
+from pyrk.inp.sim_info import SimInfo
+from pyrk.utilities.ur import units
+
+
+class SplitInput(object):
+    nsteps = 1000
+
+
+@pytest.fixture
+def step_sim(fuel_mod):
+    """A fuel and moderator pair driven by a 100 pcm step"""
+    def make(solver, events, dt=0.1, t_step=0.5):
+        return SimInfo(n_decay=0, feedback=True, solver=solver,
+                       events=events, db=database.Database(mode='w'),
+                       **fuel_mod(dt=dt, t_step=t_step))
+    return make
+
+
+@pytest.fixture
+def run(step_sim):
+    def solve(solver, events, **kwargs):
+        si = step_sim(solver, events, **kwargs)
+        sol = driver.solve(si, si.y, SplitInput()).copy()
+        rows = si.db.get_table('metadata', 'events').read()
+        timeseries = si.db.get_table('th', 'th_timeseries').read()
+        si.db.close_db()
+        si.db.delete_db()
+        return si, sol, rows, timeseries
+    return solve
+
+
+def test_threshold_units():
+    assert Event('hot', 'fuel', units.Quantity(1000, units.degC)).threshold \
+        == 1273.15
+    assert Event('trip', 'reactivity', 50 * units.pcm).threshold == 5e-4
+    assert Event('trip', 'power', 1.2).threshold == 1.2
+    with pytest.raises(ValueError):
+        Event('trip', 'power', 1.2, action='explode')
+    with pytest.raises(ValueError):
+        Event('trip', 'power', 1.2, direction=2)
+    # the event log would cut the name short
+    Event('a' * 16, 'power', 1.2)
+    with pytest.raises(ValueError):
+        Event('a' * 17, 'power', 1.2)
+
+
+def test_unknown_quantity_is_rejected(step_sim):
+    si = step_sim('bdf', [Event('hot', 'mod', 1000.0)])
+    si.db.close_db()
+    si.db.delete_db()
+    with pytest.raises(ValueError):
+        step_sim('bdf', [Event('hot', 'reflector', 1000.0)])
+    si.db.close_db()
+    si.db.delete_db()
+
+
+def test_crossed_follows_direction():
+    rising = Event('up', 'power', 1.0, direction=1)
+    falling = Event('down', 'power', 1.0, direction=-1)
+    either = Event('any', 'power', 1.0, direction=0)
+    assert rising.crossed(-1.0, 0.0) and not rising.crossed(1.0, -1.0)
+    assert falling.crossed(1.0, -1.0) and not falling.crossed(-1.0, 1.0)
+    assert either.crossed(-1.0, 1.0) and either.crossed(1.0, -1.0)
+    assert not either.crossed(1.0, 2.0)
+
+
+@pytest.mark.parametrize("solver", ['split', 'bdf', 'multirate'])
+def test_terminate_at_power_trip(solver, run):
+    _, ref, _, _ = run(solver, None)
+    trip = Event('trip', 'power', 1.05)
+    si, sol, rows, _ = run(solver, [trip])
+    assert ref[trip.t_idx - 1, 0] < 1.05 <= ref[trip.t_idx, 0]
+    assert trip.t_idx * 0.1 - 0.1 < trip.t <= trip.t_idx * 0.1 + 1e-12
+    assert np.array_equal(sol, ref[:trip.t_idx + 1])
+    assert len(rows) == 1
+    assert rows[0]['name'] == b'trip' and rows[0]['time'] == trip.t
+
+
+def test_crossing_time_does_not_depend_on_the_timestep(run):
+    coarse = Event('hot', 'fuel', 900.2 * units.kelvin)
+    run('bdf', [coarse], t_step=0.0)
+    fine = Event('hot', 'fuel', 900.2 * units.kelvin)
+    run('bdf', [fine], dt=0.01, t_step=0.0)
+    assert fine.t_idx > 2 * coarse.t_idx
+    assert np.isclose(coarse.t, fine.t, rtol=1e-5)
+
+
+@pytest.mark.parametrize("solver", ['split', 'exponential', 'bdf',
+                                    'multirate'])
+def test_scram_switches_external_reactivity(solver, run):
+    scram = Event('scram', 'power', 1.05, action='scram',
+                  rho=-1000 * units.pcm)
+    si, sol, rows, _ = run(solver, [scram])
+    assert len(sol) == si.timer.timesteps()
+    assert np.all(si.ne._rho_ext_vals[scram.t_idx + 1:] == -0.01)
+    assert np.all(si.ne._rho_ext_vals[:scram.t_idx + 1] >= 0)
+    assert sol[-1, 0] < 0.5
+    assert rows[0]['action'] == b'scram'
+
+
+def test_decimate_reduces_output_rate(run):
+    decimate = Event('slow', 'fuel', 900.2 * units.kelvin, action='decimate',
+                     stride=4)
+    si, sol, rows, timeseries = run('bdf', [decimate],
+                                    t_step=0.0)
+    _, _, _, full = run('bdf', None, t_step=0.0)
+    assert si.db.stride == 4
+    recorded = set(timeseries['t_idx'])
+    # the last timestep is recorded when the run ends
+    last = max(full['t_idx'])
+    assert recorded == set(idx for idx in set(full['t_idx'])
+                           if idx <= decimate.t_idx or idx % 4 == 0 or
+                           idx == last)
+    assert len(recorded) < len(set(full['t_idx']))
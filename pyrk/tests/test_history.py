@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from pyrk.history import Chunks
+from pyrk.history import QuantityColumn
+from pyrk.history import Window
+from pyrk.utilities.ur import units
+
+
+def test_chunked_store_grows_as_it_is_used():
+    y = Chunks(chunk_rows=4).store('y', (3,))
+    assert len(y) == 0
+    y[0] = [1.0, 2.0, 3.0]
+    with pytest.raises(IndexError):
+        y[5]
+    # a read does not grow the store
+    assert len(y) == 1
+    assert len(y._resident) == 1
+    y[5, 1] = 7.0
+    assert len(y) == 6
+    assert len(y._resident) == 2
+    assert np.array_equal(y[:2], [[1.0, 2.0, 3.0], [0.0, 0.0, 0.0]])
+    assert y[5][1] == 7.0
+    y[2:10] = np.arange(24.0).reshape(8, 3)
+    assert len(y) == 10
+    assert np.array_equal(np.asarray(y)[2:], np.arange(24.0).reshape(8, 3))
+    with pytest.raises(IndexError):
+        y[::2]
+
+
+def test_old_chunks_spill_to_disk(tmp_path):
+    chunks = Chunks(chunk_rows=3, spill=str(tmp_path / 'spill.h5'),
+                    resident=2)
+    rho = chunks.store('rho')
+    for t_idx in range(20):
+        rho[t_idx] = 0.5 * t_idx
+    assert sorted(rho._resident) == [5, 6]
+    assert rho._spilled == set([0, 1, 2, 3, 4])
+    assert np.array_equal(rho[:], 0.5 * np.arange(20))
+    # a spilled chunk is loaded back when a timestep of it is used
+    rho[1] = -1.0
+    assert rho[1] == -1.0
+    assert 0 in rho._resident
+    assert len(rho._resident) == 2
+
+
+def test_quantity_column():
+    y = Chunks(chunk_rows=4).store('y', (2,))
+    T = QuantityColumn(y.column(1), 'kelvin')
+    T[0] = 900 * units.kelvin
+    T[1] = units.Quantity(626.85, units.degC)
+    T.magnitude[2] = 850.0
+    assert T[0] == 900 * units.kelvin
+    assert T[1].magnitude == pytest.approx(900.0)
+    assert np.allclose(y[:3][:, 1], [900.0, 900.0, 850.0])
+    assert T.shape == (3,)
+    assert np.allclose(T.magnitude[1:], [900.0, 850.0])
+
+
+def test_window_keeps_the_last_rows_and_the_pinned_ones():
+    y = Window(3, 2, pinned=[1])
+    for t_idx in range(10):
+        y[t_idx] = [t_idx, -t_idx]
+    assert np.array_equal(y[9], [9, -9])
+    assert np.array_equal(y[7], [7, -7])
+    assert np.array_equal(y[1], [1, -1])
+    with pytest.raises(IndexError):
+        y[6]
+    with pytest.raises(IndexError):
+        y[7:9]
+    # a new timestep starts from zeros, as in a full array
+    assert np.array_equal(y[10], [0, 0])
+    rho = Window(2, pinned=[0])
+    rho[0] = 0.5
+    rho[3] = 0.25
+    assert rho[0] == 0.5
+    assert rho[3] == 0.25
+    assert rho.rows.shape == (2,)
+    assert len(rho) == 4
+
+
+def test_column_of_a_window():
+    y = Window(2, 3)
+    T = QuantityColumn(y.column(2), 'kelvin')
+    T[0] = 900 * units.kelvin
+    y[1, :2] = [1.0, 2.0]
+    T.magnitude[1] = 850.0
+    assert len(T) == 2
+    assert T.shape == (2,)
+    assert np.array_equal(y[1], [1.0, 2.0, 850.0])
+    assert T[0] == 900 * units.kelvin
+    T[2] = 800 * units.kelvin
+    assert len(T) == 3
+    # the full column is not kept
+    with pytest.raises(IndexError):
+        np.asarray(T.magnitude)
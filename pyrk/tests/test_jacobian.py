@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from pyrk import driver
+from pyrk import jacobian
+from pyrk.db import database
+from pyrk.inp.sim_info import SimInfo
+
+
+@pytest.fixture
+def pebble_sim(pebble_model):
+    """A meshed pebble in a coolant channel, like the PB-FHR examples"""
+    def make(feedback, prompt_jump=False):
+        return SimInfo(n_decay=11, feedback=feedback, solver='bdf',
+                       prompt_jump=prompt_jump,
+                       db=database.Database(mode='w'), **pebble_model())
+    return make
+
+
+@pytest.mark.parametrize("prompt_jump", [False, True])
+@pytest.mark.parametrize("feedback", [False, True])
+def test_jacobian_matches_finite_differences(feedback, prompt_jump,
+                                             pebble_sim):
+    si = pebble_sim(feedback, prompt_jump)
+    # keep trial temperatures away from the feedback reference step
+    si.timer.advance_one_timestep()
+    y = driver.y0(si)
+    n_n = 1 + si.n_pg + si.n_dg
+    y[0] = 1.2
+    y[n_n:] += np.linspace(-20, 20, si.n_components())
+    jac = jacobian.Jacobian(si)
+    obs = jac(0.1, y, feedback).toarray()
+    exp = np.zeros_like(obs)
+    for j in range(len(y)):
+        dy = np.zeros(len(y))
+        dy[j] = 1e-6 * max(1.0, abs(y[j]))
+        exp[:, j] = (driver.f_coupled(0.1, y + dy, si, feedback) -
+                     driver.f_coupled(0.1, y - dy, si, feedback)) / \
+            (2 * dy[j])
+    scale = np.abs(exp).max(axis=1, keepdims=True) + 1e-12
+    assert np.all(np.abs(obs - exp) / scale < 1e-6)
+    pattern = jac.sparsity().toarray() > 0
+    assert np.all(pattern[np.abs(exp) > 1e-9 * scale])
+    si.db.close_db()
+    si.db.delete_db()
+
+
+def test_mesh_block_is_tridiagonal(pebble_sim):
+    si = pebble_sim(False)
+    n_n = 1 + si.n_pg + si.n_dg
+    pattern = jacobian.Jacobian(si).sparsity().toarray()
+    mesh = pattern[n_n:n_n + 4, n_n:n_n + 4]
+    assert np.array_equal(mesh > 0, np.abs(np.subtract.outer(
+        np.arange(4), np.arange(4))) <= 1)
+    si.db.close_db()
+    si.db.delete_db()
+
+
+@pytest.mark.parametrize("jac", ['analytic', 'sparsity', 'dense'])
+def test_jacobian_options_agree(jac, pebble_sim):
+    si = pebble_sim(True)
+    si.jacobian = jac
+    sol = driver.solve(si, si.y, None).copy()
+    si.db.close_db()
+    si.db.delete_db()
+    ref = pebble_sim(True)
+    ref.jacobian = 'dense'
+    exp = driver.solve(ref, ref.y, None)
+    ref.db.close_db()
+    ref.db.delete_db()
+    assert np.allclose(sol, exp, rtol=1e-4)
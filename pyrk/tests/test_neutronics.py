@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from pyrk import neutronics
 
@@ -22,4 +23,66 @@ def test_malformed_constructor():
     assert excinfo.type is ValueError
     with pytest.raises(ValueError) as excinfo:
         neutronics.Neutronics(n_decay=99)
-    assert excinfo.type is ValueError
\ No newline at end of file
+    assert excinfo.type is ValueError
+
+
+def test_dydt_matches_group_by_group():
+    ne = neutronics.Neutronics(iso="u235", e="thermal", n_decay=11)
+    power = 1.3
+    zetas = np.linspace(10.0, 60.0, 6)
+    omegas = np.linspace(0.1, 1.1, 11)
+    rho = 0.002
+    exp = np.zeros(18)
+    exp[0] = ne.dpdt(0, [], power, zetas, rho=rho)
+    for j in range(6):
+        exp[1 + j] = ne.dzetadt(0, power, zetas[j], j)
+    for k in range(11):
+        exp[7 + k] = ne.dwdt(power, omegas[k], k)
+    y = np.concatenate([[power], zetas, omegas])
+    assert np.allclose(ne.dydt(y, rho), exp, rtol=1e-12, atol=0)
+    assert np.allclose(ne.pke_matrix(rho).dot(y), exp, rtol=1e-12, atol=0)
+
+
+def test_dydt_fills_buffer():
+    ne = neutronics.Neutronics(iso="fhr", e="multipt", n_precursors=8,
+                               n_decay=0)
+    out = np.zeros(9)
+    obs = ne.dydt(np.ones(9), 0.0, out=out)
+    assert obs is out
+    assert np.allclose(out[1:], ne._betas / ne._Lambda - ne._lambdas)
+
+
+def test_propagator_is_cached_and_advances_exactly():
+    ne = neutronics.Neutronics(iso="u235", e="thermal", n_decay=0)
+    y = np.ones(7)
+    prop = ne.propagator(0.001, 0.01)
+    assert ne.propagator(0.001, 0.01) is prop
+    assert len(ne._propagators) == 1
+    # two half steps are one full step
+    half = ne.propagator(0.001, 0.005)
+    assert np.allclose(half.dot(half.dot(y)), prop.dot(y), rtol=1e-10)
+    exp = y + 0.01 * ne.dydt(y, 0.001)
+    assert np.allclose(ne.propagator(0.001, 1e-8).dot(y),
+                       y + 1e-8 * ne.dydt(y, 0.001), rtol=1e-9)
+    assert not np.allclose(prop.dot(y), exp)
+
+
+def test_prompt_jump_power():
+    ne = neutronics.Neutronics(iso="u235", e="thermal", n_decay=11,
+                               prompt_jump=True)
+    zetas = ne._betas / (ne._lambdas * ne._Lambda)
+    y = np.concatenate([[1.0], zetas, np.zeros(11)])
+    # the equilibrium precursors give unit power at zero reactivity
+    assert np.isclose(ne.power(y, 0.0), 1.0)
+    rho = 0.5 * ne._beta
+    assert np.isclose(ne.power(y, rho), 2.0)
+    # P follows the precursors, and the rest sees the prompt jump power
+    f = ne.dydt(y, rho)
+    y_p = y.copy()
+    y_p[0] = ne.power(y, rho)
+    assert np.allclose(f[1:], neutronics.Neutronics(
+        iso="u235", e="thermal", n_decay=11).dydt(y_p, rho)[1:])
+    assert np.isclose(f[0], ne.prompt_coefficients(rho).dot(f[1:7]))
+    assert np.all(ne.pke_matrix(rho)[:, 0] == 0.0)
+    with pytest.raises(ValueError):
+        ne.power(y, ne._beta)
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from pyrk import driver
+from pyrk.db import database
+from pyrk.inp.sim_info import SimInfo
+from pyrk.realtime import RealTime
+from pyrk.utilities.ur import units
+
+
+class SplitInput(object):
+    nsteps = 1000
+
+
+class Clock(object):
+    """A wall clock on which each frame takes work seconds to solve"""
+
+    def __init__(self, work):
+        self.now = 0.0
+        self.work = work
+
+    def __call__(self):
+        self.now += self.work
+        return self.now
+
+    def sleep(self, seconds):
+        assert seconds >= 0
+        self.now += seconds
+
+
+@pytest.fixture
+def sim(fuel_mod):
+    def make(solver):
+        model = fuel_mod(dt=0.05, m_flow=10.0)
+        # the reactivity is inserted by command
+        del model['rho_ext']
+        return SimInfo(n_decay=0, feedback=True, solver=solver,
+                       db=database.NullDatabase(), **model)
+    return make
+
+
+@pytest.mark.parametrize("solver", ['split', 'exponential', 'bdf',
+                                    'multirate'])
+def test_commands_apply_from_the_next_timestep(solver, sim):
+    rt = RealTime(sim(solver), SplitInput(), speed=None)
+    states = []
+    for state in rt.stream():
+        states.append(state)
+        if len(states) == 6:
+            rt.put('rho_ext', 100 * units.pcm)
+            rt.put('mod.adv.mod.t_in', 780.0)
+    assert len(states) == 21
+    assert rt.si.ne._rho_ext_vals[5] == 0.0
+    assert np.all(rt.si.ne._rho_ext_vals[6:] == 0.001)
+    assert rt.si.components[1].adv['mod']['t_in'] == 780 * units.kelvin
+    # a run without the commands
+    si = sim(solver)
+    sol = driver.solve(si, si.y, SplitInput())
+    assert not np.array_equal(rt.si.th.get_network().adv_src,
+                              si.th.get_network().adv_src)
+    power = np.array([state[1] for state in states])
+    assert np.array_equal(power[:6], sol[:6, 0])
+    assert power[-1] > sol[-1, 0]
+    temps = np.array([state[4] for state in states])
+    assert temps[-1, 1] < sol[-1, -1]
+
+
+def test_reactivity_command_matches_a_preset_insertion(sim):
+    rt = RealTime(sim('bdf'), SplitInput(), speed=None)
+    power = []
+    for state in rt.stream():
+        power.append(state[1])
+        if len(power) == 6:
+            rt.put('rho_ext', 0.001)
+    si = sim('bdf')
+    si.ne._rho_ext_vals[6:] = 0.001
+    sol = driver.solve(si, si.y, SplitInput())
+    # only the restart of the integrator differs
+    assert np.allclose(power, sol[:, 0], rtol=1e-5)
+
+
+def test_frames_follow_the_wall_clock(sim):
+    clock = Clock(work=0.01)
+    rt = RealTime(sim('bdf'), SplitInput(), speed=0.5, clock=clock,
+                  sleep=clock.sleep)
+    for t, power, zetas, omegas, temps, rho in rt.stream():
+        # released at twice the simulated time
+        assert clock.now == pytest.approx(0.01 + 2 * t)
+    assert rt.overruns == []
+
+
+def test_overruns_are_reported(sim):
+    clock = Clock(work=0.08)
+    rt = RealTime(sim('bdf'), SplitInput(), clock=clock, sleep=clock.sleep)
+    states = list(rt.stream())
+    assert len(states) == 21
+    assert [t_idx for t_idx, _ in rt.overruns] == list(range(1, 21))
+    assert rt.overruns[-1][1] == pytest.approx(20 * 0.03)
@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+
+from pyrk import driver
+from pyrk.db import database
+from pyrk import sweep
+from pyrk.inp.sim_info import SimInfo
+from pyrk.reactivity_insertion import StepReactivityInsertion
+from pyrk.sensitivity import Sensitivity
+from pyrk.utilities.ur import units
+
+
+@pytest.fixture
+def sim(fuel_mod):
+    def make(alpha_fuel=-1.0, power_tot=1e6, m_flow=10.0, beta=1.0,
+             Lambda=1.0, rtol=1e-8, atol=1e-11, **kwargs):
+        model = fuel_mod(alpha_fuel=alpha_fuel, power_tot=power_tot,
+                         m_flow=m_flow)
+        si = SimInfo(n_decay=11, feedback=True, solver='bdf', rtol=rtol,
+                     atol=atol, db=database.Database(mode='w'), **model,
+                     **kwargs)
+        # scale the precursor data, which driver.y0 reads directly
+        ne = si.ne
+        ne._pd._betas = [b * beta for b in ne._pd._betas]
+        ne._pd._Lambda *= Lambda
+        ne._betas = ne._betas * beta
+        ne._beta *= beta
+        ne._Lambda *= Lambda
+        ne._pke = ne._init_pke()
+        return si
+    return make
+
+
+@pytest.fixture
+def run(sim):
+    def solve(**kwargs):
+        # tight enough for finite differences of reruns
+        si = sim(rtol=1e-11, atol=1e-14, **kwargs)
+        sol = driver.solve(si, si.y, None).copy()
+        si.db.close_db()
+        si.db.delete_db()
+        return sol
+    return solve
+
+
+params = ['fuel.alpha_temp', 'fuel.power_tot', 'mod.adv.mod.m_flow',
+          'beta', 'Lambda']
+
+
+@pytest.mark.parametrize("options", [{}, {'prompt_jump': True},
+                                     {'steady_state': True}])
+def test_sensitivities_match_finite_differences(options, sim, run):
+    si = sim(**options)
+    sens = Sensitivity(si, params)
+    s = sens.solve()
+    si.db.close_db()
+    si.db.delete_db()
+    assert s.shape == (si.timer.timesteps(), len(params), si.n_entries())
+    # the state itself is the usual solution
+    assert np.allclose(si.y, run(**options), rtol=1e-6)
+    nominal = [-1.0, 1e6, 10.0, 1.0, 1.0]
+    # the finite differences step in the units of each argument of sim
+    scale = [1e5, 1.0, 1.0, 1.0 / si.ne._beta, 1.0 / si.ne._Lambda]
+    for k, name in enumerate(['alpha_fuel', 'power_tot', 'm_flow', 'beta',
+                              'Lambda']):
+        h = 1e-3 * abs(nominal[k])
+        up = run(**dict(options, **{name: nominal[k] + h}))
+        down = run(**dict(options, **{name: nominal[k] - h}))
+        exp = (up - down) / (2 * h) * scale[k]
+        # allowing for the tolerance of the reruns
+        noise = 1e-10 * np.max(np.abs(up), axis=0) / h * scale[k]
+        tol = 1e-3 * np.max(np.abs(exp), axis=0) + noise
+        assert np.all(np.abs(s[:, k] - exp) <= tol), name
+
+
+def nudge(si, path, value):
+    """Sets a parameter of a simulation, scaling the precursor data for beta
+    and Lambda as the sim fixture does"""
+    ne = si.ne
+    if path == 'beta':
+        f = value / ne._beta
+        ne._pd._betas = [b * f for b in ne._pd._betas]
+        ne._betas = ne._betas * f
+        ne._beta = value
+    elif path == 'Lambda':
+        ne._pd._Lambda *= value / ne._Lambda
+        ne._Lambda = value
+    else:
+        sweep.set_param(si, path, value)
+    ne._pke = ne._init_pke()
+
+
+def test_sensitivities_converge_to_finite_differences(pebble_model):
+    def pebble_sim(rtol, atol):
+        model = pebble_model()
+        rho_ext = StepReactivityInsertion(timer=model['timer'],
+                                          t_step=0.5 * units.seconds,
+                                          rho_final=100 * units.pcm)
+        return SimInfo(n_decay=0, feedback=True, solver='bdf', rtol=rtol,
+                       atol=atol, rho_ext=rho_ext, db=database.NullDatabase(),
+                       **model)
+    paths = ['cool.conv.pebble.h.h0', 'cool.adv.cool.m_flow',
+             'fuel4.alpha_temp', 'fuel2.power_tot', 'beta', 'Lambda']
+    # the default tolerances, which also control the sensitivities
+    si = pebble_sim(rtol=1e-6, atol=1e-9)
+    sens = Sensitivity(si, paths)
+    s = sens.solve()
+    for k, path in enumerate(paths):
+        value = sens.value(path)
+        h = 1e-4 * abs(value)
+        sols = []
+        for sign in [-1.0, 1.0]:
+            # converged far below the tolerance of the sensitivities
+            rerun = pebble_sim(rtol=1e-12, atol=1e-15)
+            nudge(rerun, path, value + sign * h)
+            sols.append(driver.solve(rerun, rerun.y, None).copy())
+        exp = (sols[1] - sols[0]) / (2 * h)
+        noise = 1e-11 * np.max(np.abs(sols[1]), axis=0) / h
+        tol = 2e-5 * np.max(np.abs(exp), axis=0) + noise
+        assert np.all(np.abs(s[:, k] - exp) <= tol), path
+
+
+def test_unsupported_parameter(sim):
+    si = sim()
+    with pytest.raises(ValueError):
+        Sensitivity(si, ['fuel.k'])
+    si.db.close_db()
+    si.db.delete_db()
+
+
+def test_peak(sim):
+    si = sim()
+    sens = Sensitivity(si, ['fuel.alpha_temp'])
+    sens.solve()
+    si.db.close_db()
+    si.db.delete_db()
+    peak, dpeak = sens.peak(9)
+    assert peak == np.max(si.y[:, 9])
+    assert dpeak.shape == (1,)
+
+
+def test_needs_a_coupled_solver(sim):
+    si = sim()
+    si.solver = 'split'
+    with pytest.raises(ValueError):
+        Sensitivity(si, ['beta'])
+    si.db.close_db()
+    si.db.delete_db()
@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pytest
+import tables as tb
+
+from pyrk import driver
+from pyrk import sweep
+from pyrk.db import database
+from pyrk.events import Event
+from pyrk.inp.sim_info import SimInfo
+from pyrk.simulation import Simulation
+from pyrk.timer import piecewise
+from pyrk.utilities.ur import units
+
+
+@pytest.fixture
+def model(fuel_mod):
+    def make(grid=None):
+        events = [Event('trip', 'power', 1.05, action='scram',
+                        rho=-1000 * units.pcm)]
+        return dict(n_decay=0, feedback=True, events=events,
+                    **fuel_mod(dt=0.05, grid=grid, t_step=0.3))
+    return make
+
+
+def test_run_has_no_side_effects(tmp_path, monkeypatch, model):
+    monkeypatch.chdir(tmp_path)
+
+    def fail(*args):
+        raise AssertionError('git was called')
+    monkeypatch.setattr(SimInfo, 'get_git_revision_short_hash', fail)
+    sim = Simulation(solver='bdf', **model())
+    y = sim.run()
+    assert os.listdir(str(tmp_path)) == []
+    assert sim.si.events[0].fired
+    assert y.shape == (21, 9)
+    assert np.array_equal(sim.power(), y[:, 0])
+    assert np.array_equal(sim.t(), np.linspace(0, 1, 21))
+    assert sim.zetas().shape == (21, 6)
+    assert sim.omegas().shape == (21, 0)
+    assert np.array_equal(sim.temps()['mod'], y[:, -1])
+    assert sim.rho()[0] == 0.0
+
+
+def test_run_matches_the_driver(tmp_path, model):
+    for solver in ['split', 'bdf']:
+        sim = Simulation(solver=solver, **model())
+        y = sim.run().copy()
+        params = model()
+        params['db'] = database.Database(str(tmp_path / 'pyrk.h5'))
+        si = SimInfo(solver=solver, **params)
+        sol = driver.solve(si, si.y, sim)
+        si.db.close_db()
+        assert np.array_equal(y, sol)
+        # a second run starts the transient over
+        assert np.array_equal(sim.run(), y)
+
+
+def test_rerun_after_changing_a_parameter(model):
+    sim = Simulation(solver='bdf', **model())
+    y = sim.run().copy()
+    sim.components[0].alpha_temp = -3 * units.pcm / units.kelvin
+    assert not np.allclose(sim.run(), y)
+
+
+def test_rerun_without_the_history(model):
+    sim = Simulation(solver='bdf', history=False, **model())
+    y = sim.run().copy()
+    assert y.shape == (1, 9)
+    assert np.array_equal(sim.run(), y)
+    full = Simulation(solver='bdf', **model()).run()
+    assert np.array_equal(y, full[-1:])
+
+
+def test_sinks(infile, tmp_path):
+    mod = sweep.load_fresh(infile)
+    outfile = str(tmp_path / 'out.h5')
+    sim = Simulation.from_infile(mod, db=database.Database(outfile),
+                                 logfile=str(tmp_path / 'pyrk.log'))
+    y = sim.run()
+    sim.db.close_db()
+    assert sim.si.solver == 'bdf'
+    assert os.path.getsize(str(tmp_path / 'pyrk.log')) > 0
+    with tb.open_file(outfile, mode='r') as h5file:
+        rows = h5file.root.metadata.sim_timeseries.read()
+    assert np.array_equal(rows['power'], y[:-1, 0])
+
+
+def test_run_on_a_non_uniform_grid(tmp_path, model):
+    grid = piecewise(0.0 * units.seconds,
+                     [(0.4 * units.seconds, 0.05 * units.seconds),
+                      (1.0 * units.seconds, 0.2 * units.seconds)])
+    y_fine = Simulation(solver='bdf', **model()).run()
+    params = model(grid)
+    outfile = str(tmp_path / 'out.h5')
+    sim = Simulation(solver='bdf', db=database.Database(outfile), **params)
+    y = sim.run()
+    sim.db.close_db()
+    assert len(params['rho_ext'].vals) == 12
+    assert y.shape == (12, 9)
+    assert params['components'][0].T.shape == (12,)
+    assert np.allclose(sim.t(), grid.magnitude)
+    shared = [0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20]
+    assert np.allclose(y, y_fine[shared], rtol=1e-3)
+    with tb.open_file(outfile, mode='r') as h5file:
+        rows = h5file.root.metadata.sim_timeseries.read()
+    assert np.allclose(rows['time'], grid.magnitude[:-1])
@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pytest
+import tables as tb
+
+from pyrk import cli
+from pyrk import sweep
+from pyrk.utilities.ur import units
+
+
+def test_grid():
+    samples = sweep.grid({'b': [1, 2], 'a': [3]})
+    assert samples == [{'a': 3, 'b': 1}, {'a': 3, 'b': 2}]
+
+
+def test_parse_distribution():
+    assert sweep.parse_distribution('fuel.alpha_temp=gauss:-3:0.5') == \
+        ('fuel.alpha_temp', ('gauss', -3.0, 0.5))
+    with pytest.raises(ValueError):
+        sweep.parse_distribution('fuel.alpha_temp=beta:1:2')
+    values = sweep.draw(('uniform', 1.0, 2.0), np.random.default_rng(0), 5)
+    assert values.shape == (5,)
+    assert np.all((values >= 1.0) & (values < 2.0))
+
+
+def test_set_param(infile):
+    mod = sweep.load_fresh(infile)
+    sweep.set_param(mod, 'fuel.alpha_temp', -2.0)
+    assert mod.fuel.alpha_temp.magnitude == -2.0
+    assert mod.fuel.alpha_temp.units == units.delta_k / units.kelvin
+    sweep.set_param(mod, 'mod.adv.mod.m_flow', 20.0)
+    assert mod.mod.adv['mod']['m_flow'] == 20.0 * units.kg / units.seconds
+    sweep.set_param(mod, 'solver', 'radau')
+    assert mod.solver == 'radau'
+    # each load is a fresh module
+    assert sweep.load_fresh(infile).solver == 'bdf'
+    with pytest.raises(AttributeError):
+        sweep.get_param(mod, 'fuel.nonsense')
+
+
+def test_sample_records_nothing(infile, tmp_path, monkeypatch):
+    # outside a git checkout, where a database could not get its metadata
+    monkeypatch.chdir(tmp_path)
+    sol = sweep.solve_sample(infile, {'fuel.alpha_temp': -2e-5})
+    assert sol.shape == (11, 9)
+    assert not list(tmp_path.glob('**/*.h5'))
+
+
+def test_sweep_matches_direct_runs(infile):
+    samples = sweep.grid({'fuel.alpha_temp': [-1e-5, -3e-5]})
+    samples.append({'solver': 'nonsense'})
+    sw = sweep.Sweep(infile, samples, max_workers=2, retries=1)
+    y = sw.run()
+    assert y.shape == (3, 11, 9)
+    assert list(sw.n_steps) == [11, 11, 0]
+    assert list(sw.errors) == [2]
+    assert np.all(np.isnan(y[2]))
+    assert not np.allclose(y[0], y[1])
+    # a single run of the second sample gives the same solution
+    alone = sweep.Sweep(infile, samples[1:2], max_workers=1).run()
+    assert np.array_equal(alone[0], y[1])
+
+
+def test_sweep_survives_a_worker_dying(infile, tmp_path):
+    samples = sweep.grid({'fuel.alpha_temp': [-1e-5, -2e-5, -3e-5]})
+    samples.append({'solver': 'nonsense'})
+    sw = sweep.Sweep(infile, samples, max_workers=2, retries=1)
+    marker = str(tmp_path / 'died')
+    # from now on, the first worker to load the input exits without a trace
+    with open(infile, 'a') as f:
+        f.write('import os\n'
+                'if not os.path.exists(%r):\n'
+                '    open(%r, "w").close()\n'
+                '    os._exit(1)\n' % (marker, marker))
+    y = sw.run()
+    assert (tmp_path / 'died').exists()
+    assert list(sw.n_steps) == [11, 11, 11, 0]
+    assert list(sw.errors) == [3]
+    assert not np.any(np.isnan(y[:3]))
+
+
+def test_sweep_survives_a_sample_that_kills_its_worker(infile):
+    samples = sweep.grid({'fuel.alpha_temp': [-1e-5, -2e-5, -3e-5,
+                                              -4e-5, -5e-5]})
+    # the step insertion recomputes its values with f, which exits at once
+    samples.insert(0, {'rho_ext.f': os._exit})
+    sw = sweep.Sweep(infile, samples, max_workers=1, retries=1)
+    y = sw.run()
+    assert list(sw.errors) == [0]
+    assert list(sw.n_steps) == [0, 11, 11, 11, 11, 11]
+    assert not np.any(np.isnan(y[1:]))
+
+
+def test_cli_writes_one_file(infile, tmp_path):
+    outfile = str(tmp_path / 'sweep.h5')
+    cli.main(['sweep', '--infile', infile, '--outfile', outfile,
+              '--grid', 'fuel.alpha_temp=-1e-5,-2e-5',
+              '--sample', 'mod.alpha_temp=uniform:-1e-5:0',
+              '--n-samples', '2', '--seed', '1', '--workers', '2'])
+    with tb.open_file(outfile, mode='r') as h5file:
+        y = h5file.root.sweep.y.read()
+        params = h5file.root.sweep.params.read()
+        paths = h5file.root.sweep.params.attrs.paths
+    assert y.shape == (4, 11, 9)
+    assert not np.any(np.isnan(y))
+    assert paths == ['fuel.alpha_temp', 'mod.alpha_temp']
+    assert np.array_equal(params[:, 0], [-1e-5, -1e-5, -2e-5, -2e-5])
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from pyrk import th_system
+from pyrk.utilities.ur import units
+
+
+@pytest.fixture
+def pebble_components(pebble_model):
+    """A meshed pebble in a coolant channel, with a slab reflector"""
+    def make(dr=0.003):
+        return pebble_model(dr=dr, reflector=True)['components']
+    return make
+
+
+def test_network_matches_per_component_dtempdt(pebble_components):
+    components = pebble_components()
+    system = th_system.THSystem(kappa=0.06, components=components)
+    rng = np.random.RandomState(42)
+    temps = 900 + 100 * rng.rand(len(components))
+    for comp, temp in zip(components, temps):
+        comp.update_temp(0, temp * units.kelvin)
+    omegas = np.array([0.01, 0.02, 0.005])
+    obs = system.compile().dtempdt(temps, 1.3, omegas)
+    exp = np.array([system.dtempdt(comp, 1.3, omegas, 0).magnitude
+                    for comp in components])
+    assert np.allclose(obs, exp, rtol=1e-12, atol=1e-12)
+    assert obs[components.index(system.comp_from_name('pebble'))] == 0
+
+
+def test_network_skips_advection_at_zero_kelvin(pebble_components):
+    components = pebble_components()
+    system = th_system.THSystem(kappa=0.0, components=components)
+    temps = np.array([comp.T0.magnitude for comp in components])
+    temps[-2] = 0.0
+    for comp, temp in zip(components, temps):
+        comp.update_temp(0, temp * units.kelvin)
+    obs = system.get_network().dtempdt(temps, 1.0, [])
+    exp = system.dtempdt(components[-2], 1.0, [], 0).magnitude
+    assert np.isclose(obs[-2], exp)
+
+
+def test_network_is_sparse_for_fine_meshes(pebble_components):
+    components = pebble_components(dr=1.5e-5)
+    n_c = len(components)
+    assert n_c > 1000
+    network = th_system.THSystem(kappa=0.0, components=components).compile()
+    assert network.cond.shape == (n_c, n_c)
+    assert network.cond.nnz < 3 * n_c + 10
@@ -1,3 +1,4 @@
+import pytest
 import six
 
 from pyrk.utilities.ur import units
@@ -119,3 +120,102 @@ def test_idx_from_t_and_back():
         idx = trouble.idx_from_t(time=time, t0=t0, dt=dt)
         other_idx = trouble.idx_from_t(time=trouble.t(idx), t0=t0, dt=dt)
         assert idx == other_idx
+
+
+def test_idx_matches_t_idx():
+    for ti in [default, short_sim, long_sim, late_start, trouble]:
+        for t in np.linspace(ti.t0.magnitude, ti.tf.magnitude, 37):
+            assert ti.idx(t) == ti.t_idx(t * units.seconds)
+
+
+fine_then_coarse = timer.Timer(grid=timer.piecewise(
+    zero, [(one, ptone), (ten, one)]))
+
+
+def test_piecewise_grid():
+    ti = fine_then_coarse
+    assert not ti.uniform
+    assert ti.timesteps() == 20
+    assert ti.t0 == zero
+    assert ti.tf == ten
+    assert np.isclose(ti.dt.magnitude, 0.1)
+    assert ti.t(10) == one
+    assert ti.t(11) == 2.0 * units.seconds
+    assert ti.step_size(5) == ti.t(5).magnitude - ti.t(4).magnitude
+    assert ti.step_size(11) == 1.0
+    for t_idx in range(ti.timesteps()):
+        t = ti.t(t_idx)
+        assert ti.t_idx(t) == t_idx
+        assert ti.idx(t.magnitude) == t_idx
+    # times between the outputs go to the nearest one
+    assert ti.idx(0.54) == 5
+    assert ti.idx(1.4) == 10
+    assert ti.idx(1.6) == 11
+    assert ti.idx(12.0) == ti.timesteps() + 1
+
+
+def test_piecewise_grid_advances_one_timestep_at_a_time():
+    ti = timer.Timer(grid=timer.piecewise(
+        zero, [(one, ptone), (ten, one)]))
+    while ti.current_time() < ti.tf:
+        ti.advance_one_timestep()
+    assert ti.current_timestep() == ti.timesteps() - 1
+    assert np.array_equal(ti.series.magnitude,
+                          [ti.t(idx).magnitude
+                           for idx in range(ti.timesteps())])
+
+
+def test_grid_like_the_uniform_one():
+    ti = timer.Timer(grid=short_sim.series, t_feedback=0.3 * units.seconds)
+    assert ti.timesteps() == short_sim.timesteps()
+    assert ti.t_idx_feedback == 3
+    for t in np.linspace(0.003, 0.997, 37):
+        assert ti.idx(t) == short_sim.idx(t)
+
+
+def test_graded_grid():
+    t_fine = [2.0 * units.seconds]
+    grid = timer.graded(zero, 1000 * units.seconds, 0.001 * units.seconds,
+                        ten, t_fine=t_fine, growth=1.2).magnitude
+    steps = np.diff(grid)
+    assert grid[0] == 0.0
+    assert grid[-1] == 1000.0
+    assert 2.0 in grid
+    at = list(grid).index(2.0)
+    assert np.isclose(steps[at], 0.001)
+    assert np.all(steps > 0)
+    assert np.isclose(steps.max(), 10.0)
+    assert np.all(steps[at + 1:] <= 1.2 * steps[at:-1] + 1e-12)
+    assert len(grid) < 1000
+
+
+def test_grid_must_increase():
+    with pytest.raises(ValueError):
+        timer.Timer(grid=[0.0, 1.0, 1.0] * units.seconds)
+    with pytest.raises(ValueError):
+        timer.Timer(grid=[0.0] * units.seconds)
+
+
+def test_float_lookups_match_the_quantity_ones():
+    grid = timer.Timer(grid=timer.piecewise(
+        zero, [(one, ptone), (ten, one)]))
+    for ti in [short_sim, grid]:
+        t_idx = np.arange(ti.timesteps())
+        assert np.array_equal(ti.seconds(t_idx), ti.series.magnitude)
+        for idx in t_idx:
+            assert ti.seconds(idx) == ti.t(idx).magnitude
+        times = np.linspace(ti._t0, ti._tf, 101)
+        assert np.array_equal(ti.indices(times),
+                              [ti.idx(t) for t in times])
+        assert np.array_equal(ti.indices(times),
+                              [ti.t_idx(t * units.seconds) for t in times])
+
+
+def test_advance_one_timestep_stops_at_tf():
+    ti = timer.Timer(t0=zero, tf=one, dt=ptone)
+    for _ in range(ti.timesteps() - 1):
+        ti.advance_one_timestep()
+    assert ti.current_time() == ti.tf
+    with pytest.raises(ValueError):
+        ti.advance_one_timestep()
+    assert ti.current_timestep() == ti.timesteps() - 1
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import tables as tb
+
+from pyrk import cli
+from pyrk import uq
+
+
+def test_statistics_match_numpy_for_ragged_runs():
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(2000, 6, 2))
+    lengths = [6 if idx % 3 else 4 for idx in range(len(data))]
+    stats = uq.Statistics(6, 2, quantiles=(0.05, 0.5, 0.95))
+    for y, length in zip(data, lengths):
+        stats.update(y[:length])
+    assert list(stats.count) == [2000] * 4 + [1333] * 2
+    full = data[:, :4]
+    assert np.allclose(stats.mean[:4], full.mean(axis=0))
+    assert np.allclose(stats.variance()[:4], full.var(axis=0, ddof=1))
+    assert np.array_equal(stats.max[:4], full.max(axis=0))
+    assert np.array_equal(stats.min[:4], full.min(axis=0))
+    exp = np.quantile(full, [0.05, 0.5, 0.95], axis=0)
+    assert np.allclose(stats.quantiles()[:, :4], exp, atol=0.1)
+
+
+def test_quantiles_are_exact_for_few_runs():
+    stats = uq.Statistics(2, 1, quantiles=(0.5,))
+    for val in [3.0, 1.0, 2.0]:
+        stats.update(np.array([[val]]))
+    assert stats.quantiles()[0, 0, 0] == 2.0
+    assert np.isnan(stats.quantiles()[0, 1, 0])
+    assert np.isnan(stats.variance()[1, 0])
+
+
+@pytest.mark.parametrize("method", ['lhs', 'sobol', 'random'])
+def test_draw(infile, method):
+    mc = uq.MonteCarlo(infile, {'fuel.alpha_temp': ('uniform', -2e-5, 0.0),
+                                'mod.alpha_temp': ('gauss', -1e-5, 1e-6)},
+                       8, method=method, seed=1)
+    assert mc.samples.shape == (8, 2)
+    assert np.all((mc.samples[:, 0] >= -2e-5) & (mc.samples[:, 0] <= 0))
+    if method == 'lhs':
+        # one sample in each of the eight strata
+        strata = np.floor((mc.samples[:, 0] + 2e-5) / 2e-5 * 8)
+        assert sorted(strata) == list(range(8))
+
+
+def test_unsupported_method(infile):
+    with pytest.raises(ValueError):
+        uq.MonteCarlo(infile, {'fuel.alpha_temp': ('uniform', 0, 1)}, 2,
+                      method='grid')
+    with pytest.raises(ValueError):
+        uq.MonteCarlo(infile, {'fuel.alpha_temp': ('beta', 0, 1)}, 2)
+
+
+def test_monte_carlo_writes_statistics(infile, tmp_path):
+    outfile = str(tmp_path / 'pyrk.h5')
+    mc = cli.main(['uq', '--infile', infile, '--outfile', outfile,
+                   '--dist', 'fuel.alpha_temp=uniform:-2e-5:-1e-5',
+                   '--n-samples', '6', '--seed', '2', '--workers', '2'])
+    assert mc.errors == {}
+    assert list(mc.columns) == [0, 7, 8]
+    with tb.open_file(outfile, mode='r') as h5file:
+        mean = h5file.root.uq.mean.read()
+        count = h5file.root.uq.count.read()
+        paths = h5file.root.uq.samples.attrs.paths
+        # next to the usual tables
+        assert '/metadata/sim_info' in h5file
+    assert mean.shape == (11, 3)
+    assert np.all(count == 6)
+    assert paths == ['fuel.alpha_temp']
+    assert np.allclose(mean[0], [1.0, 900.0, 850.0])
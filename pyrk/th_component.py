@@ -63,9 +63,7 @@ class THComponent(object):
         self.cp = mat.cp
         self.dm = mat.dm
         self.timer = timer
-        self.T = units.Quantity(np.zeros(shape=(timer.timesteps(),),
-                                         dtype=float), 'kelvin')
-        self.T[0] = T0
+        self._T = None
         self.T0 = T0
         self.alpha_temp = alpha_temp.to('delta_k/kelvin')
         self.heatgen = heatgen
@@ -115,6 +113,21 @@ class THComponent(object):
                                       ri=ri, ro=ro))
         return to_ret
 
+    @property
+    def T(self):
+        """T (Quantity array): the temperature at each timestep. It is
+        allocated on first use, unless SimInfo makes it a view of the
+        temperature column of the solution first."""
+        if self._T is None:
+            self._T = units.Quantity(np.zeros(shape=(self.timer.timesteps(),),
+                                              dtype=float), 'kelvin')
+            self._T[0] = self.T0
+        return self._T
+
+    @T.setter
+    def T(self, value):
+        self._T = value
+
     def temp(self, timestep):
         """The temperature of this component at the chosen timestep
 
@@ -143,10 +156,14 @@ class THComponent(object):
 
         :param timestep: the timestep at which to query the temperature
         :type timestep: int
-        :param temp: the new temperature
+        :param temp: the new temperature. A plain float is taken to be in
+          kelvin and is stored without unit conversion.
         :type float: float, units of kelvin
         """
-        self.T[timestep] = temp
+        if isinstance(temp, units.Quantity):
+            self.T[timestep] = temp
+        else:
+            self.T.magnitude[timestep] = temp
         self.prev_t_idx = timestep
         return self.T[timestep]
 
@@ -293,7 +310,8 @@ class THComponent(object):
     def record(self):
         """A recorder function to fill the th/th_timeseries table
         """
-        timestep = self.prev_t_idx
+        # the timestep the other recorders record, also when the run ends
+        timestep = self.timer.current_timestep() - 1
         rec = {'t_idx': timestep,
                'component': self.name,
                'temp': self.temp(timestep).magnitude,
@@ -338,9 +356,6 @@ class THSuperComponent(THComponent):
                              ri=0 * units.meter,
                              ro=0 * units.meter)
         self.sub_comp = sub_comp if sub_comp else []
-        self.T = units.Quantity(np.zeros(shape=(timer.timesteps(),),
-                                         dtype=float), 'kelvin')
-        self.T[0] = T0
         self.conv = {}
         self.add_conduction_in_mesh()
         self.alpha_temp = 0.0 * units.delta_k / units.kelvin
@@ -0,0 +1,375 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+A compiled form of the thermal hydraulics system, in which the heat transfer
+between all components is held in sparse coefficient arrays.
+"""
+import numpy as np
+import six
+from scipy import sparse
+from scipy.sparse import linalg
+
+from pyrk.th_component import THSuperComponent
+from pyrk.materials.liquid_material import LiquidMaterial
+
+
+class THNetwork(object):
+    """This class holds the thermal network of a THSystem as arrays.
+
+    Every heat transfer term in THSystem.dtempdt is linear in the component
+    temperatures, so the heat flowing into each component is one sparse
+    matrix-vector product plus source terms. The matrix is assembled once
+    from the cond, conv, convBC and adv dictionaries of the components. Only
+    the heat capacities, which follow each density model, depend on the
+    temperatures afterwards. Convective heat transfer coefficients are
+    evaluated once at compile time. The implemented convective models do not
+    depend on temperature.
+    """
+
+    def __init__(self, components, kappa):
+        """Compiles the thermal network of the components.
+
+        :param components: the components making up the reactor, in the order
+          of the thermal hydraulics block of the solution vector
+        :type components: list of THComponent and/or THSuperComponent objects
+        :param kappa: the decay heat parameter
+        :type kappa: float
+        """
+        self.components = list(components) if components else []
+        self.kappa = kappa
+        self.names = dict((comp.name, idx)
+                          for idx, comp in enumerate(self.components))
+        n_c = len(self.components)
+        self.rho_a = np.zeros(n_c)
+        """rho_a (ndarray): constant term of each density model"""
+        self.rho_b = np.zeros(n_c)
+        """rho_b (ndarray): temperature coefficient of each density model"""
+        self.cp = np.ones(n_c)
+        """cp (ndarray): specific heat capacity of each component"""
+        self.gen_power = np.zeros(n_c)
+        """gen_power (ndarray): volumetric heat generation per unit power"""
+        self.gen_decay = np.zeros(n_c)
+        """gen_decay (ndarray): volumetric heat generation per unit of the
+        summed decay heat"""
+        self.adv_diag = np.zeros(n_c)
+        """adv_diag (ndarray): advection coefficient on each temperature"""
+        self.adv_src = np.zeros(n_c)
+        """adv_src (ndarray): advection source from the inlet temperatures"""
+        self.cond = self._assemble()
+        """cond (csr_matrix): conduction and convection coefficients"""
+
+    def _assemble(self):
+        """Fills the per-component arrays and returns the sparse matrix of
+        the conductive and convective terms.
+        """
+        n_c = len(self.components)
+        rows = []
+        cols = []
+        vals = []
+        for i, comp in enumerate(self.components):
+            if isinstance(comp, THSuperComponent):
+                # dtempdt is zero, give the row a harmless heat capacity
+                self.rho_a[i] = 1.0
+                continue
+            self.rho_a[i] = comp.dm.a.magnitude
+            if comp.dm.model == 'linear':
+                self.rho_b[i] = comp.dm.b.magnitude
+            self.cp[i] = comp.cp.magnitude
+            vol = comp.vol.magnitude
+            for j, val in self._terms(comp):
+                rows.append(i)
+                cols.append(j)
+                vals.append(val)
+            if comp.heatgen:
+                self.gen_power[i] = comp.power_tot.magnitude * \
+                    (1 - self.kappa) / vol
+                self.gen_decay[i] = 1.0 / vol
+            for name, d in six.iteritems(comp.adv):
+                mcp = d['m_flow'].magnitude * d['cp'].magnitude
+                self.adv_diag[i] -= 2.0 * mcp / vol
+                self.adv_src[i] += 2.0 * mcp * d['t_in'].magnitude / vol
+        return sparse.csr_matrix((vals, (rows, cols)), shape=(n_c, n_c))
+
+    def _terms(self, comp):
+        """Yields (column, coefficient) pairs of the conductive and
+        convective terms of comp's dT/dt numerator, following
+        THSystem.dtempdt term by term.
+
+        :param comp: the component whose row is assembled
+        :type comp: THComponent
+        """
+        i = self.names[comp.name]
+        k = comp.k.magnitude
+        vol = comp.vol.magnitude
+        if comp.sph and comp.ri.magnitude == 0.0:
+            dr = (comp.ro - comp.ri).magnitude
+            yield i, -k / dr**2
+        for interface, d in six.iteritems(comp.convBC):
+            env = self.comp_from_name(interface)
+            h = d["h"].h(env.rho(0), env.mat.mu).magnitude
+            r_b = comp.ro.magnitude
+            R = d["R"].magnitude
+            dr = comp.ri.magnitude - comp.ro.magnitude
+            denom = 1 / dr - h / k
+            # T_R = a_env * T_env + a_b * T_b, see convBoundary
+            a_env = -h / k / denom
+            a_b = 1 / dr / denom
+            yield i, -(k / dr**2 - k * R / (r_b * dr**2) * a_b)
+            yield self.names[env.name], k * R / (r_b * dr**2) * a_env
+        for interface, d in six.iteritems(comp.cond):
+            env = self.comp_from_name(interface)
+            j = self.names[env.name]
+            if comp.sph:
+                r_b = comp.ro.magnitude
+                dr = (comp.ro - comp.ri).magnitude
+                yield i, -k / dr**2
+                yield j, k * env.ro.magnitude / (r_b * dr**2)
+            else:
+                kA_L = (comp.k * d["area"] / d["L"]).magnitude
+                yield i, -kA_L
+                yield j, kA_L
+        for interface, d in six.iteritems(comp.conv):
+            env = self.comp_from_name(interface)
+            if isinstance(env, THSuperComponent):
+                h = d['h'].h(comp.rho(0), comp.mat.mu).magnitude
+                hA = h * d['area'].magnitude
+                for d_env in env.conv.values():
+                    k_env = d_env["k"].magnitude
+                    dr = d_env["dr"].magnitude
+                # Tr = c_b * T_b + c_in * T_inner, see compute_tr
+                denom = 1 / dr - h / k_env
+                c_b = -h / k_env / denom
+                c_in = 1 / dr / denom
+                inner = self.names[env.sub_comp[-2].name]
+                yield i, -hA * (1 - c_b) / vol
+                yield inner, hA * c_in / vol
+            else:
+                if isinstance(comp.mat, LiquidMaterial):
+                    h = d['h'].h(comp.rho(0), comp.mat.mu)
+                elif isinstance(env.mat, LiquidMaterial):
+                    h = d['h'].h(env.rho(0), env.mat.mu)
+                else:
+                    msg = 'neither of the components are liquid:'
+                    msg += env.name
+                    msg += ' and '
+                    msg += comp.name
+                    raise TypeError(msg)
+                hA = h.magnitude * d['area'].magnitude
+                yield i, -hA / vol
+                yield self.names[env.name], hA / vol
+
+    def conv_derivative(self, model):
+        """Returns the derivative of the conductive and convective
+        coefficients with respect to the heat transfer coefficient of one
+        convective model, which every interface using it shares.
+
+        :param model: the convective model
+        :type model: ConvectiveModel
+        :rtype: scipy.sparse.csr_matrix
+        """
+        n_c = len(self.components)
+        rows = []
+        cols = []
+        vals = []
+        for i, comp in enumerate(self.components):
+            if isinstance(comp, THSuperComponent):
+                continue
+            for j, val in self._dterms(comp, model):
+                rows.append(i)
+                cols.append(j)
+                vals.append(val)
+        return sparse.csr_matrix((vals, (rows, cols)), shape=(n_c, n_c))
+
+    def _dterms(self, comp, model):
+        """Yields (column, derivative) pairs of the terms of _terms with
+        respect to the heat transfer coefficient of model, on the interfaces
+        of comp that use it.
+
+        :param comp: the component whose row is differentiated
+        :type comp: THComponent
+        :param model: the convective model
+        :type model: ConvectiveModel
+        """
+        i = self.names[comp.name]
+        k = comp.k.magnitude
+        vol = comp.vol.magnitude
+        for interface, d in six.iteritems(comp.convBC):
+            if d["h"] is not model:
+                continue
+            env = self.comp_from_name(interface)
+            h = d["h"].h(env.rho(0), env.mat.mu).magnitude
+            r_b = comp.ro.magnitude
+            R = d["R"].magnitude
+            dr = comp.ri.magnitude - comp.ro.magnitude
+            denom = 1 / dr - h / k
+            da_env = -1 / k / denom - h / k**2 / denom**2
+            da_b = 1 / dr / k / denom**2
+            yield i, k * R / (r_b * dr**2) * da_b
+            yield self.names[env.name], k * R / (r_b * dr**2) * da_env
+        for interface, d in six.iteritems(comp.conv):
+            if d["h"] is not model:
+                continue
+            env = self.comp_from_name(interface)
+            area = d['area'].magnitude
+            if isinstance(env, THSuperComponent):
+                h = d['h'].h(comp.rho(0), comp.mat.mu).magnitude
+                for d_env in env.conv.values():
+                    k_env = d_env["k"].magnitude
+                    dr = d_env["dr"].magnitude
+                denom = 1 / dr - h / k_env
+                c_b = -h / k_env / denom
+                c_in = 1 / dr / denom
+                dc_b = -1 / k_env / denom - h / k_env**2 / denom**2
+                dc_in = 1 / dr / k_env / denom**2
+                inner = self.names[env.sub_comp[-2].name]
+                yield i, -area * (1 - c_b - h * dc_b) / vol
+                yield inner, area * (c_in + h * dc_in) / vol
+            else:
+                yield i, -area / vol
+                yield self.names[env.name], area / vol
+
+    def comp_from_name(self, name):
+        """Returns the component with the matching name
+        """
+        try:
+            return self.components[self.names[name]]
+        except KeyError:
+            msg = "There is no component with the name: "
+            msg += name
+            raise KeyError(msg)
+
+    def n_components(self):
+        """The number of components in the network.
+        """
+        return len(self.components)
+
+    def operator(self):
+        """Returns the linear operator on the temperatures, including
+        advection, as used by the Jacobian.
+
+        :rtype: scipy.sparse.csr_matrix
+        """
+        return (self.cond + sparse.diags(self.adv_diag)).tocsr()
+
+    def capacity(self, temps):
+        """Returns the volumetric heat capacity of each component
+
+        :param temps: the component temperatures, in kelvin
+        :type temps: np.ndarray
+        """
+        return (self.rho_a + self.rho_b * temps) * self.cp
+
+    def heat(self, temps, power, omegas):
+        """Returns the net volumetric heat flowing into each component, the
+        numerator of dT/dt, in watts/m^3.
+
+        :param temps: the component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: normalized nuclear power
+        :type power: float
+        :param omegas: decay heat group powers
+        :type omegas: np.ndarray
+        """
+        q = self.cond.dot(temps)
+        q += self.gen_power * power + self.gen_decay * np.sum(omegas)
+        # like THSystem.advection, a temperature of exactly 0 K has no
+        # advective heat transfer
+        q += np.where(temps == 0.0, 0.0,
+                      self.adv_diag * temps + self.adv_src)
+        return q
+
+    def dtempdt(self, temps, power, omegas, out=None):
+        """Returns dT/dt of every component at once. The result matches
+        THSystem.dtempdt component by component.
+
+        :param temps: the component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: normalized nuclear power
+        :type power: float
+        :param omegas: decay heat group powers
+        :type omegas: np.ndarray
+        :param out: preallocated array for the result, or None
+        :type out: np.ndarray
+        :return: dT/dt of each component, in kelvin/s
+        :rtype: np.ndarray
+        """
+        return np.divide(self.heat(temps, power, omegas),
+                         self.capacity(temps), out=out)
+
+    def jacobian(self, temps, power, omegas):
+        """Returns the Jacobian of dtempdt with respect to the temperatures,
+        for a given power history.
+
+        :param temps: the component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: normalized nuclear power
+        :type power: float
+        :param omegas: decay heat group powers
+        :type omegas: np.ndarray
+        :rtype: scipy.sparse.csc_matrix
+        """
+        cap = self.capacity(temps)
+        diag = -self.heat(temps, power, omegas) * self.rho_b * self.cp / cap**2
+        return (sparse.diags(1.0 / cap).dot(self.operator()) +
+                sparse.diags(diag)).tocsc()
+
+    def steady_state(self, power, omegas, temps0):
+        """Returns the temperatures at which every dT/dt is zero for a
+        constant power and decay heat. The heat balance is linear in the
+        temperatures, so this is a single sparse solve. Components that
+        exchange no heat, such as supercomponents, keep their temperatures
+        from temps0.
+
+        :param power: normalized nuclear power
+        :type power: float
+        :param omegas: decay heat group powers
+        :type omegas: np.ndarray
+        :param temps0: the initial component temperatures, in kelvin
+        :type temps0: np.ndarray
+        :return: the steady state temperatures, in kelvin
+        :rtype: np.ndarray
+        """
+        op, isolated = self._steady_operator()
+        rhs = -(self.gen_power * power + self.gen_decay * np.sum(omegas) +
+                self.adv_src)
+        for i in isolated:
+            if rhs[i] != 0.0:
+                msg = 'There is no steady state: ' + self.components[i].name
+                msg += ' generates heat but exchanges none with the others.'
+                raise ValueError(msg)
+            rhs[i] = temps0[i]
+        with np.errstate(all='ignore'):
+            temps = linalg.spsolve(op, rhs)
+        temps = np.atleast_1d(temps)
+        if not np.all(np.isfinite(temps)):
+            msg = 'There is no steady state: the components cannot reject '
+            msg += 'the heat they generate.'
+            raise ValueError(msg)
+        return temps
+
+    def steady_state_derivative(self, dheat):
+        """Returns the derivative of the steady state temperatures with
+        respect to a parameter, given the derivative of heat with respect to
+        it at fixed temperatures, power and decay heat. Components that
+        exchange no heat keep their temperatures.
+
+        :param dheat: the derivative of the heat flowing into each component
+        :type dheat: np.ndarray
+        :rtype: np.ndarray
+        """
+        op, isolated = self._steady_operator()
+        rhs = -np.asarray(dheat, dtype=float)
+        rhs[isolated] = 0.0
+        return np.atleast_1d(linalg.spsolve(op, rhs))
+
+    def _steady_operator(self):
+        """Returns the operator of the steady state heat balance, with a unit
+        diagonal in the rows of the components that exchange no heat, and
+        those rows.
+
+        :rtype: (scipy.sparse.csc_matrix, list of int)
+        """
+        op = self.operator().tolil()
+        isolated = [i for i in range(len(self.components)) if not op.rows[i]]
+        for i in isolated:
+            op[i, i] = 1.0
+        return op.tocsc(), isolated
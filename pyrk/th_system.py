@@ -1,5 +1,6 @@
 import six
 from pyrk.th_component import THSuperComponent
+from pyrk.th_network import THNetwork
 from pyrk.utilities.ur import units
 from pyrk.materials.liquid_material import LiquidMaterial
 
@@ -18,6 +19,25 @@ class THSystem(object):
     def __init__(self, kappa, components):
         self.kappa = kappa
         self.components = components
+        self.network = None
+
+    def compile(self):
+        """Assembles the heat transfer between the components into a
+        THNetwork, which evaluates dtempdt for all of them at once. Call it
+        again if the components or their interfaces change.
+
+        :return: the compiled network
+        :rtype: THNetwork
+        """
+        self.network = THNetwork(self.components, self.kappa)
+        return self.network
+
+    def get_network(self):
+        """Returns the compiled network, compiling it on first use
+        """
+        if self.network is None:
+            return self.compile()
+        return self.network
 
     def comp_from_name(self, name):
         """Returns the component with the matching name
@@ -5,14 +5,98 @@ import logging
 log = logging.getLogger(__name__)
 
 
+def piecewise(t0, segments):
+    """Returns the output times of a grid made of uniform segments, for
+    example fine steps around a reactivity insertion and coarse steps for
+    the long tail after it. Each segment starts where the previous one ends.
+    Its step is adjusted so that a whole number of steps fills it.
+
+    :param t0: the first time of the grid
+    :type t0: float, units of seconds
+    :param segments: the end time and the step size of each segment
+    :type segments: list of (Quantity, Quantity) tuples, units of seconds
+    :return: the output times
+    :rtype: Quantity array, units of seconds
+    """
+    start = float(t0.to('seconds').magnitude)
+    times = [start]
+    for end, dt in segments:
+        end = float(end.to('seconds').magnitude)
+        dt = float(dt.to('seconds').magnitude)
+        validation.validate_g("segment end", end, start)
+        validation.validate_g("segment dt", dt, 0.0)
+        n = max(1, int(round((end - start) / dt)))
+        times.extend(np.linspace(start, end, n + 1)[1:])
+        start = end
+    return units.Quantity(np.array(times), 'seconds')
+
+
+def graded(t0, tf, dt_min, dt_max, t_fine=(), growth=1.1):
+    """Returns the output times of a graded grid. The steps are dt_min long
+    at each time in t_fine, such as the time of a reactivity insertion or a
+    scram, and grow geometrically by the factor growth away from them, up to
+    dt_max. Each time in t_fine is on the grid.
+
+    :param t0: the first time of the grid
+    :type t0: float, units of seconds
+    :param tf: the last time of the grid
+    :type tf: float, units of seconds
+    :param dt_min: the step size at the times in t_fine
+    :type dt_min: float, units of seconds
+    :param dt_max: the largest step size
+    :type dt_max: float, units of seconds
+    :param t_fine: the times the grid is refined around
+    :type t_fine: list of Quantities, units of seconds
+    :param growth: the ratio of the sizes of neighbouring steps
+    :type growth: float
+    :return: the output times
+    :rtype: Quantity array, units of seconds
+    """
+    t0 = float(t0.to('seconds').magnitude)
+    tf = validation.validate_g("tf", float(tf.to('seconds').magnitude), t0)
+    dt_min = validation.validate_g("dt_min",
+                                   float(dt_min.to('seconds').magnitude),
+                                   0.0)
+    dt_max = validation.validate_ge("dt_max",
+                                    float(dt_max.to('seconds').magnitude),
+                                    dt_min)
+    growth = validation.validate_ge("growth", growth, 1.0)
+    fine = np.array(sorted(float(t.to('seconds').magnitude)
+                           for t in t_fine))
+    fine = fine[(fine > t0) & (fine < tf)]
+    # the grid passes through each refined time and ends at tf
+    bounds = list(fine) + [tf]
+    times = [t0]
+    t = t0
+    for bound in bounds:
+        while t < bound:
+            if len(fine) > 0:
+                dist = np.min(np.abs(fine - t))
+            else:
+                dist = np.inf
+            dt = min(dt_max, dt_min + (growth - 1.0) * dist)
+            if t + dt >= bound - 0.5 * dt_min:
+                t = bound
+            else:
+                t = t + dt
+            times.append(t)
+    return units.Quantity(np.array(times), 'seconds')
+
+
 class Timer(object):
-    """This class holds information about time"""
+    """This class holds information about time.
+
+    The output times are dt apart by default. A non-uniform grid, such as
+    one made by piecewise or graded, may be given instead, and the arrays
+    of the simulation then hold one entry per time of the grid.
+    """
 
     def __init__(self,
                  t0=0.0 * units.seconds,
                  tf=1.0 * units.seconds,
                  dt=1.0 * units.seconds,
-                 t_feedback=0.0 * units.seconds):
+                 t_feedback=0.0 * units.seconds,
+                 grid=None):
         """Initialize the timer object. There should be only one.
 
         :param t0: first times in the simulation
@@ -21,15 +105,49 @@ class Timer(object):
         :type tf: float, units of seconds
         :param dt: size of the timestep
         :type dt: float, units of seconds
+        :param grid: the increasing output times, or None for a uniform grid
+          of step dt. With a grid, t0 and tf are its first and last times and
+          dt is its smallest step.
+        :type grid: Quantity array, units of seconds
         """
+        self.uniform = grid is None
+        """uniform (bool): whether the output times are dt apart"""
+        if not self.uniform:
+            grid = units.Quantity(np.asarray(grid.to('seconds').magnitude,
+                                             dtype=float), 'seconds')
+            steps = np.diff(grid.magnitude)
+            if len(steps) == 0 or np.any(steps <= 0):
+                raise ValueError("The grid must hold two or more increasing "
+                                 "times.")
+            t0 = grid[0]
+            tf = grid[-1]
+            dt = units.Quantity(float(steps.min()), 'seconds')
         self.t0 = validation.validate_ge("t0", t0, 0.0 * units.seconds)
         self.t_feedback = validation.validate_ge("t_feedback", t_feedback, t0)
         self.tf = validation.validate_ge("tf", tf, t_feedback)
         self.dt = validation.validate_g("dt", dt, 0.0 * units.seconds)
-        self.series = units.Quantity(np.linspace(start=t0.magnitude,
-                                                 stop=tf.magnitude,
-                                                 num=self.timesteps()),
-                                     'seconds')
+        self._t0 = float(self.t0.magnitude)
+        """_t0 (float): the first time, in seconds, for unitless lookups"""
+        self._dt = float(self.dt.magnitude)
+        """_dt (float): the timestep size, in seconds, for unitless
+        lookups"""
+        self._tf = float(self.tf.magnitude)
+        """_tf (float): the last time, in seconds, for unitless checks"""
+        if self.uniform:
+            self._n = self.idx(self._tf) + 1
+        else:
+            self._n = len(grid)
+        """_n (int): the number of timesteps"""
+        if self.uniform:
+            self.series = units.Quantity(np.linspace(start=t0.magnitude,
+                                                     stop=tf.magnitude,
+                                                     num=self.timesteps()),
+                                         'seconds')
+        else:
+            self.series = grid
+        self._times = self.series.magnitude
+        """_times (ndarray): the output times, in seconds, searched by the
+        lookups on a non-uniform grid"""
         self.ts = 0
         self.t_idx_feedback = self.t_idx(t_feedback)
 
@@ -40,7 +158,50 @@ class Timer(object):
         :type time: float, units of seconds
         :return: index
         """
-        return self.idx_from_t(time=time, t0=self.t0, dt=self.dt)
+        return self.idx(float(time.magnitude))
+
+    def idx(self, time):
+        """given the time as a plain float in seconds, this returns the index
+        of t. This is t_idx without unit handling, for use inside the solver.
+        On a non-uniform grid, the nearest time is found by bisection, and
+        times outside the grid are counted in steps of its first or last
+        step.
+
+        :param time: the actual time, in seconds
+        :type time: float
+        :return: index
+        """
+        if self.uniform:
+            return int(round((time - self._t0) / self._dt))
+        times = self._times
+        i = int(times.searchsorted(time))
+        if i == 0:
+            return int(round((time - times[0]) / (times[1] - times[0])))
+        if i == len(times):
+            return len(times) - 1 + \
+                int(round((time - times[-1]) / (times[-1] - times[-2])))
+        if times[i] - time <= time - times[i - 1]:
+            return i
+        return i - 1
+
+    def indices(self, times):
+        """given an array of times as plain floats in seconds, this returns
+        the index of each, as idx does for one time, in a single vectorized
+        lookup. On a non-uniform grid, the times must be between t0 and tf.
+
+        :param times: the actual times, in seconds
+        :type times: np.ndarray
+        :return: indices
+        :rtype: np.ndarray of int
+        """
+        times = np.asarray(times, dtype=float)
+        if self.uniform:
+            return np.rint((times - self._t0) / self._dt).astype(int)
+        grid = self._times
+        i = np.clip(grid.searchsorted(times), 1, len(grid) - 1)
+        # the nearest of the neighbouring times, the later one on a tie
+        lower = times - grid[i - 1] < grid[i] - times
+        return i - lower
 
     def idx_from_t(self, time, t0, dt):
         """given the any time, in seconds, this returns the index of t.
@@ -63,15 +224,56 @@ class Timer(object):
 
         :param t_idx: the index to convert to simulation time
         """
-        return self.t0 + self.dt * float(t_idx)
+        if self.uniform:
+            return self.t0 + self.dt * float(t_idx)
+        return units.Quantity(self.seconds(t_idx), 'seconds')
+
+    def seconds(self, t_idx):
+        """given the index of t, this returns the time as a plain float in
+        seconds. This is t without unit handling, for use inside the solver.
+        An array of indices gives an array of times.
+
+        :param t_idx: the index to convert to simulation time
+        :type t_idx: int or np.ndarray of int
+        :rtype: float or np.ndarray
+        """
+        if self.uniform:
+            return self._t0 + self._dt * t_idx
+        times = self._times
+        if np.ndim(t_idx):
+            return times[t_idx]
+        if t_idx < 0:
+            return float(times[0] + (times[1] - times[0]) * t_idx)
+        if t_idx >= len(times):
+            return float(times[-1] + (times[-1] - times[-2]) *
+                         (t_idx - len(times) + 1))
+        return float(times[t_idx])
+
+    def step_size(self, t_idx):
+        """Returns the length, in seconds, of the step that ends at a
+        timestep
+
+        :param t_idx: the index of the end of the step
+        :type t_idx: int
+        :rtype: float
+        """
+        if self.uniform:
+            return self._dt
+        return float(self._times[t_idx] - self._times[t_idx - 1])
 
     def timesteps(self):
         """Returns the number of timesteps in this simulation"""
-        return self.t_idx(self.tf) + 1
+        return self._n
 
     def advance_one_timestep(self):
-        """Advances the timer one timestep"""
-        self.advance_time(self.t(self.ts + 1))
+        """Advances the timer one timestep, without unit handling"""
+        if self.ts + 1 >= self._n:
+            msg = "current time must be less than or equal to "
+            msg += str(self.tf) + ".\n"
+            msg += "The value provided was : "
+            msg += str(self.t(self.ts + 1))
+            raise ValueError(msg)
+        self.ts += 1
         return self.ts
 
     def advance_time(self, time):
@@ -93,7 +295,9 @@ class Timer(object):
             msg += str(old_ts)
             raise RuntimeError(msg)
         self.ts = new_ts
-        return validation.validate_le("current time", time, self.tf)
+        validation.validate_le("current time", float(time.magnitude),
+                               self._tf)
+        return time
 
     def current_timestep(self):
         return self.ts
@@ -0,0 +1,363 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Monte Carlo uncertainty quantification with streaming statistics.
+
+The parameters of an input file are drawn from distributions by Latin
+hypercube, Sobol or plain random sampling, and the samples run on a pool of
+worker processes. As each run finishes, its outputs are folded into the
+statistics of each timestep and output: the mean and variance by Welford's
+algorithm, the minimum and maximum, and quantiles estimated by the P-square
+algorithm of Jain and Chlamtac. No trajectory is kept, so memory grows with
+the number of timesteps and outputs but not with the number of samples.
+"""
+import argparse
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from scipy.stats import norm, qmc
+
+from pyrk.db import database
+from pyrk.inp import validation
+from pyrk import sweep
+
+
+class Statistics(object):
+    """This class accumulates statistics of the outputs of many runs, per
+    timestep, one run at a time.
+    """
+
+    def __init__(self, n_timesteps, n_outputs, quantiles=(0.05, 0.5, 0.95)):
+        """Creates empty statistics
+
+        :param n_timesteps: the number of timesteps
+        :type n_timesteps: int
+        :param n_outputs: the number of outputs at each timestep
+        :type n_outputs: int
+        :param quantiles: the probabilities of the estimated quantiles
+        :type quantiles: sequence of floats between 0 and 1
+        """
+        shape = (n_timesteps, n_outputs)
+        self.levels = np.array(quantiles, dtype=float)
+        """levels (ndarray): the probabilities of the estimated quantiles"""
+        self.count = np.zeros(n_timesteps, dtype=int)
+        """count (ndarray): the number of runs that reached each timestep"""
+        self.mean = np.zeros(shape)
+        """mean (ndarray): the mean of each output"""
+        self._m2 = np.zeros(shape)
+        """_m2 (ndarray): the sum of squared deviations from the mean"""
+        self.min = np.full(shape, np.inf)
+        """min (ndarray): the smallest value of each output"""
+        self.max = np.full(shape, -np.inf)
+        """max (ndarray): the largest value of each output"""
+        self._first = np.zeros((5,) + shape)
+        """_first (ndarray): the first five values, which seed the markers"""
+        self._q = np.zeros((len(self.levels), 5) + shape)
+        """_q (ndarray): the heights of the P-square markers"""
+        self._n = np.zeros((len(self.levels), 5) + shape)
+        """_n (ndarray): the positions of the P-square markers"""
+        self._dn = np.array([[0.0, p / 2, p, (1 + p) / 2, 1.0]
+                             for p in self.levels]).reshape(-1, 5)
+        """_dn (ndarray): the growth rate of the desired marker positions"""
+
+    def update(self, y):
+        """Adds the outputs of one run. A run that ended early adds only the
+        timesteps it reached.
+
+        :param y: the outputs of the run, indexed by timestep and output
+        :type y: np.ndarray
+        """
+        m = len(y)
+        self.count[:m] += 1
+        c = self.count[:m, np.newaxis]
+        delta = y - self.mean[:m]
+        self.mean[:m] += delta / c
+        self._m2[:m] += delta * (y - self.mean[:m])
+        np.minimum(self.min[:m], y, out=self.min[:m])
+        np.maximum(self.max[:m], y, out=self.max[:m])
+        self._update_markers(y)
+
+    def _update_markers(self, y):
+        """Moves the P-square markers of each quantile for one run. Runs only
+        end early, so the counts never grow with the timestep and the
+        timesteps past their fifth value form a prefix.
+
+        :param y: the outputs of the run, indexed by timestep and output
+        :type y: np.ndarray
+        """
+        c = self.count[:len(y)]
+        k_late = np.count_nonzero(c > 5)
+        k_init = np.count_nonzero(c == 5)
+        # the first five values of each timestep are kept
+        seed = slice(k_late, len(y))
+        self._first[c[seed] - 1, np.arange(k_late, len(y))] = y[seed]
+        if k_init:
+            init = slice(k_late, k_late + k_init)
+            self._q[:, :, init] = np.sort(self._first[:, init], axis=0)
+            self._n[:, :, init] = np.arange(5).reshape(5, 1, 1)
+        if not k_late:
+            return
+        q = self._q[:, :, :k_late]
+        n = self._n[:, :, :k_late]
+        x = y[:k_late]
+        q[:, 0] = np.minimum(q[:, 0], x)
+        q[:, 4] = np.maximum(q[:, 4], x)
+        cell = np.sum(x >= q[:, 1:4], axis=1)
+        for i in range(1, 5):
+            n[:, i] += i > cell
+        desired = self._dn[:, :, np.newaxis] * (c[:k_late] - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i in range(1, 4):
+                d = desired[:, i, :, np.newaxis] - n[:, i]
+                move = ((d >= 1) & (n[:, i + 1] - n[:, i] > 1)) | \
+                    ((d <= -1) & (n[:, i - 1] - n[:, i] < -1))
+                d = np.sign(d)
+                parabolic = q[:, i] + d / (n[:, i + 1] - n[:, i - 1]) * (
+                    (n[:, i] - n[:, i - 1] + d) * (q[:, i + 1] - q[:, i]) /
+                    (n[:, i + 1] - n[:, i]) +
+                    (n[:, i + 1] - n[:, i] - d) * (q[:, i] - q[:, i - 1]) /
+                    (n[:, i] - n[:, i - 1]))
+                q_adj = np.where(d > 0, q[:, i + 1], q[:, i - 1])
+                n_adj = np.where(d > 0, n[:, i + 1], n[:, i - 1])
+                linear = q[:, i] + d * (q_adj - q[:, i]) / (n_adj - n[:, i])
+                inside = (q[:, i - 1] < parabolic) & (parabolic < q[:, i + 1])
+                q[:, i] = np.where(move, np.where(inside, parabolic, linear),
+                                   q[:, i])
+                n[:, i] += np.where(move, d, 0.0)
+
+    def variance(self):
+        """Returns the sample variance of each output, NaN where fewer than
+        two runs reached the timestep.
+
+        :rtype: np.ndarray
+        """
+        c = self.count[:, np.newaxis].astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(c > 1, self._m2 / (c - 1), np.nan)
+
+    def quantiles(self):
+        """Returns the estimated quantiles of each output, exact while a
+        timestep has at most five values, NaN where no run reached it.
+
+        :return: the quantiles, indexed by level, timestep and output
+        :rtype: np.ndarray
+        """
+        ret = self._q[:, 2].copy()
+        for c in range(0, 6):
+            rows = self.count == c
+            if not np.any(rows):
+                continue
+            elif c == 0:
+                ret[:, rows] = np.nan
+            else:
+                ret[:, rows] = np.quantile(self._first[:c, rows], self.levels,
+                                           axis=0)
+        return ret
+
+
+class MonteCarlo(object):
+    """This class runs sampled input files and keeps only the statistics of
+    their outputs.
+    """
+
+    methods = ['lhs', 'sobol', 'random']
+    """methods (list): the supported sampling methods"""
+
+    distributions = sweep.distributions
+    """distributions (list): the supported parameter distributions"""
+
+    def __init__(self, infile_path, params, n_samples, method='lhs',
+                 seed=None, columns=None, quantiles=(0.05, 0.5, 0.95),
+                 max_workers=None):
+        """Prepares a Monte Carlo study of an input file
+
+        :param infile_path: path to the infile
+        :type infile_path: string
+        :param params: the distribution of each parameter, keyed by its path
+          in the input file (see pyrk.sweep), as ('uniform', low, high) or
+          ('gauss', mean, std) in the units of the value it replaces
+        :type params: dict
+        :param n_samples: the number of samples
+        :type n_samples: int
+        :param method: 'lhs' for Latin hypercube, 'sobol' for a scrambled
+          Sobol sequence or 'random'
+        :type method: str
+        :param seed: the seed of the sampler
+        :type seed: int
+        :param columns: the entries of the solution vector whose statistics
+          are kept, or None for the power and the temperatures
+        :type columns: list of int
+        :param quantiles: the probabilities of the estimated quantiles
+        :type quantiles: sequence of floats
+        :param max_workers: the number of worker processes, or None for the
+          number of processors
+        :type max_workers: int
+        """
+        self.infile_path = infile_path
+        self.paths = sorted(params)
+        for path in self.paths:
+            validation.validate_supported("distribution", params[path][0],
+                                          self.distributions)
+        self.params = params
+        self.method = validation.validate_supported("method", method,
+                                                    self.methods)
+        self.n_samples = n_samples
+        self.seed = seed
+        self.max_workers = max_workers
+        infile = sweep.load_fresh(infile_path)
+        for path in self.paths:
+            sweep.get_param(infile, path)
+        if columns is None:
+            n_th = len(infile.components)
+            n = sweep.n_entries(infile)
+            columns = [0] + list(range(n - n_th, n))
+        self.columns = np.asarray(columns, dtype=int)
+        """columns (ndarray): the entries of the solution vector whose
+        statistics are kept"""
+        self.stats = Statistics(infile.ti.timesteps(), len(self.columns),
+                                quantiles)
+        """stats (Statistics): the statistics of the outputs"""
+        self.samples = self.draw()
+        """samples (ndarray): the parameter values of each sample, in the
+        order of paths"""
+        self.errors = {}
+        """errors (dict): the error message of each failed sample"""
+
+    def draw(self):
+        """Returns the parameter values of each sample, indexed by sample and
+        parameter.
+
+        :rtype: np.ndarray
+        """
+        d = len(self.paths)
+        if self.method == 'lhs':
+            u = qmc.LatinHypercube(d=d, seed=self.seed).random(self.n_samples)
+        elif self.method == 'sobol':
+            u = qmc.Sobol(d=d, seed=self.seed).random(self.n_samples)
+        else:
+            u = np.random.default_rng(self.seed).random((self.n_samples, d))
+        vals = np.empty_like(u)
+        for col, path in enumerate(self.paths):
+            name, a, b = self.params[path]
+            if name == 'uniform':
+                vals[:, col] = a + u[:, col] * (b - a)
+            else:
+                vals[:, col] = norm.ppf(u[:, col], loc=a, scale=b)
+        return vals
+
+    def run(self):
+        """Runs every sample and folds its outputs into the statistics as it
+        finishes. At most twice as many runs as workers are in flight, so
+        finished trajectories never pile up.
+
+        :return: the statistics of the outputs
+        :rtype: Statistics
+        """
+        self.errors = {}
+        todo = iter(range(self.n_samples))
+        pending = {}
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            n_flight = 2 * (self.max_workers or os.cpu_count() or 1)
+            while True:
+                while len(pending) < n_flight:
+                    idx = next(todo, None)
+                    if idx is None:
+                        break
+                    sample = dict(zip(self.paths, self.samples[idx]))
+                    fut = executor.submit(run_outputs, self.infile_path,
+                                          sample, self.columns)
+                    pending[fut] = idx
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    idx = pending.pop(fut)
+                    try:
+                        self.stats.update(fut.result())
+                    except Exception as err:
+                        self.errors[idx] = repr(err)
+        return self.stats
+
+    def write(self, db):
+        """Writes the statistics to the uq group of the output database. The
+        group holds the number of runs that reached each timestep, the mean,
+        variance, min, max and quantiles of each output, the sampled
+        parameter values and the failed samples.
+
+        :param db: the output database
+        :type db: Database
+        """
+        stats = self.stats
+        db.add_group('uq', 'Uncertainty Quantification')
+        arrays = [('count', stats.count, 'Runs Reaching Each Timestep'),
+                  ('mean', stats.mean, 'Mean'),
+                  ('variance', stats.variance(), 'Variance'),
+                  ('min', stats.min, 'Minimum'),
+                  ('max', stats.max, 'Maximum'),
+                  ('quantiles', stats.quantiles(), 'Quantiles'),
+                  ('levels', stats.levels, 'Quantile Probabilities'),
+                  ('columns', self.columns, 'Solution Vector Entries'),
+                  ('samples', self.samples, 'Parameter Values'),
+                  ('failed', np.array(sorted(self.errors), dtype=int),
+                   'Failed Samples')]
+        for name, arr, title in arrays:
+            db.add_array('uq', name, arr, title)
+        db.get_array('uq', 'samples').attrs.paths = self.paths
+        db.get_array('uq', 'samples').attrs.method = self.method
+
+
+def run_outputs(infile_path, sample, columns):
+    """Runs one sample in a worker and returns the chosen entries of its
+    solution.
+
+    :param infile_path: path to the infile
+    :type infile_path: string
+    :param sample: the parameter values of the sample, keyed by path
+    :type sample: dict
+    :param columns: the entries of the solution vector to return
+    :type columns: np.ndarray
+    """
+    return sweep.solve_sample(infile_path, sample)[:, columns]
+
+
+def add_arguments(ap):
+    """Adds the command line options of a Monte Carlo study to a parser
+
+    :param ap: the parser
+    :type ap: argparse.ArgumentParser
+    """
+    ap.add_argument('--infile', help='the name of the input file',
+                    default='input')
+    ap.add_argument('--outfile', help='the name of the output database',
+                    default='pyrk.h5')
+    ap.add_argument('--dist', action='append', default=[],
+                    help='a sampled parameter, path=gauss:mean:std or '
+                    'path=uniform:low:high')
+    ap.add_argument('--n-samples', type=int, default=100,
+                    help='the number of samples')
+    ap.add_argument('--method', default='lhs', choices=MonteCarlo.methods,
+                    help='the sampling method')
+    ap.add_argument('--seed', type=int, default=None,
+                    help='the seed of the sampler')
+    ap.add_argument('--workers', type=int, default=None,
+                    help='the number of worker processes')
+    return ap
+
+
+def main(args):
+    params = dict(sweep.parse_distribution(spec) for spec in args.dist)
+    mc = MonteCarlo(args.infile, params, args.n_samples, method=args.method,
+                    seed=args.seed, max_workers=args.workers)
+    mc.run()
+    out_db = database.Database(filepath=args.outfile)
+    mc.write(out_db)
+    out_db.close_db()
+    for idx, msg in sorted(mc.errors.items()):
+        print('sample ' + str(idx) + ' failed: ' + msg)
+    return mc
+
+
+"""Run it as a script"""
+if __name__ == "__main__":
+    ap = add_arguments(argparse.ArgumentParser(description='PyRK UQ'))
+    main(ap.parse_args())
@@ -21,7 +21,8 @@ def plot(y, si):
     """Creates plots for interesting values in the simulation.
     :param y: The full solution array
     :type y: np.ndarray"""
-    x = si.timer.series.magnitude
+    # a terminal event may end the solution before the last timestep
+    x = si.timer.series.magnitude[:len(y)]
     plot_power(x, y, si)
     plot_reactivity(x, si)
     plot_power_w_reactivity(x=x, y=y, si=si)
@@ -36,7 +37,7 @@ def plot_reactivity(x, si):
     """Plots the reactivity
     :param x: The time series
     :type x: np.ndarray"""
-    plt.plot(x, si.ne._rho, color=my_colors(1, len(si.ne._rho)),
+    plt.plot(x, si.ne._rho[:len(x)], color=my_colors(1, len(si.ne._rho)),
              marker='.')
     plt.xlabel("Time [s]")
     plt.ylabel("Reactivity [$\Delta k/k$]")
@@ -55,7 +56,7 @@ def plot_power(x, y, si):
 
 def plot_power_w_reactivity(x, si, y):
     power = y[:, 0]
-    rho = si.ne._rho
+    rho = si.ne._rho[:len(x)]
     plt.plot(x, power, color=my_colors(0, 2), marker='.', label="Power")
     plt.plot(x, rho, color=my_colors(1, 2), marker='.',
              label="External Reactivity")
@@ -35,6 +35,9 @@ setup(
               'pyrk.utilities',
               ],
     include_package_data=True,
+    entry_points={
+        'console_scripts': ['pyrk = pyrk.cli:main'],
+    },
     platforms='any',
     test_suite='pyrk.test.test_pyrk',
     classifiers=[